@@ -0,0 +1,3 @@
+"""
+Бенчмарки ChatList, работающие против локального mock-сервера
+"""
@@ -0,0 +1,84 @@
+"""
+Бенчмарк пула HTTP-сессий: новое соединение на каждый запрос против keep-alive
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_http_pool --models 10 --rounds 20
+"""
+import argparse
+import statistics
+import sys
+import time
+import concurrent.futures
+
+import requests
+
+import network
+from benchmarks.mock_server import MockChatServer
+
+
+def _post_fresh(url: str, payload: dict):
+    """Запрос без пула - так работал network.py до введения сессий"""
+    response = requests.post(url, json=payload, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def _post_pooled(url: str, payload: dict):
+    """Запрос через общую сессию провайдера"""
+    response = network.get_session('bench').post(url, json=payload, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def run_fanout(send, url: str, models: int, rounds: int) -> list:
+    """
+    Имитировать рассылку промта в несколько моделей и замерить задержку каждого запроса
+    
+    Returns:
+        Список задержек запросов в миллисекундах
+    """
+    latencies = []
+    
+    def timed(i):
+        payload = {"model": f"mock-{i}", "messages": [{"role": "user", "content": "ping"}]}
+        start = time.perf_counter()
+        send(url, payload)
+        return (time.perf_counter() - start) * 1000
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=models) as executor:
+        for _ in range(rounds):
+            latencies.extend(executor.map(timed, range(models)))
+    return latencies
+
+
+def _report(label: str, latencies: list, connections: int):
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{label:<10} запросов: {len(latencies):>5}  соединений: {connections:>5}  "
+          f"p50: {statistics.median(ordered):7.2f} мс  p95: {p95:7.2f} мс")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк пула HTTP-сессий")
+    parser.add_argument("--models", type=int, default=10, help="Количество моделей в одной рассылке")
+    parser.add_argument("--rounds", type=int, default=20, help="Количество рассылок")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа сервера, сек")
+    args = parser.parse_args(argv)
+    
+    print("=" * 60)
+    print("Бенчмарк пула HTTP-сессий")
+    print("=" * 60)
+    
+    for label, send in (("без пула", _post_fresh), ("с пулом", _post_pooled)):
+        server = MockChatServer(latency=args.latency).start()
+        try:
+            latencies = run_fanout(send, server.url, args.models, args.rounds)
+            _report(label, latencies, server.connection_count)
+        finally:
+            network.close_sessions()
+            server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""
+Бенчмарк потоковой выдачи: время до первого токена против полного ответа
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_streaming --models 5 --words 50 --chunk-delay 0.02
+"""
+import argparse
+import os
+import sys
+import time
+
+import models
+from benchmarks.mock_server import MockChatServer
+
+MOCK_API_ID = "CHATLIST_BENCH_API_KEY"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк потоковой выдачи ответов")
+    parser.add_argument("--models", type=int, default=5, help="Количество моделей")
+    parser.add_argument("--words", type=int, default=50, help="Количество слов в ответе")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="Пауза между событиями, сек")
+    args = parser.parse_args(argv)
+    
+    os.environ.setdefault(MOCK_API_ID, "bench")
+    reply = " ".join(f"слово{i}" for i in range(args.words))
+    server = MockChatServer(reply=reply, chunk_delay=args.chunk_delay).start()
+    model_list = [
+        models.Model({'id': i, 'name': f'mock-{i}', 'api_url': server.url,
+                      'api_id': MOCK_API_ID, 'model_type': 'other'})
+        for i in range(args.models)
+    ]
+    
+    print("=" * 60)
+    print("Бенчмарк потоковой выдачи ответов")
+    print("=" * 60)
+    
+    try:
+        for label, on_chunk in (("целиком", None), ("поток", lambda model, chunk: None)):
+            started = time.perf_counter()
+            for result in models.iter_prompt_to_models("ping", model_list, on_chunk):
+                total = (time.perf_counter() - started) * 1000
+                ttft = (result['ttft'] or 0) * 1000
+                status = "OK" if result['success'] else f"ERROR: {result['error']}"
+                print(f"{label:<8} {result['model_name']:<10} TTFT: {ttft:8.2f} мс  "
+                      f"всего: {total:8.2f} мс  {status}")
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,370 @@
+"""
+Набор бенчмарков пути отправки запросов против локального mock-сервера
+
+Сценарии:
+    fanout  - models.send_prompt_to_models (рассылка промта нескольким моделям)
+    stream  - models.iter_prompt_to_models с потоковой выдачей (время до первого токена)
+    improve - prompt_improver.improve_prompt (через OPENROUTER_API_URL)
+    db_save - db.save_results во временную базу данных
+
+Для каждого сценария записываются пропускная способность, задержки p50/p95/p99
+и память (пик tracemalloc и максимальный RSS процесса). Результаты сохраняются
+в JSON, чтобы сравнивать их между версиями (--compare).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_suite --rounds 50 --latency-dist lognormal --latency 0.05
+    python -m benchmarks.bench_suite --error-rate 0.05 --rate-limit-rate 0.1 --compare old.json
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+try:
+    import resource  # Нет в Windows
+except ImportError:
+    resource = None
+
+import db
+import models
+import network
+import version
+from benchmarks.mock_server import LATENCY_DISTRIBUTIONS, MockChatServer, make_latency
+from prompt_improver import improve_prompt
+
+MOCK_API_ID = "CHATLIST_BENCH_API_KEY"
+SCENARIOS = ('fanout', 'stream', 'improve', 'db_save')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Ответ mock-сервера для improve_prompt - JSON, который разбирает parse_ai_response
+IMPROVE_REPLY = json.dumps({
+    "improved": "Улучшенный промт",
+    "variants": ["Вариант 1", "Вариант 2", "Вариант 3"]
+}, ensure_ascii=False)
+
+
+def percentile(ordered: List[float], p: float) -> Optional[float]:
+    """Перцентиль p (0-100) отсортированного списка методом ближайшего ранга"""
+    if not ordered:
+        return None
+    rank = max(1, int(round(p / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _max_rss_mb() -> Optional[float]:
+    """Максимальный RSS процесса, МБ (None, если не поддерживается)"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает КБ, macOS - байты
+    return round(rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024, 1)
+
+
+def summarize(latencies: List[float], elapsed: float, operations: int, errors: int,
+              extra: Optional[Dict] = None) -> Dict:
+    """
+    Сводка сценария
+    
+    Args:
+        latencies: Задержки отдельных операций, сек
+        elapsed: Общее время сценария, сек
+        operations: Количество выполненных операций (для пропускной способности)
+        errors: Количество неудачных операций
+        extra: Дополнительные поля
+    
+    Returns:
+        Словарь с пропускной способностью, задержками в мс и памятью
+    """
+    ordered = sorted(latencies)
+    
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+    
+    _, peak = tracemalloc.get_traced_memory()
+    summary = {
+        'operations': operations,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_per_s': round(operations / elapsed, 2) if elapsed > 0 else None,
+        'latency_ms': {
+            'p50': ms(percentile(ordered, 50)),
+            'p95': ms(percentile(ordered, 95)),
+            'p99': ms(percentile(ordered, 99)),
+            'max': ms(ordered[-1] if ordered else None),
+            'mean': ms(sum(ordered) / len(ordered) if ordered else None)
+        },
+        'memory': {
+            'peak_traced_mb': round(peak / (1024 * 1024), 2),
+            'max_rss_mb': _max_rss_mb()
+        }
+    }
+    if extra:
+        summary.update(extra)
+    return summary
+
+
+def _mock_models(url: str, count: int) -> List[models.Model]:
+    return [
+        models.Model({'id': i, 'name': f'mock-{i}', 'api_url': url,
+                      'api_id': MOCK_API_ID, 'model_type': 'other'})
+        for i in range(count)
+    ]
+
+
+def _start_server(args, reply: str = "OK", chunk_delay: float = 0.0) -> MockChatServer:
+    latency_fn = make_latency(args.latency_dist, args.latency, args.latency_spread)
+    return MockChatServer(
+        reply=reply, chunk_delay=chunk_delay, latency_fn=latency_fn,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after, seed=args.seed
+    ).start()
+
+
+def _server_stats(server: MockChatServer) -> Dict:
+    return {
+        'server': {
+            'requests': server.request_count,
+            'connections': server.connection_count,
+            'injected_500': server.error_count,
+            'injected_429': server.rate_limited_count
+        }
+    }
+
+
+def bench_fanout(args) -> Dict:
+    """Рассылка промта args.models моделям, args.rounds раз подряд"""
+    server = _start_server(args)
+    try:
+        model_list = _mock_models(server.url, args.models)
+        latencies, errors, attempts = [], 0, 0
+        started = time.perf_counter()
+        for i in range(args.rounds):
+            round_started = time.perf_counter()
+            results = models.send_prompt_to_models(f"fanout prompt {i}", model_list)
+            latencies.append(time.perf_counter() - round_started)
+            errors += sum(1 for result in results if not result['success'])
+            attempts += sum(result.get('attempts', 0) for result in results)
+        elapsed = time.perf_counter() - started
+        requests_total = args.rounds * args.models
+        return summarize(latencies, elapsed, requests_total, errors, {
+            'unit': 'request (latency per fan-out)',
+            'retries': attempts - requests_total,
+            **_server_stats(server)
+        })
+    finally:
+        server.stop()
+
+
+def bench_stream(args) -> Dict:
+    """Потоковая рассылка: задержка - время до первого токена каждой модели"""
+    reply = " ".join(f"слово{i}" for i in range(args.words))
+    server = _start_server(args, reply, args.chunk_delay)
+    try:
+        model_list = _mock_models(server.url, args.models)
+        ttfts, totals, errors = [], [], 0
+        started = time.perf_counter()
+        for i in range(args.rounds):
+            round_started = time.perf_counter()
+            for result in models.iter_prompt_to_models(f"stream prompt {i}", model_list,
+                                                       lambda model, chunk: None, use_cache=False):
+                if not result['success']:
+                    errors += 1
+                elif result.get('ttft') is not None:
+                    ttfts.append(result['ttft'])
+            totals.append(time.perf_counter() - round_started)
+        elapsed = time.perf_counter() - started
+        total_ordered = sorted(totals)
+        return summarize(ttfts, elapsed, args.rounds * args.models, errors, {
+            'unit': 'request (latency = time to first token)',
+            'fanout_p50_ms': round(percentile(total_ordered, 50) * 1000, 3),
+            **_server_stats(server)
+        })
+    finally:
+        server.stop()
+
+
+def bench_improve(args) -> Dict:
+    """Улучшение промта через OpenRouter-адаптер, направленный на mock-сервер"""
+    server = _start_server(args, IMPROVE_REPLY)
+    previous_url = os.environ.get("OPENROUTER_API_URL")
+    os.environ["OPENROUTER_API_URL"] = server.url
+    
+    def improve(i):
+        call_started = time.perf_counter()
+        try:
+            improve_prompt(f"improve prompt {i}", "mock/improver", "bench-key")
+            return time.perf_counter() - call_started, True
+        except Exception:
+            return time.perf_counter() - call_started, False
+    
+    try:
+        started = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.models) as executor:
+            outcomes = list(executor.map(improve, range(args.rounds)))
+        elapsed = time.perf_counter() - started
+        return summarize([latency for latency, _ in outcomes], elapsed, len(outcomes),
+                         sum(1 for _, ok in outcomes if not ok),
+                         {'unit': 'improve_prompt call', 'concurrency': args.models, **_server_stats(server)})
+    finally:
+        if previous_url is None:
+            os.environ.pop("OPENROUTER_API_URL", None)
+        else:
+            os.environ["OPENROUTER_API_URL"] = previous_url
+        server.stop()
+
+
+def bench_db_save(args) -> Dict:
+    """Сохранение пакетов результатов во временную базу данных"""
+    temp_dir = tempfile.mkdtemp(prefix="chatlist-bench-")
+    previous_db = db.DB_NAME
+    db.DB_NAME = os.path.join(temp_dir, "bench.db")
+    try:
+        db.init_database()
+        model_id = db.create_model("bench-model", "http://127.0.0.1/", MOCK_API_ID, 1, "other")
+        prompt_id = db.create_prompt("bench prompt", "bench")
+        response = "Ответ модели. " * (args.response_size // 14 + 1)
+        batch = [
+            {'prompt_id': prompt_id, 'model_id': model_id, 'response': response, 'selected': 1}
+            for _ in range(args.batch)
+        ]
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            batch_started = time.perf_counter()
+            db.save_results(batch)
+            latencies.append(time.perf_counter() - batch_started)
+        elapsed = time.perf_counter() - started
+        return summarize(latencies, elapsed, args.rounds * args.batch, 0, {
+            'unit': 'result row (latency per batch)',
+            'batch': args.batch,
+            'response_bytes': len(response.encode('utf-8'))
+        })
+    finally:
+        db.close_connections()
+        db.DB_NAME = previous_db
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], Dict]] = {
+    'fanout': bench_fanout,
+    'stream': bench_stream,
+    'improve': bench_improve,
+    'db_save': bench_db_save
+}
+
+
+def compare(current: Dict, baseline: Dict) -> List[str]:
+    """
+    Сравнить результаты с базовым запуском
+    
+    Returns:
+        Строки отчета: изменение пропускной способности и задержек в процентах
+    """
+    lines = []
+    for name, result in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        changes = []
+        pairs = [('throughput', result.get('throughput_per_s'), base.get('throughput_per_s'))]
+        pairs += [(p, result['latency_ms'].get(p), base.get('latency_ms', {}).get(p)) for p in ('p50', 'p95', 'p99')]
+        for label, value, old in pairs:
+            if value is None or not old:
+                continue
+            changes.append(f"{label} {(value - old) / old * 100:+.1f}%")
+        lines.append(f"{name:<8} " + ", ".join(changes))
+    return lines
+
+
+def _configure_environment(args):
+    """Настройки, при которых замеряется путь запроса, а не кэш и защитные механизмы"""
+    os.environ[MOCK_API_ID] = "bench"
+    os.environ["RESPONSE_CACHE_ENABLED"] = "0"  # Повторные промты не должны попадать в кэш
+    os.environ["CIRCUIT_FAILURE_THRESHOLD"] = "0"  # Внедренные ошибки не должны отключать модели
+    os.environ["RETRY_BACKOFF_BASE"] = str(args.backoff)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки пути отправки запросов")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Сценарии через запятую ({', '.join(SCENARIOS)})")
+    parser.add_argument("--models", type=int, default=5, help="Моделей в рассылке (потоков для improve)")
+    parser.add_argument("--rounds", type=int, default=30, help="Повторов каждого сценария")
+    parser.add_argument("--latency", type=float, default=0.02, help="Средняя задержка ответа сервера, сек")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed",
+                        help="Распределение задержки")
+    parser.add_argument("--latency-spread", type=float, default=0.0,
+                        help="Разброс задержки (полуширина для uniform, sigma для lognormal)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--retry-after", type=float, default=0.05, help="Retry-After в ответах 429, сек")
+    parser.add_argument("--backoff", type=float, default=0.05, help="RETRY_BACKOFF_BASE на время бенчмарка, сек")
+    parser.add_argument("--words", type=int, default=50, help="Слов в потоковом ответе")
+    parser.add_argument("--chunk-delay", type=float, default=0.002, help="Пауза между словами потока, сек")
+    parser.add_argument("--batch", type=int, default=100, help="Результатов в пакете db_save")
+    parser.add_argument("--response-size", type=int, default=2000, help="Размер ответа в db_save, символов")
+    parser.add_argument("--seed", type=int, default=None, help="Начальное значение генератора ошибок")
+    parser.add_argument("--output", help="Файл JSON с результатами (по умолчанию - benchmarks/results/)")
+    parser.add_argument("--compare", help="Файл JSON предыдущего запуска для сравнения")
+    args = parser.parse_args(argv)
+    
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    
+    _configure_environment(args)
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'version': version.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'results': {}
+    }
+    
+    print("=" * 60)
+    print("Бенчмарки пути отправки запросов")
+    print("=" * 60)
+    
+    tracemalloc.start()
+    try:
+        for name in scenarios:
+            tracemalloc.reset_peak()
+            result = BENCHMARKS[name](args)
+            report['results'][name] = result
+            latency = result['latency_ms']
+            print(f"{name:<8} {result['throughput_per_s']:>9} оп/с  p50: {latency['p50']} мс  "
+                  f"p95: {latency['p95']} мс  p99: {latency['p99']} мс  ошибок: {result['errors']}  "
+                  f"пик памяти: {result['memory']['peak_traced_mb']} МБ")
+    finally:
+        tracemalloc.stop()
+        network.close_sessions()
+    
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"suite_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {output}")
+    
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"Сравнение с {args.compare}:")
+        for line in compare(report, baseline):
+            print("  " + line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Локальный mock-сервер, совместимый с OpenAI chat/completions API
+"""
+import json
+import math
+import random
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+# Распределения задержки ответа
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'exponential', 'lognormal')
+
+
+def make_latency(distribution: str, mean: float, spread: float = 0.0,
+                 rng: Optional[random.Random] = None) -> Callable[[], float]:
+    """
+    Создать генератор задержки ответа
+    
+    Args:
+        distribution: 'fixed' - всегда mean; 'uniform' - mean ± spread;
+                      'exponential' - среднее mean; 'lognormal' - медиана mean, spread - sigma
+        mean: Средняя (для lognormal - медианная) задержка, сек
+        spread: Разброс: полуширина интервала для uniform или sigma для lognormal
+        rng: Генератор случайных чисел (для воспроизводимости)
+    
+    Returns:
+        Функция без аргументов, возвращающая задержку в секундах
+    
+    Raises:
+        ValueError: Если распределение неизвестно
+    """
+    rng = rng or random.Random()
+    if distribution == 'fixed':
+        return lambda: mean
+    if distribution == 'uniform':
+        return lambda: max(0.0, rng.uniform(mean - spread, mean + spread))
+    if distribution == 'exponential':
+        return lambda: rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+    if distribution == 'lognormal':
+        return lambda: rng.lognormvariate(math.log(mean), spread) if mean > 0 else 0.0
+    raise ValueError(f"Unknown latency distribution: {distribution}")
+
+
+class MockChatHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов chat/completions с keep-alive соединениями"""
+    
+    protocol_version = "HTTP/1.1"
+    
+    def setup(self):
+        super().setup()
+        # Заголовки и тело пишутся отдельно - без TCP_NODELAY keep-alive ответы ждут delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length) if length else b''
+        try:
+            request = json.loads(body or b'{}')
+        except json.JSONDecodeError:
+            request = {}
+        
+        delay = self.server.next_latency()
+        if delay:
+            time.sleep(delay)
+        
+        self.server.record_request()
+        fault = self.server.next_fault()
+        if fault is not None:
+            self._send_error(*fault)
+            return
+        if request.get("stream"):
+            self._send_stream(request)
+            return
+        
+        # Без потока ответ отдается только после "генерации" всех слов
+        if self.server.chunk_delay:
+            time.sleep(self.server.chunk_delay * len(self.server.reply.split(" ")))
+        payload = json.dumps({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.server.reply},
+                "finish_reason": "stop"
+            }],
+            "usage": self._usage(request)
+        }).encode('utf-8')
+        
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def _send_error(self, status: int, retry_after: Optional[float]):
+        """Отдать ошибку в формате OpenAI API"""
+        payload = json.dumps({"error": {"message": f"Mock error {status}", "code": status}}).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if retry_after is not None:
+            self.send_header("Retry-After", f"{retry_after:g}")
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def _usage(self, request: dict) -> dict:
+        """Расход токенов в формате OpenAI (токеном считается слово)"""
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages", []))
+        completion_tokens = len(self.server.reply.split(" "))
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    
+    def _write_chunk(self, data: bytes):
+        """Записать блок в формате Transfer-Encoding: chunked"""
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+    
+    def _send_stream(self, request: dict):
+        """Отдать ответ как server-sent events - по одному слову на событие"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        
+        # Комментарий keep-alive, как у OpenRouter, клиент должен его пропустить
+        self._write_chunk(b": MOCK PROCESSING\n\n")
+        words = self.server.reply.split(" ")
+        for i, word in enumerate(words):
+            if self.server.chunk_delay:
+                time.sleep(self.server.chunk_delay)
+            event = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "model": request.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if i == 0 else " " + word},
+                    "finish_reason": None
+                }]
+            }
+            self._write_chunk(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            # Итоговое событие с расходом токенов и пустым списком choices
+            event = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "choices": [],
+                     "usage": self._usage(request)}
+            self._write_chunk(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+    
+    def log_message(self, format, *args):
+        # Не засорять вывод бенчмарка логом каждого запроса
+        pass
+
+
+class MockChatServer(ThreadingHTTPServer):
+    """Многопоточный mock-сервер, считающий запросы и новые соединения"""
+    
+    daemon_threads = True
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 reply: str = "OK", chunk_delay: float = 0.0,
+                 latency_fn: Optional[Callable[[], float]] = None,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after: Optional[float] = 1.0, seed: Optional[int] = None):
+        """
+        Args:
+            host: Адрес сервера
+            port: Порт (0 - свободный порт)
+            latency: Задержка перед ответом, сек
+            reply: Текст ответа модели
+            chunk_delay: Пауза между словами потокового ответа, сек
+            latency_fn: Генератор задержки перед ответом (см. make_latency); заменяет latency
+            error_rate: Доля ответов 500
+            rate_limit_rate: Доля ответов 429
+            retry_after: Значение Retry-After в ответах 429, сек (None - без заголовка)
+            seed: Начальное значение генератора ошибок (для воспроизводимости)
+        """
+        super().__init__((host, port), MockChatHandler)
+        self.latency = latency
+        self.reply = reply
+        self.chunk_delay = chunk_delay
+        self.latency_fn = latency_fn
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.request_count = 0
+        self.connection_count = 0
+        self.error_count = 0
+        self.rate_limited_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def next_latency(self) -> float:
+        """Задержка очередного ответа, сек"""
+        if self.latency_fn is None:
+            return self.latency
+        with self._lock:
+            return self.latency_fn()
+    
+    def next_fault(self):
+        """Решить, отвечать ли ошибкой: (статус, Retry-After) или None"""
+        if not self.error_rate and not self.rate_limit_rate:
+            return None
+        with self._lock:
+            roll = self._random.random()
+            if roll < self.rate_limit_rate:
+                self.rate_limited_count += 1
+                return 429, self.retry_after
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.error_count += 1
+                return 500, None
+        return None
+    
+    @property
+    def url(self) -> str:
+        """URL эндпоинта chat/completions"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+    
+    def record_request(self):
+        with self._lock:
+            self.request_count += 1
+    
+    def handle_error(self, request, client_address):
+        # Клиент закрыл соединение (отмена запроса, завершение бенчмарка) - не ошибка сервера
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+    
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.connection_count += 1
+        super().process_request(request, client_address)
+    
+    def start(self) -> "MockChatServer":
+        """Запустить сервер в фоновом потоке"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """Остановить сервер"""
+        self.shutdown()
+        self.server_close()
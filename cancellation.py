@@ -0,0 +1,246 @@
+"""
+Модуль для отмены выполняющихся запросов
+"""
+import contextlib
+import functools
+import heapq
+import itertools
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import logger
+
+# Причины отмены
+CANCELLED = 'cancelled'  # Отмена пользователем или после получения нужного числа ответов
+TIMEOUT = 'timeout'  # Истек срок запроса или рассылки
+
+
+class _Timer:
+    """
+    Один поток для всех сроков запросов
+    
+    Функции хранятся в куче по времени срабатывания, поэтому срок
+    не требует отдельного потока на каждый запрос.
+    """
+    
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+    
+    def call_later(self, delay: float, callback: Callable[[], None]) -> list:
+        """Вызвать callback через delay секунд; возвращает запись для cancel()"""
+        entry = [time.monotonic() + delay, next(self._counter), callback]
+        with self._condition:
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ChatList-deadlines", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return entry
+    
+    def cancel(self, entry: list):
+        """Отменить вызов (запись остается в куче до своего времени)"""
+        with self._condition:
+            entry[2] = None
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._condition.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                callback = heapq.heappop(self._heap)[2]
+            if callback is not None:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.log_error("Deadline callback failed", e)
+
+
+_timer = _Timer()
+
+
+class CancelToken:
+    """
+    Признак отмены, общий для группы запросов
+    
+    При отмене закрываются сокеты, через которые запросы в этот момент
+    читают ответ, и вызываются зарегистрированные функции (например,
+    отмена ожидающих future диспетчера). Потоки запросов освобождаются
+    сразу, не дожидаясь ответа сервера или REQUEST_TIMEOUT.
+    
+    Признак может иметь срок (отменяется с причиной TIMEOUT по его истечении)
+    и родителя, отмена которого передается дочернему признаку с той же причиной.
+    """
+    
+    def __init__(self, parent: Optional['CancelToken'] = None, timeout: Optional[float] = None):
+        """
+        Args:
+            parent: Родительский признак (например, признак всей рассылки для одного запроса)
+            timeout: Срок в секундах, по истечении которого признак отменяется (None - без срока)
+        """
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._sockets: Dict[int, socket.socket] = {}  # Сокет текущего запроса каждого потока
+        self._callbacks: List[Callable[[], None]] = []
+        self.reason: Optional[str] = None
+        self._parent = parent
+        self._timer_entry = None
+        if parent is not None:
+            parent.add_callback(self._cancel_from_parent)
+        if timeout is not None and not self.cancelled:
+            self._timer_entry = _timer.call_later(max(0.0, timeout), functools.partial(self.cancel, TIMEOUT))
+    
+    @property
+    def cancelled(self) -> bool:
+        """Была ли вызвана отмена"""
+        return self._event.is_set()
+    
+    @property
+    def timed_out(self) -> bool:
+        """Отменен ли признак по истечении срока (своего или родительского)"""
+        return self.reason == TIMEOUT
+    
+    def _cancel_from_parent(self):
+        self.cancel(self._parent.reason)
+    
+    def release(self):
+        """Снять срок и отвязаться от родителя (запрос завершен)"""
+        if self._timer_entry is not None:
+            _timer.cancel(self._timer_entry)
+            self._timer_entry = None
+        if self._parent is not None:
+            self._parent.remove_callback(self._cancel_from_parent)
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Подождать отмены (вместо time.sleep при паузе между попытками)
+        
+        Args:
+            timeout: Максимальное время ожидания, сек
+        
+        Returns:
+            True, если запросы отменены
+        """
+        return self._event.wait(timeout)
+    
+    def cancel(self, reason: str = CANCELLED):
+        """
+        Отменить запросы: закрыть их сокеты и вызвать зарегистрированные функции
+        
+        Args:
+            reason: Причина отмены (CANCELLED или TIMEOUT)
+        """
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            sockets = list(self._sockets.values())
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+            # Сокеты закрываются под блокировкой: соединение возвращается в пул
+            # только после detach_socket (см. network._CancellableHTTPConnectionPool),
+            # поэтому здесь все сокеты еще принадлежат запросам этого признака
+            for sock in sockets:
+                _shutdown_socket(sock)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.log_error("Cancel callback failed", e)
+    
+    def add_callback(self, callback: Callable[[], None]):
+        """
+        Зарегистрировать функцию, вызываемую при отмене
+        
+        Если отмена уже произошла, функция вызывается сразу.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+    
+    def remove_callback(self, callback: Callable[[], None]):
+        """Удалить функцию, зарегистрированную через add_callback"""
+        with self._lock:
+            try:
+                self._callbacks.remove(callback)
+            except ValueError:
+                pass
+    
+    def attach_socket(self, sock: socket.socket):
+        """Запомнить сокет, через который текущий поток выполняет запрос"""
+        with self._lock:
+            self._sockets[threading.get_ident()] = sock
+            if self._event.is_set():
+                _shutdown_socket(sock)
+    
+    def detach_socket(self, sock: Optional[socket.socket] = None):
+        """
+        Забыть сокет (запрос завершен или соединение возвращается в пул)
+        
+        Args:
+            sock: Сокет соединения (None - сокет текущего потока)
+        """
+        with self._lock:
+            if sock is None:
+                self._sockets.pop(threading.get_ident(), None)
+                return
+            for ident, registered in list(self._sockets.items()):
+                if registered is sock:
+                    del self._sockets[ident]
+
+
+def _shutdown_socket(sock: socket.socket):
+    """Прервать чтение и запись сокета из другого потока"""
+    try:
+        # Метод базового класса: для SSL-сокета не трогает состояние TLS,
+        # которое в этот момент может использовать читающий поток
+        socket.socket.shutdown(sock, socket.SHUT_RDWR)
+    except OSError:
+        pass  # Сокет уже закрыт
+
+
+# Признак отмены запроса, который выполняет текущий поток
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def bind_token(token: Optional[CancelToken]):
+    """
+    Связать признак отмены с запросом, выполняемым в текущем потоке
+    
+    Соединения HTTP-сессий (см. network.py) регистрируют в связанном признаке
+    свои сокеты, поэтому отмена прерывает ожидание ответа и чтение тела.
+    
+    Args:
+        token: Признак отмены (None - запрос не отменяется)
+    """
+    previous = getattr(_local, 'token', None)
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+        if token is not None:
+            token.detach_socket()
+
+
+def attach_socket(sock) -> Optional[CancelToken]:
+    """
+    Зарегистрировать сокет соединения в признаке отмены текущего потока
+    
+    Returns:
+        Признак, в котором зарегистрирован сокет (None - запрос не отменяется);
+        перед возвратом соединения в пул сокет нужно отвязать через detach_socket
+    """
+    token = getattr(_local, 'token', None)
+    if token is not None and isinstance(sock, socket.socket):
+        token.attach_socket(sock)
+        return token
+    return None
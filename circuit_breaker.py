@@ -0,0 +1,119 @@
+"""
+Модуль для временного отключения моделей, которые стабильно возвращают ошибки (circuit breaker)
+"""
+import threading
+import time
+from typing import Dict, Tuple
+from config import get_circuit_failure_threshold, get_circuit_cooldown
+
+# Состояния автомата
+CLOSED = 'closed'  # Запросы проходят
+OPEN = 'open'  # Запросы отклоняются без обращения к API
+HALF_OPEN = 'half_open'  # Пропускается один пробный запрос
+
+
+class CircuitBreaker:
+    """Автомат состояний для одной модели"""
+    
+    def __init__(self, failure_threshold: int, cooldown: float):
+        """
+        Args:
+            failure_threshold: Количество ошибок подряд до отключения (0 - не отключать)
+            cooldown: Время отключения до пробного запроса, сек
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = CLOSED
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        """Текущее состояние с учетом истекшего времени отключения"""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                return HALF_OPEN
+            return self._state
+    
+    def retry_in(self) -> float:
+        """Сколько секунд осталось до пробного запроса"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+    
+    def allow(self) -> bool:
+        """
+        Проверить, можно ли отправить запрос
+        
+        Returns:
+            True, если автомат закрыт или пропускает пробный запрос
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self._state = HALF_OPEN
+            # Полуоткрытое состояние: только один пробный запрос одновременно
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+    
+    def record_success(self):
+        """Зафиксировать успешный ответ - автомат закрывается"""
+        with self._lock:
+            self.failures = 0
+            self._state = CLOSED
+            self._probe_in_flight = False
+    
+    def release(self):
+        """Завершить запрос без оценки результата (например, при отмене) - состояние не меняется"""
+        with self._lock:
+            self._probe_in_flight = False
+    
+    def record_failure(self):
+        """Зафиксировать ошибку - после серии ошибок или неудачной пробы автомат открывается"""
+        with self._lock:
+            self.failures += 1
+            was_probe = self._state == HALF_OPEN
+            self._probe_in_flight = False
+            if was_probe or (self.failure_threshold > 0 and self.failures >= self.failure_threshold):
+                self._state = OPEN
+                self.opened_at = time.monotonic()
+
+
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str, model_name: str) -> CircuitBreaker:
+    """
+    Получить автомат модели (создается при первом обращении)
+    
+    Args:
+        provider: Имя провайдера
+        model_name: Название модели
+    
+    Returns:
+        Общий для процесса CircuitBreaker этой модели
+    """
+    key = (provider, model_name)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(get_circuit_failure_threshold(), get_circuit_cooldown())
+                _breakers[key] = breaker
+    return breaker
+
+
+def get_breaker_state(provider: str, model_name: str) -> str:
+    """Получить состояние автомата модели, не создавая его"""
+    breaker = _breakers.get((provider, model_name))
+    return breaker.state if breaker else CLOSED
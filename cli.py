@@ -0,0 +1,389 @@
+"""
+Консольный запуск ChatList без графического интерфейса
+
+Пакетная рассылка промтов (из файла JSONL/CSV или из базы данных)
+активным моделям с записью результатов в JSONL и в таблицу результатов.
+
+Запуск из корня проекта:
+    python cli.py run --input prompts.jsonl --output results.jsonl
+    python cli.py run --from-db --output results.jsonl --models gpt-4o,deepseek-chat
+    python main.py run ...  (то же самое через основную точку входа)
+"""
+import argparse
+import concurrent.futures
+import csv
+import hashlib
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import db
+import metrics
+import models
+from cancellation import CancelToken
+from config import get_fanout_deadline, get_metrics_port
+import logger
+
+# Размер страницы при чтении промтов из базы данных
+DB_PAGE_SIZE = 500
+
+# Команды, которые main.py передает этому модулю вместо запуска окна
+COMMANDS = ('run',)
+
+
+def prompt_key(prompt: Dict) -> str:
+    """
+    Ключ промта для возобновления прерванного запуска
+    
+    Args:
+        prompt: Промт ('id' - из файла или базы данных, 'prompt' - текст)
+    
+    Returns:
+        Явный id промта или отпечаток текста
+    """
+    if prompt.get('id') not in (None, ''):
+        return str(prompt['id'])
+    return hashlib.sha256(prompt['prompt'].encode('utf-8')).hexdigest()[:16]
+
+
+def read_prompts_file(path: str) -> Iterator[Dict]:
+    """
+    Прочитать промты из файла
+    
+    JSONL: на строке объект с ключом 'prompt' (и необязательными 'id', 'tags')
+    или просто строка JSON. CSV: заголовок со столбцом 'prompt' (и 'id', 'tags').
+    
+    Args:
+        path: Путь к файлу .jsonl или .csv
+    
+    Yields:
+        Словари {'id', 'prompt', 'tags'}
+    
+    Raises:
+        ValueError: Если формат файла не распознан или строка некорректна
+    """
+    if path.lower().endswith('.csv'):
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f)
+            if not reader.fieldnames or 'prompt' not in reader.fieldnames:
+                raise ValueError(f"{path}: CSV file must have a 'prompt' column")
+            for row in reader:
+                if (row.get('prompt') or '').strip():
+                    yield {'id': row.get('id') or None, 'prompt': row['prompt'], 'tags': row.get('tags') or ''}
+        return
+    
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON: {e}")
+            if isinstance(item, str):
+                item = {'prompt': item}
+            if not isinstance(item, dict) or not str(item.get('prompt') or '').strip():
+                raise ValueError(f"{path}:{line_number}: expected a string or an object with 'prompt'")
+            yield {'id': item.get('id'), 'prompt': str(item['prompt']), 'tags': item.get('tags') or ''}
+
+
+def read_prompts_db() -> Iterator[Dict]:
+    """Прочитать все промты из базы данных (постранично, новые первыми)"""
+    after = None
+    while True:
+        page = db.get_prompts_page(DB_PAGE_SIZE, after)
+        for prompt in page:
+            yield {'id': prompt['id'], 'prompt': prompt['prompt'], 'tags': prompt.get('tags') or '',
+                   'prompt_id': prompt['id']}
+        if len(page) < DB_PAGE_SIZE:
+            return
+        after = (page[-1]['date'], page[-1]['id'])
+
+
+def load_completed(path: str, successful_only: bool = False) -> Set[Tuple[str, str]]:
+    """
+    Прочитать уже записанные результаты, чтобы не отправлять их повторно
+    
+    Незавершенная последняя строка (запуск прерван во время записи) пропускается.
+    
+    Args:
+        path: Путь к выходному файлу JSONL
+        successful_only: Учитывать только успешные ответы (ошибки будут отправлены заново)
+    
+    Returns:
+        Множество пар (ключ промта, название модели)
+    """
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(record, dict) or 'prompt_key' not in record or 'model_name' not in record:
+                continue
+            if record.get('success') or not successful_only:
+                completed.add((record['prompt_key'], record['model_name']))
+    return completed
+
+
+class ResultWriter:
+    """Потокобезопасная дозапись результатов в JSONL"""
+    
+    def __init__(self, path: str):
+        # Если прошлый запуск оборвался посреди строки, новая запись начинается с новой строки
+        needs_newline = False
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+        self._file = open(path, 'a', encoding='utf-8')
+        if needs_newline:
+            self._file.write('\n')
+        self._lock = threading.Lock()
+    
+    def write(self, records: List[Dict]):
+        """Записать результаты и сбросить их на диск"""
+        with self._lock:
+            for record in records:
+                self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+    
+    def close(self):
+        self._file.close()
+
+
+class BatchRunner:
+    """Рассылка пакета промтов моделям с ограничением числа одновременно обрабатываемых промтов"""
+    
+    def __init__(self, model_list: List[models.Model], writer: ResultWriter, completed: Set[Tuple[str, str]],
+                 parallel: int = 4, save_db: bool = True, use_cache: bool = True,
+                 deadline: float = 0, stop_after: int = 0):
+        """
+        Args:
+            model_list: Модели, которым отправляются промты
+            writer: Запись результатов в JSONL
+            completed: Уже полученные пары (ключ промта, название модели)
+            parallel: Сколько промтов обрабатывается одновременно
+                      (число одновременных HTTP-запросов ограничивает диспетчер)
+            save_db: Сохранять успешные ответы в таблицу результатов
+            use_cache: Использовать кэш ответов
+            deadline: Срок рассылки одного промта, сек (0 - без срока)
+            stop_after: Прекратить ожидание промта после стольких успешных ответов (0 - ждать все)
+        """
+        self.model_list = model_list
+        self.writer = writer
+        self.completed = completed
+        self.parallel = max(1, parallel)
+        self.save_db = save_db
+        self.use_cache = use_cache
+        self.deadline = deadline
+        self.stop_after = stop_after
+        self.cancel_token = CancelToken()
+        self.stats = {'prompts': 0, 'skipped': 0, 'results': 0, 'success': 0}
+        self._stats_lock = threading.Lock()
+    
+    def run_prompt(self, prompt: Dict):
+        """Отправить один промт моделям, для которых еще нет результата"""
+        key = prompt_key(prompt)
+        pending = [model for model in self.model_list if (key, model.name) not in self.completed]
+        if not pending:
+            with self._stats_lock:
+                self.stats['skipped'] += 1
+            return
+        
+        # Промт из файла связывается с промтом базы данных с тем же текстом,
+        # поэтому повторный и возобновленный запуски не создают его копии
+        prompt_id = prompt.get('prompt_id')
+        if self.save_db and prompt_id is None:
+            prompt_id = db.get_or_create_prompt_async(prompt['prompt'], prompt.get('tags', '')).result()
+        
+        records = []
+        results = []
+        for result in models.iter_prompt_to_models(prompt['prompt'], pending, None, self.use_cache,
+                                                   self.cancel_token, self.stop_after, self.deadline):
+            # Запросы, отмененные остановкой запуска, будут отправлены при следующем запуске
+            if result['cancelled'] and not result['timed_out'] and self.cancel_token.cancelled:
+                continue
+            results.append(result)
+            records.append({
+                'prompt_key': key,
+                'prompt_id': prompt_id,
+                'prompt': prompt['prompt'],
+                'model_id': result['model_id'],
+                'model_name': result['model_name'],
+                'success': result['success'],
+                'response': result['response'],
+                'error': result['error'],
+                'attempts': result['attempts'],
+                'cache_hit': result['cache_hit'],
+                'timed_out': result['timed_out'],
+                **{field: result[field] for field in models.STATS_FIELDS},
+                'finished_at': datetime.now().isoformat(timespec='seconds')
+            })
+        
+        # Сначала JSONL, затем база данных: возобновленный запуск не отправляет записанный в JSONL
+        # запрос повторно, поэтому результат не попадет в базу данных дважды
+        if records:
+            self.writer.write(records)
+        # Результаты сохраняются выбранными, как сохраненные из окна: их показывает история промтов
+        saved = [{**result, 'selected': 1} for result in results if result['success']]
+        if self.save_db and saved:
+            db.save_results_async(saved, prompt_id).result()
+        
+        with self._stats_lock:
+            self.stats['prompts'] += 1
+            self.stats['results'] += len(records)
+            self.stats['success'] += sum(1 for record in records if record['success'])
+            done = self.stats['prompts'] + self.stats['skipped']
+        print(f"[{done}] {prompt['prompt'][:60]!r}: "
+              f"{sum(1 for r in records if r['success'])}/{len(records)} ok", file=sys.stderr)
+    
+    def run(self, prompts: Iterator[Dict]):
+        """
+        Обработать все промты
+        
+        Промты читаются из итератора по мере освобождения слотов,
+        поэтому файл на тысячи промтов не загружается в память целиком.
+        """
+        with concurrent.futures.ThreadPoolExecutor(self.parallel, thread_name_prefix="ChatList-batch") as executor:
+            running = set()
+            for prompt in prompts:
+                if self.cancel_token.cancelled:
+                    break
+                if len(running) >= self.parallel:
+                    done, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                running.add(executor.submit(self.run_prompt, prompt))
+            for future in concurrent.futures.as_completed(running):
+                future.result()
+
+
+def select_models(names: Optional[str]) -> List[models.Model]:
+    """
+    Выбрать модели для запуска
+    
+    Args:
+        names: Названия моделей через запятую (None - все активные модели)
+    
+    Returns:
+        Список моделей
+    
+    Raises:
+        ValueError: Если модель с указанным названием не найдена
+    """
+    if not names:
+        return models.get_active_models_list()
+    by_name = {model['name']: model for model in db.get_all_models()}
+    selected = []
+    for name in (name.strip() for name in names.split(',')):
+        if not name:
+            continue
+        if name not in by_name:
+            raise ValueError(f"Model '{name}' not found in the database")
+        selected.append(models.Model(by_name[name]))
+    return selected
+
+
+def cmd_run(args) -> int:
+    """Команда run: пакетная рассылка промтов"""
+    db.init_database()
+    try:
+        model_list = select_models(args.models)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    if not model_list:
+        print("Error: no active models", file=sys.stderr)
+        return 2
+    
+    if args.from_db:
+        prompts = read_prompts_db()
+    else:
+        if not os.path.exists(args.input):
+            print(f"Error: file not found: {args.input}", file=sys.stderr)
+            return 2
+        prompts = read_prompts_file(args.input)
+    
+    completed = set() if args.restart else load_completed(args.output, args.retry_failed)
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+    if completed:
+        print(f"Resuming: {len(completed)} results already in {args.output}", file=sys.stderr)
+    
+    writer = ResultWriter(args.output)
+    runner = BatchRunner(model_list, writer, completed, args.parallel, not args.no_save,
+                         not args.no_cache, args.deadline, args.stop_after)
+    
+    # Ctrl+C прерывает выполняющиеся запросы; полученные результаты уже записаны
+    def on_interrupt(signum, frame):
+        print("Interrupted, cancelling requests...", file=sys.stderr)
+        runner.cancel_token.cancel()
+    
+    previous_handler = signal.getsignal(signal.SIGINT)
+    started = time.perf_counter()
+    try:
+        signal.signal(signal.SIGINT, on_interrupt)
+        metrics.start_metrics_server(args.metrics_port)
+        runner.run(prompts)
+    except ValueError as e:
+        runner.cancel_token.cancel()
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        writer.close()
+        metrics.stop_metrics_server()
+        db.shutdown_db_writer()
+        db.close_connections()
+    
+    stats = runner.stats
+    print(f"Done in {time.perf_counter() - started:.1f}s: {stats['prompts']} prompts, "
+          f"{stats['success']}/{stats['results']} successful results, "
+          f"{stats['skipped']} prompts already complete", file=sys.stderr)
+    logger.log_info(f"CLI run finished: {stats}")
+    return 130 if runner.cancel_token.cancelled else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="chatlist", description="ChatList без графического интерфейса")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    run = subparsers.add_parser("run", help="Отправить пакет промтов активным моделям")
+    source = run.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", "-i", help="Файл с промтами (.jsonl или .csv)")
+    source.add_argument("--from-db", action="store_true", help="Промты из базы данных")
+    run.add_argument("--output", "-o", required=True, help="Файл результатов JSONL (дописывается)")
+    run.add_argument("--models", help="Названия моделей через запятую (по умолчанию - активные)")
+    run.add_argument("--parallel", type=int, default=4, help="Сколько промтов обрабатывать одновременно")
+    run.add_argument("--deadline", type=float, default=get_fanout_deadline(),
+                     help="Срок рассылки одного промта, сек (0 - без срока)")
+    run.add_argument("--stop-after", type=int, default=0,
+                     help="Не ждать остальные модели после стольких успешных ответов")
+    run.add_argument("--no-cache", action="store_true", help="Не использовать кэш ответов")
+    run.add_argument("--no-save", action="store_true", help="Не сохранять ответы в базу данных")
+    run.add_argument("--retry-failed", action="store_true",
+                     help="При возобновлении повторить запросы, завершившиеся ошибкой")
+    run.add_argument("--restart", action="store_true", help="Начать заново, удалив файл результатов")
+    run.add_argument("--metrics-port", type=int, default=get_metrics_port(),
+                     help="Порт эндпоинта метрик Prometheus (0 - выключен)")
+    run.set_defaults(func=cmd_run)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -65,3 +65,188 @@ def get_max_results() -> int:
     """Получить максимальное количество результатов"""
     return int(get_setting("MAX_RESULTS_PER_REQUEST", "10"))
 
+
+def get_pool_connections() -> int:
+    """Получить количество пулов соединений (по одному на хост) в HTTP-сессии"""
+    return int(get_setting("HTTP_POOL_CONNECTIONS", "10"))
+
+
+def get_pool_maxsize() -> int:
+    """Получить максимальное количество keep-alive соединений в пуле одного хоста"""
+    return int(get_setting("HTTP_POOL_MAXSIZE", "20"))
+
+
+def get_max_concurrency() -> int:
+    """Получить глобальный лимит одновременных запросов к API"""
+    return int(get_setting("MAX_CONCURRENT_REQUESTS", "16"))
+
+
+def get_provider_concurrency(provider: str) -> int:
+    """
+    Получить лимит одновременных запросов к одному провайдеру
+    
+    Args:
+        provider: Имя провайдера (например, 'openrouter')
+    
+    Returns:
+        Значение MAX_CONCURRENT_<PROVIDER> или MAX_CONCURRENT_PER_PROVIDER;
+        если ни одно не задано - глобальный лимит MAX_CONCURRENT_REQUESTS
+    """
+    default = get_setting("MAX_CONCURRENT_PER_PROVIDER") or str(get_max_concurrency())
+    return int(get_setting(f"MAX_CONCURRENT_{provider.upper()}", default))
+
+
+def get_provider_url(provider: str) -> str:
+    """
+    Получить адрес chat/completions, заменяющий стандартный эндпоинт провайдера
+    
+    Args:
+        provider: Имя провайдера (например, 'openrouter')
+    
+    Returns:
+        Значение <PROVIDER>_API_URL или пустая строка (использовать стандартный эндпоинт)
+    """
+    return get_setting(f"{provider.upper()}_API_URL", "")
+
+
+def get_max_retries() -> int:
+    """Получить максимальное количество повторов запроса при 429/5xx"""
+    return int(get_setting("MAX_RETRIES", "3"))
+
+
+def get_retry_backoff() -> float:
+    """Получить базовую задержку экспоненциального отката между повторами, сек"""
+    return float(get_setting("RETRY_BACKOFF_BASE", "1.0"))
+
+
+def get_retry_backoff_max() -> float:
+    """Получить максимальную задержку между повторами, сек"""
+    return float(get_setting("RETRY_BACKOFF_MAX", "30"))
+
+
+def get_request_deadline() -> float:
+    """Получить общий лимит времени на запрос с учетом всех повторов, сек"""
+    return float(get_setting("REQUEST_DEADLINE", "120"))
+
+
+def get_connect_timeout() -> float:
+    """Получить лимит времени на установку соединения, сек"""
+    return float(get_setting("CONNECT_TIMEOUT", "10"))
+
+
+def get_first_byte_timeout() -> float:
+    """Получить лимит ожидания первого байта ответа (и паузы между байтами), сек"""
+    return float(get_setting("FIRST_BYTE_TIMEOUT", str(get_request_timeout())))
+
+
+def get_fanout_deadline() -> float:
+    """Получить срок рассылки промта всем моделям, сек (0 - ждать все модели)"""
+    return float(get_setting("FANOUT_DEADLINE", "0"))
+
+
+def get_rate_limit_rpm(provider: str) -> float:
+    """
+    Получить лимит запросов в минуту для провайдера (0 - без ограничения)
+    
+    Args:
+        provider: Имя провайдера (например, 'groq')
+    
+    Returns:
+        Значение RATE_LIMIT_RPM_<PROVIDER> или RATE_LIMIT_RPM
+    """
+    default = get_setting("RATE_LIMIT_RPM", "0")
+    return float(get_setting(f"RATE_LIMIT_RPM_{provider.upper()}", default))
+
+
+def get_rate_limit_tpm(provider: str) -> float:
+    """
+    Получить лимит токенов промта в минуту для провайдера (0 - без ограничения)
+    
+    Args:
+        provider: Имя провайдера (например, 'groq')
+    
+    Returns:
+        Значение RATE_LIMIT_TPM_<PROVIDER> или RATE_LIMIT_TPM
+    """
+    default = get_setting("RATE_LIMIT_TPM", "0")
+    return float(get_setting(f"RATE_LIMIT_TPM_{provider.upper()}", default))
+
+
+def get_circuit_failure_threshold() -> int:
+    """Получить количество ошибок подряд, после которого модель временно отключается (0 - никогда)"""
+    return int(get_setting("CIRCUIT_FAILURE_THRESHOLD", "3"))
+
+
+def get_circuit_cooldown() -> float:
+    """Получить время, на которое отключается модель после серии ошибок, сек"""
+    return float(get_setting("CIRCUIT_COOLDOWN", "60"))
+
+
+def is_response_cache_enabled() -> bool:
+    """Проверить, включен ли кэш ответов моделей (по умолчанию выключен)"""
+    return get_setting("RESPONSE_CACHE_ENABLED", "0") == "1"
+
+
+def get_response_cache_ttl() -> float:
+    """Получить время жизни записи в кэше ответов, сек"""
+    return float(get_setting("RESPONSE_CACHE_TTL", "86400"))
+
+
+def get_response_cache_max_entries() -> int:
+    """Получить максимальное количество записей в кэше ответов"""
+    return int(get_setting("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+
+
+def get_db_busy_timeout() -> int:
+    """Получить время ожидания блокировки базы данных, мс"""
+    return int(get_setting("DB_BUSY_TIMEOUT", "5000"))
+
+
+def get_db_cache_size_kb() -> int:
+    """Получить размер кэша страниц SQLite на соединение, КБ"""
+    return int(get_setting("DB_CACHE_SIZE_KB", "16384"))
+
+
+def get_db_mmap_size() -> int:
+    """Получить размер отображаемой в память части файла базы данных, байт (0 - выключено)"""
+    return int(get_setting("DB_MMAP_SIZE", "134217728"))
+
+
+def get_db_write_queue_size() -> int:
+    """Получить размер очереди фоновой записи в базу данных (операций)"""
+    return int(get_setting("DB_WRITE_QUEUE_SIZE", "1000"))
+
+
+def get_markdown_cache_size() -> int:
+    """Получить количество ответов, HTML которых хранится в кэше окна просмотра Markdown"""
+    return int(get_setting("MARKDOWN_CACHE_SIZE", "128"))
+
+
+def get_metrics_port() -> int:
+    """Получить порт HTTP-эндпоинта метрик (0 - эндпоинт выключен)"""
+    return int(get_setting("METRICS_PORT", "0"))
+
+
+def get_metrics_host() -> str:
+    """Получить адрес, на котором слушает эндпоинт метрик"""
+    return get_setting("METRICS_HOST", "127.0.0.1")
+
+
+def get_log_format() -> str:
+    """Получить формат журнала: 'text' или 'json' (JSON Lines)"""
+    return get_setting("LOG_FORMAT", "text").strip().lower()
+
+
+def get_log_max_bytes() -> int:
+    """Получить размер файла журнала, после которого он ротируется, байт"""
+    return int(get_setting("LOG_MAX_BYTES", "10485760"))
+
+
+def get_log_backup_count() -> int:
+    """Получить количество хранимых архивных файлов журнала"""
+    return int(get_setting("LOG_BACKUP_COUNT", "5"))
+
+
+def get_log_rotate_when() -> str:
+    """Получить интервал ротации журнала по времени ('midnight', 'H', 'D'...; пусто - ротация по размеру)"""
+    return get_setting("LOG_ROTATE_WHEN", "").strip()
@@ -2,10 +2,19 @@
 Модуль для работы с базой данных SQLite
 """
 import sqlite3
+import concurrent.futures
+import hashlib
 import os
+import queue
+import re
 import sys
+import threading
+import time
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
+from config import get_db_busy_timeout, get_db_cache_size_kb, get_db_mmap_size, get_db_write_queue_size
+import metrics
+import logger
 
 # Определяем путь к базе данных
 # Если запущено как исполняемый файл, сохраняем в AppData пользователя
@@ -27,13 +36,147 @@ else:
     DB_NAME = "chatlist.db"
 
 
-def get_db_connection():
-    """Создать и вернуть соединение с базой данных"""
-    conn = sqlite3.connect(DB_NAME)
+# Соединения потоков: у каждого потока свое долгоживущее соединение для каждого файла БД
+_local = threading.local()
+_connections: List[Tuple[threading.Thread, sqlite3.Connection]] = []
+_connections_lock = threading.Lock()
+# Номер поколения соединений: после close_connections потоки открывают новые соединения
+_connections_generation = 0
+
+
+def _open_connection(path: str) -> sqlite3.Connection:
+    """Открыть соединение и настроить его"""
+    # check_same_thread=False только для закрытия из другого потока: соединение используется одним потоком
+    conn = sqlite3.connect(path, timeout=get_db_busy_timeout() / 1000, check_same_thread=False)
     conn.row_factory = sqlite3.Row  # Для доступа к колонкам по имени
+    # WAL: читатели (поток GUI) не блокируются записью из потоков запросов
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{get_db_cache_size_kb()}")
+    conn.execute(f"PRAGMA mmap_size={get_db_mmap_size()}")
+    conn.execute(f"PRAGMA busy_timeout={get_db_busy_timeout()}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    with _connections_lock:
+        # Соединения завершившихся потоков (например, QThread отправки запросов) закрываются
+        alive = [(thread, c) for thread, c in _connections if thread.is_alive()]
+        for thread, c in _connections:
+            if not thread.is_alive():
+                c.close()
+        _connections[:] = alive
+        _connections.append((threading.current_thread(), conn))
+    return conn
+
+
+def get_db_connection():
+    """
+    Получить соединение с базой данных для текущего потока
+    
+    Соединение создается при первом обращении потока и переиспользуется
+    дальнейшими вызовами, поэтому закрывать его не нужно.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None or _local.generation != _connections_generation:
+        # Первое обращение потока или соединения закрыты через close_connections
+        connections = _local.connections = {}
+        _local.generation = _connections_generation
+    conn = connections.get(DB_NAME)
+    if conn is None:
+        conn = connections[DB_NAME] = _open_connection(DB_NAME)
+    elif conn.in_transaction:
+        # Транзакция, оставшаяся от прерванного исключением вызова
+        conn.rollback()
+        _discard_changes()
     return conn
 
 
+def close_connections():
+    """
+    Закрыть соединения всех потоков (при завершении приложения)
+    
+    Потоки, которые обратятся к базе данных после этого, получат новые соединения.
+    """
+    global _connections_generation
+    with _connections_lock:
+        connections = list(_connections)
+        _connections.clear()
+        _connections_generation += 1
+    for _, conn in connections:
+        conn.close()
+
+
+# ========== События изменений ==========
+
+# Счетчик изменений растет монотонно; событие с номером seq отражает состояние после seq изменений
+_change_seq = 0
+_change_listeners: List[Callable[[Dict], None]] = []
+_change_lock = threading.Lock()
+
+
+def add_change_listener(listener: Callable[[Dict], None]):
+    """
+    Подписаться на изменения промтов и результатов
+    
+    Слушатель вызывается после фиксации транзакции в потоке, который ее выполнил,
+    с событием {'seq': int, 'table': 'prompts' | 'results',
+    'action': 'insert' | 'delete' | 'update', 'ids': [int, ...]}.
+    """
+    with _change_lock:
+        _change_listeners.append(listener)
+
+
+def remove_change_listener(listener: Callable[[Dict], None]):
+    """Отписаться от изменений"""
+    with _change_lock:
+        if listener in _change_listeners:
+            _change_listeners.remove(listener)
+
+
+def get_change_counter() -> int:
+    """Получить номер последнего изменения"""
+    return _change_seq
+
+
+def _record_change(table: str, action: str, ids: List[int]):
+    """Запомнить изменение текущей транзакции (отправляется после commit)"""
+    if ids:
+        pending = getattr(_local, 'pending_changes', None)
+        if pending is None:
+            pending = _local.pending_changes = []
+        pending.append((table, action, list(ids)))
+
+
+def _discard_changes(keep: int = 0):
+    """Отбросить изменения отмененной транзакции (кроме первых keep)"""
+    pending = getattr(_local, 'pending_changes', None)
+    if pending:
+        del pending[keep:]
+
+
+def _pending_change_count() -> int:
+    return len(getattr(_local, 'pending_changes', None) or [])
+
+
+def _commit(conn: sqlite3.Connection):
+    """Зафиксировать транзакцию и оповестить слушателей об изменениях"""
+    global _change_seq
+    conn.commit()
+    pending = getattr(_local, 'pending_changes', None)
+    if not pending:
+        return
+    _local.pending_changes = []
+    for table, action, ids in pending:
+        with _change_lock:
+            _change_seq += 1
+            event = {'seq': _change_seq, 'table': table, 'action': action, 'ids': ids}
+            listeners = list(_change_listeners)
+        for listener in listeners:
+            # Транзакция уже зафиксирована: ошибка слушателя не должна стать ошибкой записи
+            try:
+                listener(event)
+            except Exception as e:
+                logger.log_error("Database change listener failed", e)
+
+
 def init_database():
     """Инициализировать базу данных, создать все таблицы"""
     conn = get_db_connection()
@@ -50,6 +193,7 @@ def init_database():
     """)
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_prompts_date ON prompts(date)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_prompts_tags ON prompts(tags)")
+    _init_prompt_hash(cursor)
     
     # Таблица моделей
     cursor.execute("""
@@ -91,24 +235,161 @@ def init_database():
         )
     """)
     
+    # Кэш ответов моделей
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS response_cache (
+            key TEXT PRIMARY KEY,
+            model_name TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_last_access ON response_cache(last_access)")
+    
+    _init_fts(cursor)
+    
     conn.commit()
-    conn.close()
+
+
+# ========== Полнотекстовый поиск ==========
+
+# Индексы FTS5 (external content) над таблицами и их индексируемые колонки
+FTS_TABLES = {
+    'prompts_fts': ('prompts', ('prompt', 'tags')),
+    'results_fts': ('results', ('response',)),
+}
+
+# Созданы ли индексы FTS5 (None - еще не проверено); без них поиск выполняется через LIKE
+_fts_available: Optional[bool] = None
+
+
+def _init_fts(cursor: sqlite3.Cursor):
+    """Создать индексы FTS5 и триггеры синхронизации; заполнить индексы существующими данными"""
+    global _fts_available
+    for fts_table, (table, columns) in FTS_TABLES.items():
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,))
+        exists = cursor.fetchone() is not None
+        column_list = ", ".join(columns)
+        new_values = ", ".join(f"new.{c}" for c in columns)
+        old_values = ", ".join(f"old.{c}" for c in columns)
+        try:
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+                    {column_list}, content='{table}', content_rowid='id', tokenize='unicode61'
+                )
+            """)
+        except sqlite3.OperationalError:
+            # SQLite собран без FTS5
+            _fts_available = False
+            return
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.id, {new_values});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF {column_list} ON {table} BEGIN
+                INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+                INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.id, {new_values});
+            END
+        """)
+        if not exists:
+            # Миграция базы, созданной до появления полнотекстового поиска
+            cursor.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+    _fts_available = True
+
+
+def _fts_enabled(cursor: sqlite3.Cursor) -> bool:
+    """Проверить, есть ли в базе индексы FTS5"""
+    global _fts_available
+    if _fts_available is None:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'results_fts'")
+        _fts_available = cursor.fetchone() is not None
+    return _fts_available
+
+
+def _fts_query(query: str) -> str:
+    """
+    Преобразовать строку поиска в запрос FTS5
+    
+    Каждое слово ищется как префикс, все слова должны присутствовать:
+    'спис кортеж' -> '"спис"* "кортеж"*'
+    """
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"*' for word in words)
 
 
 # ========== CRUD операции для prompts ==========
 
-def create_prompt(prompt: str, tags: str = "") -> int:
-    """Создать новый промт"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def _prompt_hash(prompt: str) -> int:
+    """Хэш текста промта для поиска по индексу (первые 8 байт SHA-256 как знаковое 64-битное число)"""
+    return int.from_bytes(hashlib.sha256(prompt.encode('utf-8')).digest()[:8], 'big', signed=True)
+
+
+def _init_prompt_hash(cursor: sqlite3.Cursor):
+    """Добавить индексированный хэш текста промта и заполнить его для существующих промтов"""
+    cursor.execute("PRAGMA table_info(prompts)")
+    if 'prompt_hash' not in {row['name'] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE prompts ADD COLUMN prompt_hash INTEGER")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_prompts_prompt_hash ON prompts(prompt_hash)")
+    # Промты без хэша: созданные до его появления или предыдущими версиями приложения
+    cursor.execute("SELECT id, prompt FROM prompts WHERE prompt_hash IS NULL")
+    rows = cursor.fetchall()
+    if rows:
+        cursor.executemany(
+            "UPDATE prompts SET prompt_hash = ? WHERE id = ?",
+            [(_prompt_hash(row['prompt']), row['id']) for row in rows]
+        )
+
+
+def _insert_prompt(cursor: sqlite3.Cursor, prompt: str, tags: str = "") -> int:
     date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     cursor.execute(
-        "INSERT INTO prompts (date, prompt, tags) VALUES (?, ?, ?)",
-        (date, prompt, tags)
+        "INSERT INTO prompts (date, prompt, tags, prompt_hash) VALUES (?, ?, ?, ?)",
+        (date, prompt, tags, _prompt_hash(prompt))
     )
-    prompt_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    _record_change('prompts', 'insert', [cursor.lastrowid])
+    return cursor.lastrowid
+
+
+def _merge_tags(tags: str, new_tags: str) -> str:
+    """Объединить списки тегов через запятую без повторов, сохраняя порядок"""
+    merged = []
+    for tag in f"{tags or ''},{new_tags or ''}".split(','):
+        tag = tag.strip()
+        if tag and tag not in merged:
+            merged.append(tag)
+    return ", ".join(merged)
+
+
+def _get_or_insert_prompt(cursor: sqlite3.Cursor, prompt: str, tags: str = "") -> int:
+    """Найти последний промт с тем же текстом (добавив к нему новые теги) или создать новый"""
+    # Поиск по индексу хэша; сравнение текста исключает совпадение хэшей разных промтов
+    cursor.execute(
+        "SELECT id, tags FROM prompts WHERE prompt_hash = ? AND prompt = ? ORDER BY id DESC LIMIT 1",
+        (_prompt_hash(prompt), prompt)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return _insert_prompt(cursor, prompt, tags)
+    merged = _merge_tags(row['tags'], tags)
+    if merged != (row['tags'] or ''):
+        cursor.execute("UPDATE prompts SET tags = ? WHERE id = ?", (merged, row['id']))
+        _record_change('prompts', 'update', [row['id']])
+    return row['id']
+
+
+def create_prompt(prompt: str, tags: str = "") -> int:
+    """Создать новый промт"""
+    conn = get_db_connection()
+    prompt_id = _insert_prompt(conn.cursor(), prompt, tags)
+    _commit(conn)
     return prompt_id
 
 
@@ -118,7 +399,46 @@ def get_all_prompts() -> List[Dict]:
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM prompts ORDER BY date DESC")
     prompts = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    return prompts
+
+
+def get_prompts_page(limit: int, after: Optional[Tuple[str, int]] = None) -> List[Dict]:
+    """
+    Получить страницу промтов (новые первыми) с пагинацией по ключу (date, id)
+    
+    В отличие от OFFSET, стоимость запроса не растет с номером страницы:
+    чтение начинается с позиции в индексе idx_prompts_date (записи индекса
+    упорядочены по (date, id), отдельная сортировка не нужна).
+    
+    Args:
+        limit: Количество промтов на странице
+        after: (date, id) последнего промта предыдущей страницы; None - первая страница
+    
+    Returns:
+        Список промтов
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if after is None:
+        cursor.execute("SELECT * FROM prompts ORDER BY date DESC, id DESC LIMIT ?", (limit,))
+    else:
+        cursor.execute(
+            "SELECT * FROM prompts WHERE (date, id) < (?, ?) ORDER BY date DESC, id DESC LIMIT ?",
+            (after[0], after[1], limit)
+        )
+    prompts = [dict(row) for row in cursor.fetchall()]
+    return prompts
+
+
+def get_prompts_by_ids(prompt_ids: List[int]) -> List[Dict]:
+    """Получить промты по списку ID (отсутствующие пропускаются)"""
+    if not prompt_ids:
+        return []
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    placeholders = ", ".join("?" * len(prompt_ids))
+    cursor.execute(f"SELECT * FROM prompts WHERE id IN ({placeholders})", list(prompt_ids))
+    prompts = [dict(row) for row in cursor.fetchall()]
     return prompts
 
 
@@ -128,32 +448,61 @@ def get_prompt_by_id(prompt_id: int) -> Optional[Dict]:
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM prompts WHERE id = ?", (prompt_id,))
     row = cursor.fetchone()
-    conn.close()
     return dict(row) if row else None
 
 
-def search_prompts(query: str) -> List[Dict]:
-    """Поиск промтов по тексту или тегам"""
+def search_prompts(query: str, limit: int = 200, mark_start: str = "[", mark_end: str = "]") -> List[Dict]:
+    """
+    Поиск промтов по тексту или тегам
+    
+    Args:
+        query: Строка поиска (слова ищутся по префиксу)
+        limit: Максимальное количество результатов
+        mark_start: Маркер начала найденного слова во фрагменте
+        mark_end: Маркер конца найденного слова во фрагменте
+    
+    Returns:
+        Список промтов, наиболее релевантные (bm25) первыми; 'snippet' - фрагмент
+        текста с выделенными словами
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
-    search_pattern = f"%{query}%"
-    cursor.execute(
-        "SELECT * FROM prompts WHERE prompt LIKE ? OR tags LIKE ? ORDER BY date DESC",
-        (search_pattern, search_pattern)
-    )
+    if not _fts_enabled(cursor):
+        search_pattern = f"%{query}%"
+        cursor.execute(
+            "SELECT *, substr(prompt, 1, 100) AS snippet FROM prompts WHERE prompt LIKE ? OR tags LIKE ? ORDER BY date DESC LIMIT ?",
+            (search_pattern, search_pattern, limit)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    
+    fts_query = _fts_query(query)
+    if not fts_query:
+        return []
+    cursor.execute("""
+        SELECT p.*, snippet(prompts_fts, -1, ?, ?, '…', 12) AS snippet
+        FROM prompts_fts
+        JOIN prompts p ON p.id = prompts_fts.rowid
+        WHERE prompts_fts MATCH ?
+        ORDER BY bm25(prompts_fts, 1.0, 2.0)
+        LIMIT ?
+    """, (mark_start, mark_end, fts_query, limit))
     prompts = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return prompts
 
 
+def _delete_prompt(cursor: sqlite3.Cursor, prompt_id: int) -> bool:
+    cursor.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
+    deleted = cursor.rowcount > 0
+    if deleted:
+        _record_change('prompts', 'delete', [prompt_id])
+    return deleted
+
+
 def delete_prompt(prompt_id: int) -> bool:
     """Удалить промт"""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
-    deleted = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    deleted = _delete_prompt(conn.cursor(), prompt_id)
+    _commit(conn)
     return deleted
 
 
@@ -170,7 +519,6 @@ def create_model(name: str, api_url: str, api_id: str, is_active: int = 1, model
     )
     model_id = cursor.lastrowid
     conn.commit()
-    conn.close()
     return model_id
 
 
@@ -180,7 +528,6 @@ def get_active_models() -> List[Dict]:
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM models WHERE is_active = 1 ORDER BY name")
     models = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return models
 
 
@@ -190,7 +537,6 @@ def get_all_models() -> List[Dict]:
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM models ORDER BY name")
     models = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return models
 
 
@@ -201,7 +547,6 @@ def update_model_status(model_id: int, is_active: int) -> bool:
     cursor.execute("UPDATE models SET is_active = ? WHERE id = ?", (is_active, model_id))
     updated = cursor.rowcount > 0
     conn.commit()
-    conn.close()
     return updated
 
 
@@ -215,7 +560,6 @@ def update_model(model_id: int, name: str, api_url: str, api_id: str, is_active:
     )
     updated = cursor.rowcount > 0
     conn.commit()
-    conn.close()
     return updated
 
 
@@ -226,34 +570,43 @@ def delete_model(model_id: int) -> bool:
     cursor.execute("DELETE FROM models WHERE id = ?", (model_id,))
     deleted = cursor.rowcount > 0
     conn.commit()
-    conn.close()
     return deleted
 
 
 # ========== CRUD операции для results ==========
 
-def save_results(results_list: List[Dict]) -> int:
-    """Сохранить список результатов"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def _insert_results(cursor: sqlite3.Cursor, results_list: List[Dict],
+                    prompt_id: Optional[int] = None) -> List[int]:
+    """Вставить результаты одним executemany; вернуть их id (prompt_id - для результатов без него)"""
+    if not results_list:
+        return []
     created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    count = 0
-    
-    for result in results_list:
-        cursor.execute(
-            "INSERT INTO results (prompt_id, model_id, response, selected, created_at) VALUES (?, ?, ?, ?, ?)",
+    cursor.executemany(
+        "INSERT INTO results (prompt_id, model_id, response, selected, created_at) VALUES (?, ?, ?, ?, ?)",
+        [
             (
-                result.get('prompt_id'),
+                result.get('prompt_id', prompt_id),
                 result.get('model_id'),
                 result.get('response'),
                 result.get('selected', 0),
                 created_at
             )
-        )
-        count += 1
-    
-    conn.commit()
-    conn.close()
+            for result in results_list
+        ]
+    )
+    # Внутри транзакции запись заблокирована для других соединений,
+    # поэтому id вставленных строк идут подряд
+    last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+    ids = list(range(last_id - len(results_list) + 1, last_id + 1))
+    _record_change('results', 'insert', ids)
+    return ids
+
+
+def save_results(results_list: List[Dict]) -> int:
+    """Сохранить список результатов (одной транзакцией)"""
+    conn = get_db_connection()
+    count = len(_insert_results(conn.cursor(), results_list))
+    _commit(conn)
     return count
 
 
@@ -269,7 +622,6 @@ def get_all_results() -> List[Dict]:
         ORDER BY r.created_at DESC
     """)
     results = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return results
 
 
@@ -285,25 +637,53 @@ def get_results_by_prompt(prompt_id: int) -> List[Dict]:
         ORDER BY r.created_at
     """, (prompt_id,))
     results = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return results
 
 
-def search_results(query: str) -> List[Dict]:
-    """Поиск результатов по тексту ответа"""
+def search_results(query: str, limit: int = 200, mark_start: str = "[", mark_end: str = "]") -> List[Dict]:
+    """
+    Поиск результатов по тексту ответа
+    
+    Args:
+        query: Строка поиска (слова ищутся по префиксу)
+        limit: Максимальное количество результатов
+        mark_start: Маркер начала найденного слова во фрагменте
+        mark_end: Маркер конца найденного слова во фрагменте
+    
+    Returns:
+        Список результатов с model_name и prompt_text, наиболее релевантные (bm25)
+        первыми; 'snippet' - фрагмент ответа с выделенными словами
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
-    search_pattern = f"%{query}%"
+    if not _fts_enabled(cursor):
+        search_pattern = f"%{query}%"
+        cursor.execute("""
+            SELECT r.*, m.name as model_name, p.prompt as prompt_text, substr(r.response, 1, 100) AS snippet
+            FROM results r
+            LEFT JOIN models m ON r.model_id = m.id
+            LEFT JOIN prompts p ON r.prompt_id = p.id
+            WHERE r.response LIKE ?
+            ORDER BY r.created_at DESC
+            LIMIT ?
+        """, (search_pattern, limit))
+        return [dict(row) for row in cursor.fetchall()]
+    
+    fts_query = _fts_query(query)
+    if not fts_query:
+        return []
     cursor.execute("""
-        SELECT r.*, m.name as model_name, p.prompt as prompt_text
-        FROM results r
+        SELECT r.*, m.name as model_name, p.prompt as prompt_text,
+               snippet(results_fts, 0, ?, ?, '…', 16) AS snippet
+        FROM results_fts
+        JOIN results r ON r.id = results_fts.rowid
         LEFT JOIN models m ON r.model_id = m.id
         LEFT JOIN prompts p ON r.prompt_id = p.id
-        WHERE r.response LIKE ?
-        ORDER BY r.created_at DESC
-    """, (search_pattern,))
+        WHERE results_fts MATCH ?
+        ORDER BY bm25(results_fts)
+        LIMIT ?
+    """, (mark_start, mark_end, fts_query, limit))
     results = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return results
 
 
@@ -313,8 +693,9 @@ def delete_result(result_id: int) -> bool:
     cursor = conn.cursor()
     cursor.execute("DELETE FROM results WHERE id = ?", (result_id,))
     deleted = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    if deleted:
+        _record_change('results', 'delete', [result_id])
+    _commit(conn)
     return deleted
 
 
@@ -326,15 +707,294 @@ def get_setting(key: str, default: str = "") -> str:
     cursor = conn.cursor()
     cursor.execute("SELECT value FROM settings WHERE key = ?", (key,))
     row = cursor.fetchone()
-    conn.close()
     return row['value'] if row else default
 
 
+def _upsert_setting(cursor: sqlite3.Cursor, key: str, value: str):
+    cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+
+
+def _upsert_settings(cursor: sqlite3.Cursor, settings: Dict[str, str]):
+    cursor.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", list(settings.items()))
+
+
 def set_setting(key: str, value: str):
     """Установить настройку"""
     conn = get_db_connection()
+    _upsert_setting(conn.cursor(), key, value)
+    conn.commit()
+
+
+# ========== Кэш ответов ==========
+
+def get_cached_response(key: str, ttl: float) -> Optional[str]:
+    """
+    Получить ответ из кэша и отметить обращение (для вытеснения LRU)
+    
+    Args:
+        key: Ключ кэша
+        ttl: Время жизни записи, сек
+    
+    Returns:
+        Текст ответа или None, если записи нет или она устарела
+    """
+    conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+    now = time.time()
+    cursor.execute(
+        "SELECT response FROM response_cache WHERE key = ? AND created_at >= ?",
+        (key, now - ttl)
+    )
+    row = cursor.fetchone()
+    if row:
+        cursor.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+        conn.commit()
+    return row['response'] if row else None
+
+
+def put_cached_response(key: str, model_name: str, response: str, max_entries: int):
+    """
+    Сохранить ответ в кэш, вытеснив давно не использованные записи сверх лимита
+    
+    Args:
+        key: Ключ кэша
+        model_name: Название модели
+        response: Текст ответа
+        max_entries: Максимальное количество записей в кэше
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    now = time.time()
+    cursor.execute(
+        "INSERT OR REPLACE INTO response_cache (key, model_name, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+        (key, model_name, response, now, now)
+    )
+    cursor.execute("""
+        DELETE FROM response_cache WHERE key IN (
+            SELECT key FROM response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+        )
+    """, (max_entries,))
     conn.commit()
-    conn.close()
 
+
+def purge_response_cache(ttl: float) -> int:
+    """Удалить устаревшие записи кэша, вернуть количество удаленных"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM response_cache WHERE created_at < ?", (time.time() - ttl,))
+    deleted = cursor.rowcount
+    conn.commit()
+    return deleted
+
+
+def clear_response_cache():
+    """Очистить кэш ответов"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM response_cache")
+    conn.commit()
+
+
+# ========== Фоновая запись ==========
+
+def _insert_prompt_results(cursor: sqlite3.Cursor, results_list: List[Dict], prompt_id: Optional[int],
+                           prompt: str, tags: str) -> Tuple[int, List[int]]:
+    if prompt_id is None:
+        prompt_id = _insert_prompt(cursor, prompt, tags)
+    return prompt_id, _insert_results(cursor, results_list, prompt_id)
+
+
+class DBWriter:
+    """
+    Фоновый поток записи в базу данных
+    
+    Операции ставятся в ограниченную очередь и выполняются пачками: все операции,
+    накопившиеся в очереди, записываются одной транзакцией (group commit).
+    Каждая операция выполняется в своей точке сохранения, поэтому ошибка одной
+    операции не отменяет остальные в пачке.
+    """
+    
+    def __init__(self, queue_size: Optional[int] = None):
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size or get_db_write_queue_size())
+        self._thread = threading.Thread(target=self._run, name="ChatList-db-writer", daemon=True)
+        self._thread.start()
+    
+    def submit(self, func: Callable, *args) -> concurrent.futures.Future:
+        """
+        Поставить операцию записи в очередь (блокируется, если очередь заполнена)
+        
+        Args:
+            func: Функция (курсор, *args), выполняющая запись без commit
+            *args: Аргументы функции
+        
+        Returns:
+            Future с результатом функции (доступен после фиксации транзакции)
+        """
+        future = concurrent.futures.Future()
+        self._queue.put((func, args, future))
+        return future
+    
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            # Забрать все операции, накопившиеся за время предыдущей записи
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+            if stop:
+                return
+    
+    def queue_depth(self) -> int:
+        """Получить количество операций, ожидающих записи"""
+        return self._queue.qsize()
+    
+    def _write_batch(self, batch: List[Tuple[Callable, tuple, concurrent.futures.Future]]):
+        started = time.perf_counter()
+        try:
+            self._write_transaction(batch)
+        finally:
+            metrics.DB_WRITE_DURATION.observe(time.perf_counter() - started)
+            metrics.DB_WRITE_OPERATIONS.inc(len(batch))
+    
+    def _write_transaction(self, batch: List[Tuple[Callable, tuple, concurrent.futures.Future]]):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        outcomes = []
+        try:
+            cursor.execute("BEGIN")
+            for func, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                cursor.execute("SAVEPOINT write_op")
+                recorded = _pending_change_count()
+                try:
+                    outcomes.append((future, func(cursor, *args), None))
+                    cursor.execute("RELEASE write_op")
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO write_op")
+                    cursor.execute("RELEASE write_op")
+                    _discard_changes(recorded)
+                    outcomes.append((future, None, e))
+            _commit(conn)
+        except Exception as e:
+            # Транзакция не зафиксирована - ошибка для всех операций пачки
+            if conn.in_transaction:
+                conn.rollback()
+            _discard_changes()
+            for func, args, future in batch:
+                if future.running() or (not future.done() and future.set_running_or_notify_cancel()):
+                    future.set_exception(e)
+            return
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+    
+    def shutdown(self):
+        """Записать оставшиеся операции и остановить поток"""
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+
+
+_writer: Optional[DBWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_db_writer() -> DBWriter:
+    """Получить общий поток записи (создается при первом обращении)"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = DBWriter()
+    return _writer
+
+
+metrics.DB_WRITE_QUEUE.set_function(lambda: _writer.queue_depth() if _writer is not None else 0)
+
+
+def shutdown_db_writer():
+    """Дописать очередь и остановить поток записи, если он был создан"""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.shutdown()
+            _writer = None
+
+
+def init_database_async() -> concurrent.futures.Future:
+    """
+    Инициализировать базу данных в отдельном потоке
+    
+    Returns:
+        Future, завершающийся после создания таблиц и индексов (или с ошибкой)
+    """
+    future = concurrent.futures.Future()
+    
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            init_database()
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(None)
+    
+    threading.Thread(target=run, name="ChatList-db-init", daemon=True).start()
+    return future
+
+
+def create_prompt_async(prompt: str, tags: str = "") -> concurrent.futures.Future:
+    """Создать промт в фоновом потоке; Future с id промта"""
+    return get_db_writer().submit(_insert_prompt, prompt, tags)
+
+
+def get_or_create_prompt_async(prompt: str, tags: str = "") -> concurrent.futures.Future:
+    """Найти промт с тем же текстом или создать новый в фоновом потоке; Future с id промта"""
+    return get_db_writer().submit(_get_or_insert_prompt, prompt, tags)
+
+
+def save_results_async(results_list: List[Dict], prompt_id: Optional[int] = None,
+                       prompt: str = "", tags: str = "") -> concurrent.futures.Future:
+    """
+    Сохранить результаты в фоновом потоке
+    
+    Args:
+        results_list: Список результатов (prompt_id, model_id, response, selected)
+        prompt_id: ID промта для результатов без prompt_id; если None - промт
+                   prompt/tags создается в той же транзакции
+        prompt: Текст нового промта
+        tags: Теги нового промта
+    
+    Returns:
+        Future с кортежем (id промта, список id результатов)
+    """
+    return get_db_writer().submit(_insert_prompt_results, results_list, prompt_id, prompt, tags)
+
+
+def set_setting_async(key: str, value: str) -> concurrent.futures.Future:
+    """Установить настройку в фоновом потоке; Future завершается после фиксации"""
+    return get_db_writer().submit(_upsert_setting, key, value)
+
+
+def set_settings_async(settings: Dict[str, str]) -> concurrent.futures.Future:
+    """Установить несколько настроек одной операцией в фоновом потоке (все или ни одной)"""
+    return get_db_writer().submit(_upsert_settings, settings)
+
+
+def delete_prompt_async(prompt_id: int) -> concurrent.futures.Future:
+    """Удалить промт в фоновом потоке; Future с признаком удаления"""
+    return get_db_writer().submit(_delete_prompt, prompt_id)
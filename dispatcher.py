@@ -0,0 +1,221 @@
+"""
+Модуль для асинхронной рассылки запросов к моделям
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+from config import get_max_concurrency, get_provider_concurrency
+import metrics
+
+if TYPE_CHECKING:
+    from cancellation import CancelToken
+
+# Сколько вызовов на один глобальный слот могут ждать внутри себя без слота (см. released_slot)
+PAUSED_PER_SLOT = 3
+
+# Интервал проверки, работает ли еще loop, при ожидании его ответа из потока пула, сек
+LOOP_POLL_INTERVAL = 1.0
+
+# Слот вызова, выполняющегося в текущем потоке пула
+_worker = threading.local()
+
+
+class _Slot:
+    """Глобальный слот, занятый вызовом диспетчера; состояние меняется только в потоке loop"""
+    
+    def __init__(self, dispatcher: 'Dispatcher'):
+        self.dispatcher = dispatcher
+        self.held = True
+        self.finished = False
+
+
+def _run_in_slot(slot: _Slot, func: Callable, args: tuple):
+    _worker.slot = slot
+    try:
+        return func(*args)
+    finally:
+        _worker.slot = None
+
+
+class Dispatcher:
+    """
+    Диспетчер запросов с одним долгоживущим event loop
+    
+    Loop работает в отдельном потоке, блокирующие HTTP-вызовы выполняются
+    в общем пуле потоков фиксированного размера. Параллельность ограничена
+    глобальным семафором и семафором каждого провайдера. Вызов, ожидающий
+    внутри себя (см. released_slot), на это время отдает глобальный слот.
+    """
+    
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self.max_concurrency = max_concurrency or get_max_concurrency()
+        self._loop = asyncio.new_event_loop()
+        self.max_paused = self.max_concurrency * PAUSED_PER_SLOT
+        # Потоки для выполняющихся вызовов и для ожидающих без глобального слота
+        # (создаются пулом по мере надобности)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_concurrency + self.max_paused,
+            thread_name_prefix="ChatList-request"
+        )
+        self._global_semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._provider_semaphores: Dict[str, asyncio.Semaphore] = {}
+        # Изменяются только в потоке loop
+        self.waiting = 0  # Ожидают слота провайдера или глобального слота
+        self.running = 0  # Выполняются в пуле потоков
+        self.paused = 0  # Выполняются, но ожидают внутри вызова без глобального слота
+        self._thread = threading.Thread(target=self._run_loop, name="ChatList-dispatcher", daemon=True)
+        self._thread.start()
+    
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+    
+    def _provider_semaphore(self, provider: str) -> asyncio.Semaphore:
+        # Вызывается только из потока loop, блокировка не нужна
+        semaphore = self._provider_semaphores.get(provider)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(get_provider_concurrency(provider))
+            self._provider_semaphores[provider] = semaphore
+        return semaphore
+    
+    async def _call(self, provider: str, func: Callable, args: tuple):
+        # Сначала слот провайдера, затем глобальный - чтобы ожидание одного
+        # перегруженного провайдера не занимало глобальные слоты
+        self.waiting += 1
+        slot = None
+        try:
+            async with self._provider_semaphore(provider):
+                await self._global_semaphore.acquire()
+                slot = _Slot(self)
+                self.waiting -= 1
+                self.running += 1
+                try:
+                    return await self._loop.run_in_executor(
+                        self._executor, functools.partial(_run_in_slot, slot, func, args)
+                    )
+                finally:
+                    slot.finished = True
+                    if slot.held:
+                        self._global_semaphore.release()
+        finally:
+            if slot is None:
+                self.waiting -= 1
+            elif slot.held:
+                self.running -= 1
+            else:
+                self.paused -= 1
+    
+    async def _pause(self, slot: _Slot) -> bool:
+        # Без слота ждут не больше max_paused вызовов - на них рассчитан запас потоков пула
+        if not slot.held or slot.finished or self.paused >= self.max_paused:
+            return False
+        slot.held = False
+        self.running -= 1
+        self.paused += 1
+        self._global_semaphore.release()
+        return True
+    
+    async def _resume(self, slot: _Slot):
+        await self._global_semaphore.acquire()
+        if slot.finished:
+            self._global_semaphore.release()
+            return
+        slot.held = True
+        self.paused -= 1
+        self.running += 1
+    
+    def _run_from_worker(self, coro, cancel_token: Optional['CancelToken'] = None):
+        """Выполнить корутину в loop и дождаться ее из потока пула; None - если отменена"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        if cancel_token is not None:
+            cancel_token.add_callback(future.cancel)
+        try:
+            while True:
+                try:
+                    return future.result(LOOP_POLL_INTERVAL)
+                except concurrent.futures.TimeoutError:
+                    # Остановленный при завершении приложения loop уже не ответит
+                    if not self._loop.is_running():
+                        future.cancel()
+                        return None
+        except concurrent.futures.CancelledError:
+            return None
+        finally:
+            if cancel_token is not None:
+                cancel_token.remove_callback(future.cancel)
+    
+    def submit(self, provider: str, func: Callable, *args) -> concurrent.futures.Future:
+        """
+        Поставить блокирующий вызов в очередь диспетчера
+        
+        Args:
+            provider: Имя провайдера, по которому применяется лимит
+            func: Вызываемая функция
+            *args: Аргументы функции
+        
+        Returns:
+            Future, который можно ожидать из любого потока
+        """
+        return asyncio.run_coroutine_threadsafe(self._call(provider, func, args), self._loop)
+    
+    def shutdown(self):
+        """Остановить event loop и пул потоков"""
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._loop.close()
+
+
+_dispatcher: Optional[Dispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> Dispatcher:
+    """Получить общий диспетчер приложения (создается при первом обращении)"""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = Dispatcher()
+    return _dispatcher
+
+
+metrics.DISPATCHER_REQUESTS.set_function(lambda: _dispatcher.waiting if _dispatcher is not None else 0, state='waiting')
+metrics.DISPATCHER_REQUESTS.set_function(lambda: _dispatcher.running if _dispatcher is not None else 0, state='running')
+metrics.DISPATCHER_REQUESTS.set_function(lambda: _dispatcher.paused if _dispatcher is not None else 0, state='paused')
+
+
+@contextlib.contextmanager
+def released_slot(cancel_token: Optional['CancelToken'] = None):
+    """
+    Отдать глобальный слот диспетчера на время ожидания внутри вызова
+    
+    Вызов, ждущий лимита частоты или паузы перед повтором, не задерживает запросы
+    к другим провайдерам; слот провайдера остается занятым. По выходе из блока слот
+    занимается снова. Вне потоков диспетчера ничего не делает.
+    
+    Args:
+        cancel_token: Признак отмены; отмена прерывает ожидание возврата слота
+    """
+    slot = getattr(_worker, 'slot', None)
+    dispatcher = slot.dispatcher if slot is not None else None
+    if dispatcher is None or not dispatcher._run_from_worker(dispatcher._pause(slot)):
+        yield
+        return
+    try:
+        yield
+    finally:
+        # Отмененный вызов завершается без слота: дальше он только возвращает результат
+        dispatcher._run_from_worker(dispatcher._resume(slot), cancel_token)
+
+
+def shutdown_dispatcher():
+    """Остановить общий диспетчер, если он был создан"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is not None:
+            _dispatcher.shutdown()
+            _dispatcher = None
@@ -1,36 +1,193 @@
 """
 Модуль для логирования
+
+Записи ставятся в очередь (QueueHandler), а в файл и на консоль их пишет
+фоновый поток (QueueListener), поэтому вызов логирования из потока GUI или
+потока запроса не ждет диска. Каталог, файл журнала и поток записи создаются
+при первой записи, а не при импорте модуля.
 """
+import atexit
+import json
 import logging
 import os
-from datetime import datetime
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+from config import get_log_backup_count, get_log_format, get_log_max_bytes, get_log_rotate_when
 import version
 
-# Создаем директорию для логов, если её нет
 LOG_DIR = "logs"
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
 
-# Настройка логирования
-LOG_FILE = os.path.join(LOG_DIR, f"chatlist_{datetime.now().strftime('%Y%m%d')}.log")
+# Текущий файл журнала; архивы ротации получают суффикс (.1, .2 или дату)
+LOG_FILE = os.path.join(LOG_DIR, "chatlist.log")
+
+TEXT_FORMAT = f'%(asctime)s - ChatList v{version.__version__} - %(name)s - %(levelname)s - %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирование записи одной строкой JSON (JSON Lines)"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'version': version.__version__,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        # Структурированные поля (например, метрики запроса из log_request_metrics)
+        metrics = getattr(record, 'metrics', None)
+        if metrics is not None:
+            data['metrics'] = metrics
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.Handler):
+    """
+    Постановка записей в очередь без форматирования
+    
+    В отличие от logging.handlers.QueueHandler, который форматирует запись
+    в вызывающем потоке и склеивает сообщение с трассировкой, вызывающий поток
+    только подставляет аргументы сообщения, а оформление (текст или JSON)
+    выполняет фоновый поток.
+    """
+    
+    def __init__(self, log_queue: queue.SimpleQueue):
+        super().__init__()
+        self.queue = log_queue
+    
+    def emit(self, record: logging.LogRecord):
+        try:
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                # Трассировку нельзя передать в другой поток как объект - только текстом
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            self.queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+
+def _create_file_handler() -> logging.Handler:
+    """Файловый обработчик с ротацией по времени (LOG_ROTATE_WHEN) или по размеру (LOG_MAX_BYTES)"""
+    import logging.handlers
+    when = get_log_rotate_when()
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(
+            LOG_FILE, when=when, backupCount=get_log_backup_count(), encoding='utf-8'
+        )
+    return logging.handlers.RotatingFileHandler(
+        LOG_FILE, maxBytes=get_log_max_bytes(), backupCount=get_log_backup_count(), encoding='utf-8'
+    )
+
+
+_listener = None  # logging.handlers.QueueListener
+_root_handler: Optional[logging.Handler] = None  # Обработчик корневого логгера: очередь или запасной вывод на консоль
+_configured = False  # После shutdown_logging логирование повторно не настраивается
+_setup_lock = threading.Lock()
+
+
+def setup_logging():
+    """
+    Настроить логирование: очередь в корневом логгере и фоновый поток записи
+    
+    Формат записей задает LOG_FORMAT ('text' или 'json').
+    """
+    global _configured
+    with _setup_lock:
+        if _configured:
+            return
+        try:
+            file_error = _start_listener()
+        except Exception as e:
+            # Ошибка журнала не должна доходить до вызывающего кода: записи пишутся на консоль напрямую
+            file_error = e
+            _start_fallback()
+        _configured = True
+    # Логировать версию при старте
+    logger.info(f"ChatList v{version.__version__} started")
+    if file_error is not None:
+        logger.warning(f"Файл журнала {LOG_FILE} недоступен, записи выводятся только на консоль: {file_error}")
+    # Дописать очередь при завершении программы
+    atexit.register(shutdown_logging)
+
+
+def _start_listener() -> Optional[Exception]:
+    """Запустить фоновый поток записи; возвращает ошибку создания файла журнала, если она была"""
+    global _listener, _root_handler
+    import logging.handlers
+    formatter = JsonFormatter() if get_log_format() == 'json' else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    file_error = None
+    try:
+        # Создаем директорию для логов, если её нет
+        os.makedirs(LOG_DIR, exist_ok=True)
+        handlers.insert(0, _create_file_handler())
+    except Exception as e:
+        # Неверные настройки ротации или недоступный каталог - журнал только на консоли
+        file_error = e
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    _root_handler = _QueueHandler(log_queue)
+    root.addHandler(_root_handler)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return file_error
+
+
+def _start_fallback():
+    """Запасная настройка без очереди: записи пишутся на консоль (stderr) в вызывающем потоке"""
+    global _listener, _root_handler
+    root = logging.getLogger()
+    if _root_handler is not None:
+        root.removeHandler(_root_handler)
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    _root_handler = logging.StreamHandler()
+    _root_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root.setLevel(logging.INFO)
+    root.addHandler(_root_handler)
+
+
+def shutdown_logging():
+    """Записать оставшиеся в очереди записи и остановить фоновый поток"""
+    global _listener, _root_handler
+    if _root_handler is not None:
+        logging.getLogger().removeHandler(_root_handler)
+        _root_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
 
-logging.basicConfig(
-    level=logging.INFO,
-    format=f'%(asctime)s - ChatList v{version.__version__} - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 
 logger = logging.getLogger('ChatList')
 
-# Логировать версию при старте
-logger.info(f"ChatList v{version.__version__} started")
+
+def _get_logger() -> logging.Logger:
+    """Получить логгер приложения, настроив логирование при первом обращении"""
+    if not _configured:
+        setup_logging()
+    return logger
 
 
 def log_api_request(model_name: str, prompt: str, success: bool, error: str = None):
     """Логировать запрос к API"""
+    logger = _get_logger()
     if success:
         logger.info(f"API Request - Model: {model_name}, Prompt: {prompt[:100]}..., Status: Success")
     else:
@@ -39,6 +196,7 @@ def log_api_request(model_name: str, prompt: str, success: bool, error: str = No
 
 def log_error(message: str, exception: Exception = None):
     """Логировать ошибку"""
+    logger = _get_logger()
     if exception:
         logger.error(f"{message}: {str(exception)}", exc_info=True)
     else:
@@ -47,5 +205,17 @@ def log_error(message: str, exception: Exception = None):
 
 def log_info(message: str):
     """Логировать информационное сообщение"""
-    logger.info(message)
+    _get_logger().info(message)
+
 
+def log_request_metrics(record: dict):
+    """
+    Логировать метрики запроса к API одной строкой JSON
+    
+    Args:
+        record: Поля запроса (провайдер, модель, статус, время этапов, байты, токены);
+                доступны обработчикам журнала как атрибут записи 'metrics'
+    """
+    _get_logger().info(
+        f"API Metrics - {json.dumps(record, ensure_ascii=False, default=str)}", extra={'metrics': record}
+    )
@@ -3,37 +3,81 @@
 Графический интерфейс для отправки промтов в несколько нейросетей
 """
 import sys
+import startup_profile
+
+# Профилирование запуска включается до остальных импортов, чтобы учесть их время
+if startup_profile.FLAG in sys.argv:
+    startup_profile.enable()
+
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QTextEdit, QPushButton, QTableWidget, QTableWidgetItem, QCheckBox,
+    QTextEdit, QPushButton, QTableView, QCheckBox,
     QListWidget, QListWidgetItem, QLineEdit, QLabel, QSplitter,
     QMessageBox, QDialog, QDialogButtonBox, QFormLayout, QComboBox,
     QHeaderView, QProgressBar, QGroupBox, QFileDialog, QSpinBox,
-    QStyledItemDelegate, QTextBrowser, QMenu
+    QStyledItemDelegate, QTextBrowser, QMenu, QListView, QStyle, QStyleOptionViewItem
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QSize
-from PyQt5.QtGui import QFont, QColor, QIcon, QPalette
+from PyQt5.QtCore import (
+    Qt, QThread, pyqtSignal, QSize, QAbstractListModel, QAbstractTableModel, QModelIndex,
+    QPointF, QTimer
+)
+from PyQt5.QtGui import QFont, QColor, QIcon, QPalette, QFontMetrics, QTextLayout
 from datetime import datetime
+import importlib
+import threading
 import db
 import models
-from models import send_prompt_to_models
+import metrics
+from models import iter_prompt_to_models, STATS_FIELDS
+from cancellation import CancelToken
 import logger
 import json
+import html
 import os
-import markdown
-from prompt_improver import improve_prompt, APIError as PromptImproverError
-from config import get_api_key
+import time
+from markdown_render import get_markdown_renderer
+from config import get_api_key, get_fanout_deadline
+from providers import resolve_adapter
+import circuit_breaker
 import version
 
 
+# Отметки состояния автоматического отключения модели в панели моделей
+CIRCUIT_MARKS = {
+    circuit_breaker.OPEN: ' ⛔',
+    circuit_breaker.HALF_OPEN: ' ◐',
+}
+
+# Модули, не нужные для показа окна: загружаются в фоне после его появления,
+# чтобы первый запрос и первый просмотр Markdown не ждали импорта
+DEFERRED_MODULES = ('network', 'dispatcher', 'markdown', 'prompt_improver')
+
+
+def preload_modules():
+    """Загрузить DEFERRED_MODULES в фоновом потоке"""
+    def run():
+        for name in DEFERRED_MODULES:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                logger.log_error(f"Preloading module {name} failed", e)
+    threading.Thread(target=run, name="ChatList-preload", daemon=True).start()
+
+
 class MarkdownViewerDialog(QDialog):
     """Диалог для просмотра ответа в форматированном markdown"""
     
+    # HTML готов: (исходный текст, Future с HTML) - доставляется из потока конвертации
+    html_ready = pyqtSignal(str, object)
+    
     def __init__(self, parent=None, model_name="", response_text=""):
         super().__init__(parent)
         self.setWindowTitle(f"Ответ модели: {model_name}")
         self.setModal(True)
         self.resize(800, 600)
+        self._text = None
+        self._html_shown = False
+        self.html_ready.connect(self._on_html_ready)
         self.init_ui(model_name, response_text)
     
     def init_ui(self, model_name, response_text):
@@ -46,76 +90,7 @@ class MarkdownViewerDialog(QDialog):
         # Текстовый браузер для отображения HTML (конвертированный markdown)
         self.text_browser = QTextBrowser()
         self.text_browser.setOpenExternalLinks(True)
-        
-        # Конвертировать markdown в HTML
-        try:
-            # Попробовать с расширениями, если не получится - без них
-            try:
-                html_content = markdown.markdown(
-                    response_text,
-                    extensions=['extra', 'codehilite', 'tables', 'fenced_code']
-                )
-            except:
-                # Если расширения недоступны, использовать базовый markdown
-                html_content = markdown.markdown(response_text)
-            # Добавить базовые стили для лучшего отображения
-            styled_html = f"""
-            <style>
-                body {{
-                    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
-                    line-height: 1.6;
-                    color: #333;
-                    padding: 20px;
-                }}
-                pre {{
-                    background-color: #f4f4f4;
-                    border: 1px solid #ddd;
-                    border-radius: 4px;
-                    padding: 10px;
-                    overflow-x: auto;
-                }}
-                code {{
-                    background-color: #f4f4f4;
-                    padding: 2px 4px;
-                    border-radius: 3px;
-                    font-family: 'Courier New', monospace;
-                }}
-                pre code {{
-                    background-color: transparent;
-                    padding: 0;
-                }}
-                table {{
-                    border-collapse: collapse;
-                    width: 100%;
-                    margin: 10px 0;
-                }}
-                table th, table td {{
-                    border: 1px solid #ddd;
-                    padding: 8px;
-                    text-align: left;
-                }}
-                table th {{
-                    background-color: #f2f2f2;
-                    font-weight: bold;
-                }}
-                blockquote {{
-                    border-left: 4px solid #ddd;
-                    margin: 0;
-                    padding-left: 20px;
-                    color: #666;
-                }}
-                h1, h2, h3, h4, h5, h6 {{
-                    margin-top: 20px;
-                    margin-bottom: 10px;
-                }}
-            </style>
-            {html_content}
-            """
-            self.text_browser.setHtml(styled_html)
-        except Exception as e:
-            # Если ошибка конвертации, показать как обычный текст
-            self.text_browser.setPlainText(response_text)
-            logger.log_error(f"Error converting markdown to HTML: {str(e)}")
+        self.set_markdown(response_text)
         
         layout.addWidget(self.text_browser)
         
@@ -125,6 +100,56 @@ class MarkdownViewerDialog(QDialog):
         layout.addWidget(buttons)
         
         self.setLayout(layout)
+    
+    def set_markdown(self, response_text, final=True):
+        """
+        Отобразить текст ответа; HTML берется из кэша или конвертируется в фоновом потоке
+        
+        Args:
+            response_text: Текст ответа в markdown
+            final: Текст окончательный (False - промежуточный текст потоковой выдачи, не кэшируется)
+        """
+        self._text = response_text
+        renderer = get_markdown_renderer()
+        html = renderer.get_cached(response_text)
+        if html is not None:
+            self._show_html(html)
+            return
+        if not self._html_shown:
+            # До готовности HTML показать исходный текст
+            self.text_browser.setPlainText(response_text)
+        future = renderer.submit(response_text, cache=final)
+        future.add_done_callback(lambda f, text=response_text: self._emit_html_ready(text, f))
+    
+    def _emit_html_ready(self, text, future):
+        try:
+            self.html_ready.emit(text, future)
+        except RuntimeError:
+            pass  # Диалог уже закрыт и удален
+    
+    def _on_html_ready(self, text, future):
+        if text != self._text:
+            return  # Пока шла конвертация, текст обновился
+        try:
+            self._show_html(future.result())
+        except Exception as e:
+            # Если ошибка конвертации, показать как обычный текст
+            self.text_browser.setPlainText(text)
+            logger.log_error(f"Error converting markdown to HTML: {str(e)}")
+    
+    def _show_html(self, html):
+        """Показать HTML, сохранив позицию прокрутки (в конце текста - остаться в конце)"""
+        scroll_bar = self.text_browser.verticalScrollBar()
+        at_bottom = self._html_shown and scroll_bar.value() >= scroll_bar.maximum()
+        position = scroll_bar.value() if self._html_shown else 0
+        # Документ у каждого окна свой и разбирается в потоке GUI
+        self.text_browser.setHtml(html)
+        self._html_shown = True
+        scroll_bar.setValue(scroll_bar.maximum() if at_bottom else position)
+    
+    def update_text(self, response_text, final=False):
+        """Обновить текст по мере потоковой выдачи ответа, сохранив позицию прокрутки"""
+        self.set_markdown(response_text, final)
 
 
 class ModelDialog(QDialog):
@@ -254,17 +279,49 @@ class ModelDialog(QDialog):
 
 class RequestThread(QThread):
     """Поток для асинхронной отправки запросов"""
+    result_ready = pyqtSignal(dict)  # Результат очередной ответившей модели
+    partial_ready = pyqtSignal(dict)  # Накопленный текст модели при потоковой выдаче
     finished = pyqtSignal(list)
     progress = pyqtSignal(str)
     
-    def __init__(self, prompt, model_list):
+    # Минимальный интервал между обновлениями частичного ответа одной модели, сек
+    PARTIAL_EMIT_INTERVAL = 0.1
+    
+    def __init__(self, prompt, model_list, stream=False, use_cache=True, stop_after=0):
         super().__init__()
         self.prompt = prompt
         self.model_list = model_list
+        self.stream = stream
+        self.use_cache = use_cache
+        self.stop_after = stop_after  # Отменить остальные запросы после стольких ответов (0 - ждать все)
+        self.cancel_token = CancelToken()
+        self._partial_text = {}
+        self._partial_emitted = {}
+    
+    def cancel(self):
+        """Отменить ожидающие и выполняющиеся запросы (можно вызывать из любого потока)"""
+        self.cancel_token.cancel()
+    
+    def on_chunk(self, model, chunk):
+        """Накопить фрагмент ответа (вызывается из потоков диспетчера)"""
+        # Фрагменты одной модели приходят из одного потока, ключи не пересекаются
+        text = self._partial_text.get(model.id, '') + chunk
+        self._partial_text[model.id] = text
+        now = time.monotonic()
+        if now - self._partial_emitted.get(model.id, 0.0) < self.PARTIAL_EMIT_INTERVAL:
+            return
+        self._partial_emitted[model.id] = now
+        self.partial_ready.emit({'model_id': model.id, 'model_name': model.name, 'response': text})
     
     def run(self):
         self.progress.emit("Отправка запросов...")
-        results = send_prompt_to_models(self.prompt, self.model_list)
+        results = []
+        on_chunk = self.on_chunk if self.stream else None
+        for result in iter_prompt_to_models(self.prompt, self.model_list, on_chunk, self.use_cache,
+                                            self.cancel_token, self.stop_after, get_fanout_deadline()):
+            results.append(result)
+            self.result_ready.emit(result)
+            self.progress.emit(f"Получено ответов: {len(results)}/{len(self.model_list)}")
         self.finished.emit(results)
 
 
@@ -282,6 +339,7 @@ class PromptImprovementThread(QThread):
         self.task_type = task_type
     
     def run(self):
+        from prompt_improver import improve_prompt, APIError as PromptImproverError
         try:
             self.progress.emit("Улучшение промта...")
             result = improve_prompt(self.prompt_text, self.model_name, self.api_key, self.task_type)
@@ -305,7 +363,7 @@ class PromptImprovementDialog(QDialog):
         self.improvement_thread = None
         self.init_ui()
         self.load_models()
-        
+    
     def init_ui(self):
         layout = QVBoxLayout()
         
@@ -506,25 +564,486 @@ class PromptImprovementDialog(QDialog):
         return self.selected_prompt
 
 
+class ResultsTableModel(QAbstractTableModel):
+    """
+    Модель таблицы результатов поверх списка temp_results
+    
+    Строки модели ссылаются на индексы в списке результатов, поэтому сортировка
+    не меняет сам список и индексы, по которым обновляются ответы моделей.
+    """
+    
+    HEADERS = ["Модель", "Ответ", "Время", "Выбрано"]
+    COLUMN_MODEL, COLUMN_RESPONSE, COLUMN_LATENCY, COLUMN_SELECTED = range(4)
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._results = []
+        self._order = []  # Строка модели -> индекс в списке результатов
+        self._versions = []  # Счетчик изменений каждого результата (для кэша высоты строк)
+    
+    def set_results(self, results):
+        """Показать список результатов (список используется без копирования)"""
+        self.beginResetModel()
+        self._results = results
+        self._order = list(range(len(results)))
+        self._versions = [0] * len(results)
+        self.endResetModel()
+    
+    def append_result(self, result):
+        """Добавить результат в конец списка; вернуть его индекс"""
+        index = len(self._results)
+        row = len(self._order)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._results.append(result)
+        self._order.append(index)
+        self._versions.append(0)
+        self.endInsertRows()
+        return index
+    
+    def result_changed(self, index):
+        """Сообщить представлению, что результат с индексом index изменился"""
+        self._versions[index] += 1
+        row = self._order.index(index)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+    
+    def result_index(self, row):
+        """Получить индекс в списке результатов для строки модели"""
+        return self._order[row]
+    
+    def result_version(self, index):
+        """Получить счетчик изменений результата"""
+        return self._versions[index]
+    
+    @staticmethod
+    def response_text(result):
+        """Текст ячейки ответа (ошибка - с префиксом, прерванный ответ - с пометкой)"""
+        if result.get('cancelled'):
+            status = "Время ожидания истекло" if result.get('timed_out') else "Отменено"
+            partial = result.get('response')
+            return f"{partial}\n\n[{status}]" if partial else status
+        if result.get('error'):
+            return f"Ошибка: {result['error']}"
+        return result.get('response') or ''
+    
+    @staticmethod
+    def latency_text(result):
+        """Текст ячейки времени ответа"""
+        latency = result.get('latency')
+        return f"{latency:.2f} с" if latency is not None else ""
+    
+    @staticmethod
+    def timing_details(result):
+        """Подсказка ячейки времени: этапы запроса, объем данных и расход токенов"""
+        lines = []
+        for field, label in (('connect', "Подключение"), ('tls', "TLS"), ('ttfb', "Первый байт"),
+                             ('ttft', "Первый токен"), ('latency', "Всего")):
+            if result.get(field) is not None:
+                lines.append(f"{label}: {result[field] * 1000:.0f} мс")
+        if result.get('request_bytes') is not None:
+            lines.append(f"Отправлено: {result['request_bytes']} байт")
+        if result.get('response_bytes') is not None:
+            lines.append(f"Получено: {result['response_bytes']} байт")
+        usage = result.get('usage') or {}
+        if usage:
+            lines.append(f"Токены: {usage.get('prompt_tokens', '?')} + {usage.get('completion_tokens', '?')}"
+                         f" = {usage.get('total_tokens', '?')}")
+        return "\n".join(lines)
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._order)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+    
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() == self.COLUMN_SELECTED:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        result = self._results[self._order[index.row()]]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == self.COLUMN_MODEL:
+                # Ответ взят из кэша, а не получен от API
+                return f"{result['model_name']} [кэш]" if result.get('cache_hit') else result['model_name']
+            if column == self.COLUMN_RESPONSE:
+                return self.response_text(result)
+            if column == self.COLUMN_LATENCY:
+                return self.latency_text(result)
+            return None
+        if role == Qt.CheckStateRole and column == self.COLUMN_SELECTED:
+            return Qt.Checked if result.get('selected') else Qt.Unchecked
+        if role == Qt.ToolTipRole:
+            if column == self.COLUMN_MODEL:
+                return result['model_name']
+            if column == self.COLUMN_RESPONSE:
+                return self.response_text(result)[:1000]
+            if column == self.COLUMN_LATENCY:
+                return self.timing_details(result) or None
+        if role == Qt.ForegroundRole and column == self.COLUMN_RESPONSE and result.get('error'):
+            return QColor(Qt.red)  # Красный цвет для ошибок
+        if role == Qt.TextAlignmentRole:
+            if column == self.COLUMN_LATENCY:
+                return int(Qt.AlignTop | Qt.AlignRight)
+            return int(Qt.AlignTop | Qt.AlignLeft)
+        return None
+    
+    def setData(self, index, value, role=Qt.EditRole):
+        if index.isValid() and index.column() == self.COLUMN_SELECTED and role == Qt.CheckStateRole:
+            self._results[self._order[index.row()]]['selected'] = (value == Qt.Checked)
+            self.dataChanged.emit(index, index, [role])
+            return True
+        return False
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column == self.COLUMN_MODEL:
+            key = lambda i: self._results[i]['model_name'].lower()
+        elif column == self.COLUMN_RESPONSE:
+            key = lambda i: self.response_text(self._results[i]).lower()
+        elif column == self.COLUMN_LATENCY:
+            # Результаты без времени (еще выполняются) - в конце при сортировке по возрастанию
+            key = lambda i: (self._results[i].get('latency') is None, self._results[i].get('latency') or 0.0)
+        else:
+            key = lambda i: bool(self._results[i].get('selected'))
+        self.layoutAboutToBeChanged.emit()
+        old_order = list(self._order)
+        self._order.sort(key=key, reverse=(order == Qt.DescendingOrder))
+        # Выделение и текущая строка следуют за своими результатами
+        new_rows = {index: row for row, index in enumerate(self._order)}
+        for persistent in self.persistentIndexList():
+            result_index = old_order[persistent.row()]
+            self.changePersistentIndex(persistent, self.index(new_rows[result_index], persistent.column()))
+        self.layoutChanged.emit()
+
+
+class ResultsDelegate(QStyledItemDelegate):
+    """Делегат таблицы результатов: многострочный текст ответа, обрезанный по высоте строки"""
+    
+    # Ответ длиннее этого не раскладывается целиком - в ячейку он все равно не поместится
+    MAX_LAYOUT_CHARS = 4000
+    PADDING = 4
+    
+    def paint(self, painter, option, index):
+        if index.column() != ResultsTableModel.COLUMN_RESPONSE:
+            super().paint(painter, option, index)
+            return
+        
+        opt = QStyleOptionViewItem(option)
+        self.initStyleOption(opt, index)
+        text = opt.text[:self.MAX_LAYOUT_CHARS]
+        opt.text = ""
+        style = opt.widget.style() if opt.widget else QApplication.style()
+        style.drawControl(QStyle.CE_ItemViewItem, opt, painter, opt.widget)
+        
+        rect = opt.rect.adjusted(self.PADDING, self.PADDING, -self.PADDING, -self.PADDING)
+        if rect.width() <= 0 or not text:
+            return
+        painter.save()
+        if opt.state & QStyle.State_Selected:
+            painter.setPen(opt.palette.color(QPalette.HighlightedText))
+        else:
+            painter.setPen(opt.palette.color(QPalette.Text))
+            foreground = index.data(Qt.ForegroundRole)
+            if foreground is not None:
+                painter.setPen(QColor(foreground))
+        painter.setClipRect(opt.rect)
+        
+        metrics = QFontMetrics(opt.font)
+        line_height = metrics.lineSpacing()
+        layout = QTextLayout(text, opt.font)
+        layout.beginLayout()
+        lines = []
+        y = 0
+        elided = None
+        while True:
+            line = layout.createLine()
+            if not line.isValid():
+                break
+            line.setLineWidth(rect.width())
+            if y + 2 * line_height > rect.height() and layout.createLine().isValid():
+                # Последняя видимая строка - остаток текста обрезается многоточием
+                rest = text[line.textStart():].replace("\n", " ")
+                elided = (y, metrics.elidedText(rest, Qt.ElideRight, rect.width()))
+                break
+            line.setPosition(QPointF(0, y))
+            lines.append(line)
+            y += line_height
+        layout.endLayout()
+        
+        origin = QPointF(rect.topLeft())
+        for line in lines:
+            line.draw(painter, origin)
+        if elided is not None:
+            painter.drawText(QPointF(rect.left(), rect.top() + elided[0] + metrics.ascent()), elided[1])
+        painter.restore()
+    
+    def text_height(self, font, text, width):
+        """Высота текста ответа с переносом по ширине колонки"""
+        metrics = QFontMetrics(font)
+        bounds = metrics.boundingRect(0, 0, max(1, width - 2 * self.PADDING), 0,
+                                      Qt.TextWordWrap | Qt.AlignTop, text[:self.MAX_LAYOUT_CHARS])
+        return bounds.height() + 2 * self.PADDING
+
+
+class ResultsTableView(QTableView):
+    """
+    Таблица результатов с ленивым расчетом высоты строк
+    
+    Высота считается только для видимых строк (при прокрутке, изменении ширины
+    колонки и данных) и кэшируется для каждого результата по (версия, ширина колонки).
+    """
+    
+    MIN_ROW_HEIGHT = 60
+    MAX_ROW_HEIGHT = 300
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._height_cache = {}
+        self._update_pending = False
+        self.setItemDelegate(ResultsDelegate(self))
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.verticalHeader().setDefaultSectionSize(self.MIN_ROW_HEIGHT)
+        self.setWordWrap(False)  # Перенос и обрезку выполняет делегат
+        self.verticalScrollBar().valueChanged.connect(self.schedule_row_heights)
+        self.horizontalHeader().sectionResized.connect(self.schedule_row_heights)
+    
+    def setModel(self, model):
+        super().setModel(model)
+        for signal in (model.rowsInserted, model.dataChanged, model.layoutChanged, model.modelReset):
+            signal.connect(self.schedule_row_heights)
+        model.modelReset.connect(self._height_cache.clear)
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.schedule_row_heights()
+    
+    def schedule_row_heights(self, *args):
+        """Пересчитать высоты видимых строк после обработки текущих событий (один раз)"""
+        if not self._update_pending:
+            self._update_pending = True
+            QTimer.singleShot(0, self._update_row_heights)
+    
+    def _update_row_heights(self):
+        self._update_pending = False
+        model = self.model()
+        if model is None or model.rowCount() == 0:
+            return
+        first = self.rowAt(0)
+        last = self.rowAt(self.viewport().height() - 1)
+        first = 0 if first < 0 else first
+        last = model.rowCount() - 1 if last < 0 else last
+        width = self.columnWidth(ResultsTableModel.COLUMN_RESPONSE)
+        delegate = self.itemDelegate()
+        row = first
+        # Граница видимой области пересчитывается: изменение высоты строки сдвигает следующие
+        while row <= last:
+            result_index = model.result_index(row)
+            key = (model.result_version(result_index), width)
+            cached = self._height_cache.get(result_index)
+            if cached is not None and cached[0] == key:
+                height = cached[1]
+            else:
+                text = model.index(row, ResultsTableModel.COLUMN_RESPONSE).data() or ""
+                height = delegate.text_height(self.font(), text, width)
+                height = max(self.MIN_ROW_HEIGHT, min(self.MAX_ROW_HEIGHT, height))
+                self._height_cache[result_index] = (key, height)
+            if self.rowHeight(row) != height:
+                self.setRowHeight(row, height)
+                visible_last = self.rowAt(self.viewport().height() - 1)
+                last = model.rowCount() - 1 if visible_last < 0 else visible_last
+            row += 1
+
+
+class PromptHistoryModel(QAbstractListModel):
+    """
+    Модель истории промтов с подгрузкой страницами
+    
+    Загружается только первая страница; следующие запрашиваются представлением
+    (canFetchMore/fetchMore) по мере прокрутки. В режиме поиска модель содержит
+    результаты полнотекстового поиска без подгрузки.
+    """
+    
+    PAGE_SIZE = 100
+    
+    def __init__(self, placeholder=None, parent=None):
+        """
+        Args:
+            placeholder: Текст первой строки без промта (например, для комбобокса)
+            parent: Родительский объект
+        """
+        super().__init__(parent)
+        self.placeholder = placeholder
+        self._prompts = []
+        self._exhausted = True  # Первая страница загружается refresh(), когда база готова
+        self._search = ""
+        self._seq = 0  # Номер изменения БД, уже отраженного в модели
+    
+    def _offset(self):
+        return 1 if self.placeholder is not None else 0
+    
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._prompts) + self._offset()
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row() - self._offset()
+        if row < 0:
+            return self.placeholder if role == Qt.DisplayRole else None
+        prompt = self._prompts[row]
+        if role == Qt.DisplayRole:
+            return f"{prompt['date']}: {prompt['prompt'][:50]}..."
+        if role == Qt.UserRole:
+            return prompt['id']
+        if role == Qt.ToolTipRole and prompt.get('snippet'):
+            # Служебные символы-маркеры не встречаются в тексте и переживают html.escape
+            return html.escape(prompt['snippet']).replace("\x02", "<b>").replace("\x03", "</b>")
+        return None
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+    
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        after = (self._prompts[-1]['date'], self._prompts[-1]['id']) if self._prompts else None
+        page = db.get_prompts_page(self.PAGE_SIZE, after)
+        self._exhausted = len(page) < self.PAGE_SIZE
+        if not page:
+            return
+        first = self.rowCount()
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self._prompts.extend(page)
+        self.endInsertRows()
+    
+    def refresh(self):
+        """Перезагрузить модель с первой страницы (с учетом текущего поиска)"""
+        self.beginResetModel()
+        self._seq = db.get_change_counter()
+        if self._search:
+            self._prompts = db.search_prompts(self._search, 200, "\x02", "\x03")
+            self._exhausted = True
+        else:
+            self._prompts = db.get_prompts_page(self.PAGE_SIZE)
+            self._exhausted = len(self._prompts) < self.PAGE_SIZE
+        self.endResetModel()
+    
+    def set_search(self, text):
+        """Показать результаты поиска по тексту и тегам (пустая строка - вся история)"""
+        self._search = text.strip()
+        self.refresh()
+    
+    def apply_change(self, event):
+        """
+        Применить событие изменения промтов из db без перезагрузки модели
+        
+        Args:
+            event: Событие {'seq', 'table', 'action', 'ids'} (см. db.add_change_listener)
+        """
+        if event['table'] != 'prompts' or event['seq'] <= self._seq:
+            return
+        self._seq = event['seq']
+        if self._search:
+            # Релевантность результатов поиска пересчитывается только запросом
+            self.refresh()
+            return
+        
+        ids = set(event['ids'])
+        if event['action'] in ('delete', 'update'):
+            for row in reversed(range(len(self._prompts))):
+                if self._prompts[row]['id'] in ids:
+                    self.beginRemoveRows(QModelIndex(), row + self._offset(), row + self._offset())
+                    del self._prompts[row]
+                    self.endRemoveRows()
+        if event['action'] in ('insert', 'update'):
+            loaded = {prompt['id'] for prompt in self._prompts}
+            for prompt in db.get_prompts_by_ids([i for i in ids if i not in loaded]):
+                self._insert_sorted(prompt)
+    
+    def _insert_sorted(self, prompt):
+        """Вставить промт на его место в порядке (date, id) по убыванию"""
+        key = (prompt['date'], prompt['id'])
+        row = 0
+        while row < len(self._prompts) and (self._prompts[row]['date'], self._prompts[row]['id']) > key:
+            row += 1
+        if row == len(self._prompts) and not self._exhausted:
+            return  # Промт за пределами загруженных страниц - появится при подгрузке
+        self.beginInsertRows(QModelIndex(), row + self._offset(), row + self._offset())
+        self._prompts.insert(row, prompt)
+        self.endInsertRows()
+    
+    def find_row(self, prompt_id):
+        """Найти строку промта среди загруженных (-1, если не загружен)"""
+        for row, prompt in enumerate(self._prompts):
+            if prompt['id'] == prompt_id:
+                return row + self._offset()
+        return -1
+
+
 class MainWindow(QMainWindow):
+    # Завершение фоновой записи в БД: (Future, обработчик) - доставляется в поток GUI
+    db_write_done = pyqtSignal(object, object)
+    # Событие изменения данных в БД (из любого потока) - доставляется в поток GUI
+    db_changed = pyqtSignal(dict)
+    # База данных инициализирована, промты и модели загружены
+    database_ready = pyqtSignal()
+    
     def __init__(self):
         super().__init__()
+        self.db_write_done.connect(lambda future, handler: handler(future))
+        self.db_changed.connect(self.on_db_changed)
         self.temp_results = []  # Временная таблица результатов в памяти
+        self.result_index_by_model = {}  # model_id -> индекс в temp_results
+        self.markdown_viewers = {}  # Открытые окна просмотра: индекс -> диалог
+        self.request_thread = None  # Поток текущей отправки промта
         self.current_prompt_id = None
-        self.init_database()
         self.init_ui()
-        self.load_prompts()
-        self.load_models()
+        self.init_database()
+        # Изменения истории применяются к моделям по событиям БД, без полной перезагрузки
+        self._db_listener = self.db_changed.emit
+        db.add_change_listener(self._db_listener)
+        self.destroyed.connect(lambda: db.remove_change_listener(self._db_listener))
     
     def init_database(self):
-        """Инициализировать базу данных"""
+        """
+        Инициализировать базу данных в фоновом потоке
+        
+        Окно показывается, не дожидаясь проверки схемы; промты и модели
+        загружаются, когда база готова (on_database_ready).
+        """
+        self.send_btn.setEnabled(False)
+        self.statusBar().showMessage("Подготовка базы данных...")
+        future = db.init_database_async()
+        future.add_done_callback(lambda f: self.db_write_done.emit(f, self.on_database_ready))
+    
+    def on_database_ready(self, future):
+        """Обработчик завершения инициализации базы данных"""
         try:
-            db.init_database()
-            logger.log_info("Database initialized")
+            future.result()
         except Exception as e:
             QMessageBox.critical(self, "Критическая ошибка", f"Не удалось инициализировать БД: {str(e)}")
             logger.log_error("Database initialization failed", e)
-            raise
+            self.close()
+            return
+        logger.log_info("Database initialized")
+        self.apply_settings()
+        self.load_prompts()
+        self.load_models()
+        self.send_btn.setEnabled(True)
+        self.statusBar().clearMessage()
+        # Через event loop - подписчики могут подключиться уже после конструктора окна
+        QTimer.singleShot(0, self.database_ready.emit)
     
     def init_ui(self):
         self.setWindowTitle(f"ChatList v{version.__version__} - Сравнение ответов нейросетей")
@@ -535,8 +1054,7 @@ class MainWindow(QMainWindow):
         if os.path.exists(icon_path):
             self.setWindowIcon(QIcon(icon_path))
         
-        # Применить настройки темы и шрифта
-        self.apply_settings()
+        # Настройки темы и шрифта хранятся в БД и применяются в on_database_ready
         
         # Создать меню
         self.create_menu()
@@ -610,9 +1128,12 @@ class MainWindow(QMainWindow):
         self.prompt_search.textChanged.connect(self.filter_prompts)
         layout.addWidget(self.prompt_search)
         
-        # Список промтов
-        self.prompts_list = QListWidget()
-        self.prompts_list.itemDoubleClicked.connect(self.select_prompt)
+        # Список промтов (строки подгружаются по мере прокрутки)
+        self.prompt_history = PromptHistoryModel(parent=self)
+        self.prompts_list = QListView()
+        self.prompts_list.setModel(self.prompt_history)
+        self.prompts_list.setUniformItemSizes(True)
+        self.prompts_list.doubleClicked.connect(self.select_prompt)
         self.prompts_list.setContextMenuPolicy(Qt.CustomContextMenu)
         self.prompts_list.customContextMenuRequested.connect(self.show_prompt_context_menu)
         layout.addWidget(self.prompts_list)
@@ -638,7 +1159,7 @@ class MainWindow(QMainWindow):
         
         # Выбор сохраненного промта
         self.prompt_combo = QComboBox()
-        self.prompt_combo.addItem("-- Новый промт --")
+        self.prompt_combo.setModel(PromptHistoryModel("-- Новый промт --", self))
         self.prompt_combo.currentIndexChanged.connect(self.on_prompt_combo_changed)
         prompt_layout.addWidget(QLabel("Выбрать сохраненный промт:"))
         prompt_layout.addWidget(self.prompt_combo)
@@ -662,10 +1183,24 @@ class MainWindow(QMainWindow):
         self.improve_btn.clicked.connect(self.improve_prompt)
         self.send_btn = QPushButton("Отправить")
         self.send_btn.clicked.connect(self.send_prompt)
+        self.cancel_btn = QPushButton("Отмена")
+        self.cancel_btn.setToolTip("Прервать запросы, которые еще не получили ответ")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_requests)
+        self.stop_after_spin = QSpinBox()
+        self.stop_after_spin.setRange(0, 99)
+        self.stop_after_spin.setSpecialValueText("все")
+        self.stop_after_spin.setPrefix("Ждать ответов: ")
+        self.stop_after_spin.setToolTip("Отменить остальные запросы после указанного числа успешных ответов")
         self.save_prompt_btn = QPushButton("Сохранить промт")
         self.save_prompt_btn.clicked.connect(self.save_prompt)
         btn_layout.addWidget(self.improve_btn)
+        self.no_cache_checkbox = QCheckBox("Без кэша")
+        self.no_cache_checkbox.setToolTip("Не использовать сохраненные ответы, отправить запросы заново")
         btn_layout.addWidget(self.send_btn)
+        btn_layout.addWidget(self.cancel_btn)
+        btn_layout.addWidget(self.stop_after_spin)
+        btn_layout.addWidget(self.no_cache_checkbox)
         btn_layout.addWidget(self.save_prompt_btn)
         prompt_layout.addLayout(btn_layout)
         
@@ -681,44 +1216,22 @@ class MainWindow(QMainWindow):
         results_group = QGroupBox("Результаты")
         results_layout = QVBoxLayout()
         
-        # Таблица результатов
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(3)
-        self.results_table.setHorizontalHeaderLabels(["Модель", "Ответ", "Выбрано"])
+        # Таблица результатов (модель + делегат, высота строк считается только для видимых)
+        self.results_model = ResultsTableModel(self)
+        self.results_model.set_results(self.temp_results)
+        self.results_table = ResultsTableView()
+        self.results_table.setModel(self.results_model)
         self.results_table.horizontalHeader().setStretchLastSection(False)
         self.results_table.setColumnWidth(0, 200)  # Модель - немного шире для длинных имен
         self.results_table.setColumnWidth(1, 600)  # Ответ - основное пространство
-        self.results_table.setColumnWidth(2, 50)   # Выбрано - узкая колонка
+        self.results_table.setColumnWidth(2, 70)   # Время ответа
+        self.results_table.setColumnWidth(3, 50)   # Выбрано - узкая колонка
         self.results_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)  # Ответ растягивается
         self.results_table.setAlternatingRowColors(True)
-        self.results_table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.results_table.setSortingEnabled(True)  # Включить сортировку
-        # Настройка для многострочного отображения
-        self.results_table.setWordWrap(True)  # Включить перенос текста
-        self.results_table.setTextElideMode(Qt.ElideNone)  # Не обрезать текст
+        self.results_table.setSelectionBehavior(QTableView.SelectRows)
+        self.results_table.setSortingEnabled(True)  # Включить сортировку (выполняет модель)
         # Обработчик выбора строки для активации кнопки
-        self.results_table.itemSelectionChanged.connect(self.on_results_selection_changed)
-        
-        # Делегат для колонки с ответами (многострочный текст)
-        class WordWrapDelegate(QStyledItemDelegate):
-            def sizeHint(self, option, index):
-                size = super().sizeHint(option, index)
-                text = index.data(Qt.DisplayRole) or ""
-                if text:
-                    # Вычислить высоту с учетом переноса текста
-                    font_metrics = option.fontMetrics
-                    text_width = option.rect.width() - 20  # Отступы
-                    if text_width > 0:
-                        wrapped_text = font_metrics.boundingRect(
-                            0, 0, text_width, 0,
-                            Qt.TextWordWrap | Qt.AlignTop,
-                            text
-                        )
-                        size.setHeight(max(60, wrapped_text.height() + 20))
-                return size
-        
-        # Применить делегат только к колонке с ответами (колонка 1)
-        self.results_table.setItemDelegateForColumn(1, WordWrapDelegate(self.results_table))
+        self.results_table.selectionModel().selectionChanged.connect(self.on_results_selection_changed)
         results_layout.addWidget(self.results_table)
         
         # Кнопки управления результатами
@@ -776,31 +1289,25 @@ class MainWindow(QMainWindow):
     # ========== Методы для работы с промтами ==========
     
     def load_prompts(self):
-        """Загрузить список промтов"""
-        prompts = db.get_all_prompts()
-        self.prompts_list.clear()
-        self.prompt_combo.clear()
-        self.prompt_combo.addItem("-- Новый промт --")
-        
-        for prompt in prompts:
-            # В список
-            item_text = f"{prompt['date']}: {prompt['prompt'][:50]}..."
-            item = QListWidgetItem(item_text)
-            item.setData(Qt.UserRole, prompt['id'])
-            self.prompts_list.addItem(item)
-            
-            # В комбобокс
-            self.prompt_combo.addItem(item_text, prompt['id'])
+        """Загрузить список промтов (первую страницу)"""
+        self.prompt_history.refresh()
+        self.prompt_combo.model().refresh()
+    
+    def on_db_changed(self, event):
+        """Применить изменение БД к истории промтов"""
+        if event['table'] == 'prompts':
+            if event['action'] == 'delete' and self.current_prompt_id in event['ids']:
+                self.prompt_combo.setCurrentIndex(0)  # Удален редактируемый промт
+            self.prompt_history.apply_change(event)
+            self.prompt_combo.model().apply_change(event)
     
     def filter_prompts(self, text):
-        """Фильтровать промты по тексту"""
-        for i in range(self.prompts_list.count()):
-            item = self.prompts_list.item(i)
-            item.setHidden(text.lower() not in item.text().lower())
+        """Фильтровать промты по тексту и тегам (полнотекстовый поиск); найденные слова - в подсказке"""
+        self.prompt_history.set_search(text)
     
-    def select_prompt(self, item):
+    def select_prompt(self, index):
         """Выбрать промт из списка"""
-        prompt_id = item.data(Qt.UserRole)
+        prompt_id = index.data(Qt.UserRole)
         prompt = db.get_prompt_by_id(prompt_id)
         if prompt:
             self.prompt_input.setPlainText(prompt['prompt'])
@@ -847,24 +1354,33 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Ошибка", "Промт не может быть пустым!")
             return
         
+        tags = self.tags_input.text().strip()
+        self.submit_db_write(db.create_prompt_async(prompt_text, tags),
+                             lambda future: self.on_prompt_saved(future, prompt_text))
+    
+    def submit_db_write(self, future, handler):
+        """Вызвать handler(future) в потоке GUI после завершения фоновой записи в БД"""
+        future.add_done_callback(lambda f: self.db_write_done.emit(f, handler))
+    
+    def on_prompt_saved(self, future, prompt_text):
+        """Обработчик завершения записи промта"""
         try:
-            tags = self.tags_input.text().strip()
-            db.create_prompt(prompt_text, tags)
-            self.load_prompts()
-            QMessageBox.information(self, "Успех", "Промт сохранен!")
-            logger.log_info(f"Prompt saved: {prompt_text[:50]}...")
+            future.result()
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить промт: {str(e)}")
             logger.log_error("Failed to save prompt", e)
+            return
+        QMessageBox.information(self, "Успех", "Промт сохранен!")
+        logger.log_info(f"Prompt saved: {prompt_text[:50]}...")
     
     def delete_selected_prompt(self):
         """Удалить выбранный промт"""
-        current_item = self.prompts_list.currentItem()
-        if not current_item:
+        current_index = self.prompts_list.currentIndex()
+        if not current_index.isValid():
             QMessageBox.warning(self, "Ошибка", "Выберите промт для удаления!")
             return
         
-        prompt_id = current_item.data(Qt.UserRole)
+        prompt_id = current_index.data(Qt.UserRole)
         reply = QMessageBox.question(
             self, "Подтверждение",
             "Вы уверены, что хотите удалить этот промт?",
@@ -872,8 +1388,16 @@ class MainWindow(QMainWindow):
         )
         
         if reply == QMessageBox.Yes:
-            db.delete_prompt(prompt_id)
-            self.load_prompts()
+            # Строка истории удаляется по событию изменения после фиксации
+            self.submit_db_write(db.delete_prompt_async(prompt_id), self.on_prompt_deleted)
+    
+    def on_prompt_deleted(self, future):
+        """Обработчик завершения удаления промта"""
+        try:
+            future.result()
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось удалить промт: {str(e)}")
+            logger.log_error("Failed to delete prompt", e)
     
     def show_prompt_context_menu(self, position):
         """Показать контекстное меню для промта"""
@@ -888,9 +1412,18 @@ class MainWindow(QMainWindow):
         self.models_list.clear()
         
         for model in models_list:
-            item_text = f"{'✓' if model['is_active'] else '✗'} {model['name']}"
+            # Состояние автоматического отключения модели после серии ошибок
+            provider = resolve_adapter(model).name
+            breaker_state = circuit_breaker.get_breaker_state(provider, model['name'])
+            breaker_mark = CIRCUIT_MARKS.get(breaker_state, '')
+            item_text = f"{'✓' if model['is_active'] else '✗'}{breaker_mark} {model['name']}"
             item = QListWidgetItem(item_text)
             item.setData(Qt.UserRole, model)
+            if breaker_state == circuit_breaker.OPEN:
+                retry_in = circuit_breaker.get_breaker(provider, model['name']).retry_in()
+                item.setToolTip(f"Модель временно отключена после серии ошибок. Повтор через {retry_in:.0f} сек")
+            elif breaker_state == circuit_breaker.HALF_OPEN:
+                item.setToolTip("Следующий запрос к модели будет пробным")
             self.models_list.addItem(item)
     
     def add_model(self):
@@ -963,7 +1496,8 @@ class MainWindow(QMainWindow):
         
         # Очистить временную таблицу
         self.temp_results = []
-        self.results_table.setRowCount(0)
+        self.result_index_by_model = {}
+        self.results_model.set_results(self.temp_results)
         self.save_results_btn.setEnabled(False)
         
         # Получить активные модели
@@ -980,136 +1514,148 @@ class MainWindow(QMainWindow):
         
         # Показать прогресс
         self.progress_bar.setVisible(True)
-        self.progress_bar.setRange(0, 0)  # Неопределенный прогресс
+        self.progress_bar.setRange(0, len(active_models))
+        self.progress_bar.setValue(0)
         self.send_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.open_markdown_btn.setEnabled(False)
         
         # Запустить поток для отправки запросов
-        self.request_thread = RequestThread(prompt_text, active_models)
+        stream = db.get_setting('stream_responses', '0') == '1'
+        use_cache = not self.no_cache_checkbox.isChecked()
+        self.request_thread = RequestThread(prompt_text, active_models, stream, use_cache,
+                                            self.stop_after_spin.value())
+        self.request_thread.result_ready.connect(self.on_result_ready)
+        self.request_thread.partial_ready.connect(self.on_partial_ready)
         self.request_thread.finished.connect(self.on_requests_finished)
         self.request_thread.progress.connect(lambda msg: self.statusBar().showMessage(msg))
         self.request_thread.start()
     
+    def _ensure_result_row(self, result):
+        """Найти строку модели в таблице или добавить новую; вернуть индекс в temp_results"""
+        model_id = result.get('model_id', None)
+        key = model_id if model_id is not None else result.get('model_name')
+        if key in self.result_index_by_model:
+            return self.result_index_by_model[key]
+        
+        index = self.results_model.append_result({
+            'model_id': model_id,
+            'model_name': result.get('model_name', f'Модель {len(self.temp_results) + 1}'),
+            'response': '',
+            'error': '',
+            'success': False,
+            'selected': False
+        })
+        self.result_index_by_model[key] = index
+        return index
+    
+    def _update_result_row(self, index):
+        """Обновить строку таблицы по данным temp_results[index]"""
+        self.results_model.result_changed(index)
+    
+    def on_partial_ready(self, partial):
+        """Обработчик фрагмента потокового ответа - текст в ячейке растет по мере генерации"""
+        index = self._ensure_result_row(partial)
+        temp_result = self.temp_results[index]
+        if temp_result['success'] or temp_result['error']:
+            return  # Итоговый результат уже получен
+        temp_result['response'] = partial.get('response', '')
+        self._update_result_row(index)
+        
+        viewer = self.markdown_viewers.get(index)
+        if viewer is not None:
+            viewer.update_text(temp_result['response'])
+        self.on_results_selection_changed()
+    
+    def on_result_ready(self, result):
+        """Обработчик ответа очередной модели - строка добавляется или дополняется сразу"""
+        index = self._ensure_result_row(result)
+        response_text = result.get('response', '')
+        success = result.get('success', False)
+        error = result.get('error', '')
+        
+        # Сохранить в temp_results с правильным сопоставлением
+        temp_result = self.temp_results[index]
+        # У прерванного запроса остается полученная часть ответа
+        temp_result['response'] = response_text
+        temp_result['error'] = error if not success else ''
+        temp_result['success'] = success
+        for field in STATS_FIELDS:
+            temp_result[field] = result.get(field)
+        temp_result['attempts'] = result.get('attempts', 0)
+        temp_result['cache_hit'] = result.get('cache_hit', False)
+        temp_result['cancelled'] = result.get('cancelled', False)
+        temp_result['timed_out'] = result.get('timed_out', False)
+        self._update_result_row(index)
+        
+        viewer = self.markdown_viewers.get(index)
+        if viewer is not None and success:
+            viewer.update_text(response_text, final=True)
+        elif success and response_text:
+            # Подготовить HTML заранее, чтобы окно просмотра открывалось сразу
+            get_markdown_renderer().submit(response_text)
+        
+        # Логирование
+        logger.log_api_request(
+            temp_result['model_name'],
+            self.prompt_input.toPlainText()[:100],
+            success,
+            error if not success else None
+        )
+        
+        self.progress_bar.setValue(sum(1 for r in self.temp_results if r['success'] or r['error']))
+        self.save_results_btn.setEnabled(True)
+        self.on_results_selection_changed()
+    
+    def cancel_requests(self):
+        """Отменить запросы текущей отправки"""
+        if self.request_thread is not None and self.request_thread.isRunning():
+            self.cancel_btn.setEnabled(False)
+            self.statusBar().showMessage("Отмена запросов...")
+            self.request_thread.cancel()
+    
     def on_requests_finished(self, results):
         """Обработчик завершения запросов"""
         self.progress_bar.setVisible(False)
         self.send_btn.setEnabled(True)
-        
-        # Сохранить результаты во временную таблицу с правильным сопоставлением
-        self.temp_results = []
-        
-        # Отобразить в таблице
-        self.results_table.setRowCount(len(results))
-        
-        for row, result in enumerate(results):
-            # Убедиться, что данные правильно сопоставлены
-            model_name = result.get('model_name', f'Модель {row+1}')
-            model_id = result.get('model_id', None)
-            response_text = result.get('response', '')
-            success = result.get('success', False)
-            error = result.get('error', '')
-            
-            # Сохранить в temp_results с правильным сопоставлением
-            temp_result = {
-                'model_id': model_id,
-                'model_name': model_name,
-                'response': response_text if success else '',
-                'error': error if not success else '',
-                'success': success,
-                'selected': False
-            }
-            self.temp_results.append(temp_result)
-            
-            # Модель - колонка 0 (выравнивание по верхнему краю)
-            model_item = QTableWidgetItem(model_name)
-            model_item.setTextAlignment(Qt.AlignTop | Qt.AlignLeft)  # Выравнивание сверху слева
-            model_item.setToolTip(model_name)  # Подсказка при наведении
-            self.results_table.setItem(row, 0, model_item)
-            
-            # Ответ - колонка 1 (многострочный)
-            if success:
-                response_item = QTableWidgetItem(response_text)
-            else:
-                response_item = QTableWidgetItem(f"Ошибка: {error}")
-                response_item.setForeground(Qt.red)  # Красный цвет для ошибок
-            
-            # Настройка для многострочного отображения
-            response_item.setTextAlignment(Qt.AlignTop | Qt.AlignLeft)  # Выравнивание сверху слева
-            
-            # Подсказка с полным текстом
-            full_text = response_text if success else f"Ошибка: {error}"
-            response_item.setToolTip(full_text[:1000] if len(full_text) > 1000 else full_text)
-            
-            self.results_table.setItem(row, 1, response_item)
-            
-            # Логирование
-            logger.log_api_request(
-                model_name,
-                self.prompt_input.toPlainText()[:100],
-                success,
-                error if not success else None
-            )
-            
-            # Чекбокс - колонка 2 (выравнивание по верхнему краю)
-            checkbox = QCheckBox()
-            checkbox.setChecked(False)
-            # Используем замыкание для правильного сохранения индекса строки
-            checkbox.stateChanged.connect(lambda state, r=row: self.on_checkbox_changed(r, state))
-            # Создать контейнер для выравнивания чекбокса по верху
-            checkbox_widget = QWidget()
-            checkbox_layout = QVBoxLayout()
-            checkbox_layout.setContentsMargins(0, 0, 0, 0)
-            checkbox_layout.addWidget(checkbox)
-            checkbox_layout.addStretch()  # Растянуть пространство вниз для выравнивания по верху
-            checkbox_widget.setLayout(checkbox_layout)
-            self.results_table.setCellWidget(row, 2, checkbox_widget)
-        
-        # Автоматически подогнать высоту строк под содержимое (с учетом многострочного текста)
-        for row in range(self.results_table.rowCount()):
-            self.results_table.resizeRowToContents(row)
-            # Убедиться, что минимальная высота достаточна
-            current_height = self.results_table.rowHeight(row)
-            if current_height < 60:
-                self.results_table.setRowHeight(row, 60)
-        
-        self.save_results_btn.setEnabled(True)
-        self.open_markdown_btn.setEnabled(False)  # Будет активирована при выборе строки
+        self.cancel_btn.setEnabled(False)
+        self.on_results_selection_changed()
+        # Обновить отметки отключенных моделей
+        self.load_models()
         self.statusBar().showMessage(f"Запросы завершены. Получено ответов: {sum(1 for r in results if r.get('success', False))}/{len(results)}", 3000)
     
-    def on_checkbox_changed(self, row, state):
-        """Обработчик изменения чекбокса"""
-        if row < len(self.temp_results):
-            self.temp_results[row]['selected'] = (state == Qt.Checked)
+    def _selected_result_index(self):
+        """Получить индекс в temp_results для выбранной строки таблицы (или None)"""
+        selected_rows = self.results_table.selectionModel().selectedRows()
+        if not selected_rows:
+            return None
+        return self.results_model.result_index(selected_rows[0].row())
     
     def on_results_selection_changed(self):
         """Обработчик изменения выбора строки в таблице результатов"""
-        selected_rows = self.results_table.selectionModel().selectedRows()
-        if selected_rows:
-            row = selected_rows[0].row()
-            if row >= 0 and row < len(self.temp_results):
-                result = self.temp_results[row]
-                # Активировать кнопку только если ответ успешный
-                self.open_markdown_btn.setEnabled(result.get('success', False))
-            else:
-                self.open_markdown_btn.setEnabled(False)
+        index = self._selected_result_index()
+        if index is not None and 0 <= index < len(self.temp_results):
+            result = self.temp_results[index]
+            # Активировать кнопку, если есть ответ (в том числе частичный при потоковой выдаче)
+            self.open_markdown_btn.setEnabled(bool(result.get('response')))
         else:
             self.open_markdown_btn.setEnabled(False)
     
     def open_selected_markdown(self):
         """Открыть диалог просмотра markdown для выбранной строки"""
-        selected_rows = self.results_table.selectionModel().selectedRows()
-        if not selected_rows:
+        index = self._selected_result_index()
+        if index is None:
             QMessageBox.warning(self, "Ошибка", "Выберите строку с ответом для просмотра")
             return
         
-        row = selected_rows[0].row()
-        self.open_markdown_viewer(row)
+        self.open_markdown_viewer(index)
     
-    def open_markdown_viewer(self, row):
-        """Открыть диалог просмотра markdown для выбранной строки"""
-        if row < 0 or row >= len(self.temp_results):
+    def open_markdown_viewer(self, index):
+        """Открыть диалог просмотра markdown для результата с индексом index"""
+        if index < 0 or index >= len(self.temp_results):
             return
         
-        result = self.temp_results[row]
+        result = self.temp_results[index]
         model_name = result.get('model_name', 'Неизвестная модель')
         response_text = result.get('response', '')
         
@@ -1118,46 +1664,67 @@ class MainWindow(QMainWindow):
             return
         
         dialog = MarkdownViewerDialog(self, model_name, response_text)
-        dialog.exec_()
+        # Пока диалог открыт, потоковые фрагменты ответа дописываются в него
+        self.markdown_viewers[index] = dialog
+        try:
+            dialog.exec_()
+        finally:
+            self.markdown_viewers.pop(index, None)
     
     def save_selected_results(self):
-        """Сохранить выбранные результаты в БД"""
+        """Сохранить выбранные результаты в БД (запись выполняется в фоновом потоке)"""
         selected_results = [r for r in self.temp_results if r.get('selected', False)]
         if not selected_results:
             QMessageBox.warning(self, "Ошибка", "Выберите хотя бы один результат!")
             return
         
-        # Сохранить промт, если он новый
-        if not self.current_prompt_id:
-            prompt_text = self.prompt_input.toPlainText().strip()
-            tags = self.tags_input.text().strip()
-            self.current_prompt_id = db.create_prompt(prompt_text, tags)
-            self.load_prompts()
-        
         # Подготовить данные для сохранения
         results_to_save = []
         for result in selected_results:
             if result['success']:
                 results_to_save.append({
-                    'prompt_id': self.current_prompt_id,
                     'model_id': result['model_id'],
                     'response': result['response'],
                     'selected': 1
                 })
         
         if results_to_save:
-            try:
-                db.save_results(results_to_save)
-                QMessageBox.information(self, "Успех", f"Сохранено результатов: {len(results_to_save)}")
-                logger.log_info(f"Saved {len(results_to_save)} results to database")
-                
-                # Очистить временную таблицу
-                self.temp_results = []
-                self.results_table.setRowCount(0)
-                self.save_results_btn.setEnabled(False)
-            except Exception as e:
-                QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить результаты: {str(e)}")
-                logger.log_error("Failed to save results", e)
+            # Новый промт создается в той же транзакции, что и результаты
+            future = db.save_results_async(
+                results_to_save,
+                self.current_prompt_id,
+                self.prompt_input.toPlainText().strip(),
+                self.tags_input.text().strip()
+            )
+            saved_batch = self.temp_results
+            self.save_results_btn.setEnabled(False)
+            self.statusBar().showMessage("Сохранение результатов...")
+            self.submit_db_write(future, lambda f: self.on_results_saved(f, saved_batch))
+    
+    def on_results_saved(self, future, saved_batch):
+        """Обработчик завершения записи результатов"""
+        try:
+            prompt_id, result_ids = future.result()
+        except Exception as e:
+            self.save_results_btn.setEnabled(bool(self.temp_results))
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить результаты: {str(e)}")
+            logger.log_error("Failed to save results", e)
+            return
+        
+        if self.current_prompt_id is None:
+            # Промт был создан вместе с результатами
+            self.current_prompt_id = prompt_id
+        self.statusBar().clearMessage()
+        QMessageBox.information(self, "Успех", f"Сохранено результатов: {len(result_ids)}")
+        logger.log_info(f"Saved {len(result_ids)} results to database")
+        
+        # Очистить временную таблицу, если за время записи не начат новый запрос
+        if saved_batch is self.temp_results:
+            self.temp_results = []
+            self.result_index_by_model = {}
+            self.results_model.set_results(self.temp_results)
+        else:
+            self.save_results_btn.setEnabled(bool(self.temp_results))
     
     # ========== Методы для экспорта ==========
     
@@ -1224,7 +1791,11 @@ class MainWindow(QMainWindow):
                     'response': result.get('response', ''),
                     'success': result.get('success', False),
                     'error': result.get('error'),
-                    'selected': result.get('selected', False)
+                    'selected': result.get('selected', False),
+                    'attempts': result.get('attempts', 0),
+                    'cache_hit': result.get('cache_hit', False),
+                    'timed_out': result.get('timed_out', False),
+                    **{field: result.get(field) for field in STATS_FIELDS}
                 })
             
             with open(filename, 'w', encoding='utf-8') as f:
@@ -1298,7 +1869,7 @@ class MainWindow(QMainWindow):
         
         # Применить к дочерним виджетам
         for widget in self.findChildren(QWidget):
-            if isinstance(widget, (QLabel, QLineEdit, QTextEdit, QPushButton, QListWidget, QTableWidget)):
+            if isinstance(widget, (QLabel, QLineEdit, QTextEdit, QPushButton, QListView, QTableView)):
                 widget.setFont(font)
     
     def show_settings_dialog(self):
@@ -1350,6 +1921,11 @@ class MainWindow(QMainWindow):
         max_results_spin.setValue(int(db.get_setting('max_results_per_request', '10')))
         requests_layout.addRow("Максимум результатов:", max_results_spin)
         
+        # Потоковая выдача ответов
+        stream_checkbox = QCheckBox()
+        stream_checkbox.setChecked(db.get_setting('stream_responses', '0') == '1')
+        requests_layout.addRow("Потоковая выдача ответов:", stream_checkbox)
+        
         requests_group.setLayout(requests_layout)
         layout.addWidget(requests_group)
         
@@ -1368,17 +1944,31 @@ class MainWindow(QMainWindow):
             timeout = timeout_spin.value()
             max_results = max_results_spin.value()
             
-            db.set_setting('theme', theme)
-            db.set_setting('font_size', str(font_size))
-            db.set_setting('request_timeout', str(timeout))
-            db.set_setting('max_results_per_request', str(max_results))
+            # Настройки записываются одной операцией в фоновом потоке
+            future = db.set_settings_async({
+                'theme': theme,
+                'font_size': str(font_size),
+                'request_timeout': str(timeout),
+                'max_results_per_request': str(max_results),
+                'stream_responses': '1' if stream_checkbox.isChecked() else '0',
+            })
             
             # Применить настройки немедленно
             self.apply_theme(theme)
             self.apply_font_size(font_size)
             
-            QMessageBox.information(self, "Успех", "Настройки сохранены!")
-            logger.log_info("Settings updated")
+            self.submit_db_write(future, self.on_settings_saved)
+    
+    def on_settings_saved(self, future):
+        """Обработчик завершения записи настроек"""
+        try:
+            future.result()
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить настройки: {str(e)}")
+            logger.log_error("Failed to save settings", e)
+            return
+        QMessageBox.information(self, "Успех", "Настройки сохранены!")
+        logger.log_info("Settings updated")
     
     def show_about(self):
         """Показать информацию о программе"""
@@ -1415,15 +2005,49 @@ class MainWindow(QMainWindow):
 
 
 def main():
+    if startup_profile.FLAG in sys.argv:
+        sys.argv.remove(startup_profile.FLAG)
+    startup_profile.mark("imports")
+    
+    # Консольные команды (python main.py run ...) выполняются без окна
+    if len(sys.argv) > 1:
+        import cli
+        if sys.argv[1] in cli.COMMANDS:
+            sys.exit(cli.main(sys.argv[1:]))
+    
     app = QApplication(sys.argv)
+    startup_profile.mark("QApplication")
     
     # Установить иконку приложения
     icon_path = os.path.join(os.path.dirname(__file__), "app.ico")
     if os.path.exists(icon_path):
         app.setWindowIcon(QIcon(icon_path))
     
+    # Дописать очередь записи и закрыть соединения с БД (при закрытии последнего WAL-журнал переносится в файл базы)
+    app.aboutToQuit.connect(db.shutdown_db_writer)
+    app.aboutToQuit.connect(db.close_connections)
+    
+    # Эндпоинт метрик Prometheus (если задан METRICS_PORT)
+    metrics.start_metrics_server()
+    app.aboutToQuit.connect(metrics.stop_metrics_server)
+    
     window = MainWindow()
+    startup_profile.mark("MainWindow")
     window.show()
+    startup_profile.mark("window.show")
+    
+    def on_first_frame():
+        startup_profile.mark("first event loop pass")
+        preload_modules()
+    
+    QTimer.singleShot(0, on_first_frame)
+    
+    def on_database_ready():
+        startup_profile.mark("database ready")
+        startup_profile.report()
+    
+    # Результаты профилирования - когда база готова и окно заполнено
+    window.database_ready.connect(on_database_ready)
     sys.exit(app.exec_())
 
 
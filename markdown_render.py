@@ -0,0 +1,179 @@
+"""
+Модуль для конвертации ответов моделей из markdown в HTML в фоновом потоке
+"""
+import collections
+import concurrent.futures
+import hashlib
+import threading
+from typing import Dict, Optional, Set
+from config import get_markdown_cache_size
+
+# Базовые стили для лучшего отображения ответа в QTextBrowser
+HTML_STYLE = """
+<style>
+    body {
+        font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
+        line-height: 1.6;
+        color: #333;
+        padding: 20px;
+    }
+    pre {
+        background-color: #f4f4f4;
+        border: 1px solid #ddd;
+        border-radius: 4px;
+        padding: 10px;
+        overflow-x: auto;
+    }
+    code {
+        background-color: #f4f4f4;
+        padding: 2px 4px;
+        border-radius: 3px;
+        font-family: 'Courier New', monospace;
+    }
+    pre code {
+        background-color: transparent;
+        padding: 0;
+    }
+    table {
+        border-collapse: collapse;
+        width: 100%;
+        margin: 10px 0;
+    }
+    table th, table td {
+        border: 1px solid #ddd;
+        padding: 8px;
+        text-align: left;
+    }
+    table th {
+        background-color: #f2f2f2;
+        font-weight: bold;
+    }
+    blockquote {
+        border-left: 4px solid #ddd;
+        margin: 0;
+        padding-left: 20px;
+        color: #666;
+    }
+    h1, h2, h3, h4, h5, h6 {
+        margin-top: 20px;
+        margin-bottom: 10px;
+    }
+</style>
+"""
+
+
+def render_html(text: str) -> str:
+    """
+    Сконвертировать markdown в HTML со стилями
+    
+    Args:
+        text: Текст ответа в markdown
+    
+    Returns:
+        HTML для QTextBrowser
+    """
+    # Библиотека загружается при первой конвертации (в потоке конвертации), а не при запуске
+    import markdown
+    # Попробовать с расширениями, если не получится - без них
+    try:
+        html_content = markdown.markdown(
+            text,
+            extensions=['extra', 'codehilite', 'tables', 'fenced_code']
+        )
+    except Exception:
+        # Если расширения недоступны, использовать базовый markdown
+        html_content = markdown.markdown(text)
+    return f"{HTML_STYLE}\n{html_content}"
+
+
+class MarkdownRenderer:
+    """
+    Сервис конвертации markdown в HTML
+    
+    Конвертация выполняется в отдельном потоке, итоговый HTML хранится в LRU-кэше
+    по хэшу текста: повторное открытие того же ответа не конвертирует его заново.
+    Промежуточные тексты потоковой выдачи конвертируются без сохранения в кэш,
+    чтобы не вытеснять из него готовые ответы.
+    """
+    
+    def __init__(self, cache_size: Optional[int] = None):
+        self.cache_size = cache_size or get_markdown_cache_size()
+        self._cache: "collections.OrderedDict[str, str]" = collections.OrderedDict()
+        self._pending: Dict[str, concurrent.futures.Future] = {}
+        self._keep: Set[str] = set()  # Конвертируемые тексты, HTML которых нужно сохранить в кэш
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="ChatList-markdown")
+    
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def get_cached(self, text: str) -> Optional[str]:
+        """Получить HTML из кэша (None, если текст еще не сконвертирован)"""
+        key = self._key(text)
+        with self._lock:
+            html = self._cache.get(key)
+            if html is not None:
+                self._cache.move_to_end(key)
+            return html
+    
+    def _render(self, key: str, text: str) -> str:
+        html = None
+        try:
+            html = render_html(text)
+            return html
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+                if key in self._keep and html is not None:
+                    self._cache[key] = html
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+                self._keep.discard(key)
+    
+    def submit(self, text: str, cache: bool = True) -> concurrent.futures.Future:
+        """
+        Поставить текст на конвертацию в фоновом потоке
+        
+        Args:
+            text: Текст ответа в markdown
+            cache: Сохранить HTML в кэш (False - для промежуточного текста потоковой выдачи)
+        
+        Returns:
+            Future с HTML; для текста из кэша - уже завершенный,
+            для текста, который уже конвертируется, - тот же Future
+        """
+        key = self._key(text)
+        with self._lock:
+            html = self._cache.get(key)
+            if html is not None:
+                self._cache.move_to_end(key)
+                future = concurrent.futures.Future()
+                future.set_result(html)
+                return future
+            # Текст мог начать конвертироваться как промежуточный - тогда HTML сохранится по этому запросу
+            if cache:
+                self._keep.add(key)
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(self._render, key, text)
+                self._pending[key] = future
+            return future
+    
+    def shutdown(self):
+        """Остановить поток конвертации"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_renderer: Optional[MarkdownRenderer] = None
+_renderer_lock = threading.Lock()
+
+
+def get_markdown_renderer() -> MarkdownRenderer:
+    """Получить общий сервис конвертации (создается при первом обращении)"""
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = MarkdownRenderer()
+    return _renderer
@@ -0,0 +1,317 @@
+"""
+Модуль для метрик работы приложения в формате Prometheus
+"""
+import abc
+import bisect
+import math
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from config import get_metrics_host, get_metrics_port
+import logger
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# Границы корзин гистограмм времени, сек
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+DB_WRITE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_metrics: List['_Metric'] = []
+_metrics_lock = threading.Lock()
+
+
+class _Metric(abc.ABC):
+    """
+    Метрика с метками
+    
+    Значения изменяются под блокировкой самой метрики, поэтому запись
+    из потоков запросов не ждет чтения всех метрик при выгрузке.
+    """
+    
+    type = 'untyped'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        """
+        Args:
+            name: Имя метрики
+            documentation: Описание (строка HELP)
+            labelnames: Имена меток
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, object] = {}
+        with _metrics_lock:
+            _metrics.append(self)
+    
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+    
+    @abc.abstractmethod
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Получить значения: список (имя, метки, значение)"""
+    
+    def clear(self):
+        """Сбросить все значения"""
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Счетчик, который только увеличивается"""
+    
+    type = 'counter'
+    
+    def inc(self, amount: float = 1.0, **labels):
+        """Увеличить счетчик с метками labels на amount"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def get(self, **labels) -> float:
+        """Получить значение счетчика с метками labels"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+    
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in values]
+
+
+class Gauge(_Metric):
+    """
+    Текущее значение (например, длина очереди)
+    
+    Значение задается через set() или функцией, которая вызывается
+    только при выгрузке метрик.
+    """
+    
+    type = 'gauge'
+    
+    def set(self, value: float, **labels):
+        """Установить значение с метками labels"""
+        with self._lock:
+            self._values[self._key(labels)] = value
+    
+    def set_function(self, func: Callable[[], float], **labels):
+        """Вычислять значение с метками labels функцией func при выгрузке"""
+        with self._lock:
+            self._values[self._key(labels)] = func
+    
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        result = []
+        for key, value in values:
+            if callable(value):
+                try:
+                    value = value()
+                except Exception as e:
+                    logger.log_error(f"Metric {self.name} callback failed", e)
+                    continue
+            result.append((self.name, dict(zip(self.labelnames, key)), value))
+        return result
+
+
+class Histogram(_Metric):
+    """Гистограмма наблюдений с фиксированными границами корзин"""
+    
+    type = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """
+        Args:
+            name: Имя метрики
+            documentation: Описание (строка HELP)
+            labelnames: Имена меток
+            buckets: Возрастающие верхние границы корзин (корзина +Inf добавляется сама)
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, **labels):
+        """Добавить наблюдение с метками labels"""
+        index = bisect.bisect_left(self.buckets, value)
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Счетчики корзин (последняя - +Inf), сумма, количество
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+    
+    def samples(self):
+        with self._lock:
+            values = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        result = []
+        bounds = self.buckets + (math.inf,)
+        for key, counts, total, count in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                result.append((f"{self.name}_bucket", {**labels, 'le': _format_value(bound)}, cumulative))
+            result.append((f"{self.name}_sum", labels, total))
+            result.append((f"{self.name}_count", labels, count))
+        return result
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render() -> str:
+    """
+    Выгрузить все метрики в текстовом формате Prometheus
+    
+    Returns:
+        Текст для ответа на GET /metrics
+    """
+    with _metrics_lock:
+        metrics = list(_metrics)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            if labels:
+                label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{name} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+# ========== Метрики приложения ==========
+
+REQUESTS = Counter('chatlist_requests_total', 'Requests to model APIs by outcome',
+                   ('provider', 'model', 'status'))
+REQUEST_ERRORS = Counter('chatlist_request_errors_total', 'Failed requests by exception type',
+                         ('provider', 'model', 'type'))
+REQUEST_RETRIES = Counter('chatlist_request_retries_total', 'Repeated attempts after 429/5xx responses',
+                          ('provider', 'model'))
+REQUEST_DURATION = Histogram('chatlist_request_duration_seconds', 'Total request time including retries',
+                             ('provider', 'model'))
+REQUEST_TTFT = Histogram('chatlist_request_ttft_seconds', 'Time to the first response token',
+                         ('provider', 'model'))
+TOKENS = Counter('chatlist_tokens_total', 'Tokens reported by providers', ('provider', 'model', 'kind'))
+CACHE_LOOKUPS = Counter('chatlist_response_cache_lookups_total', 'Response cache lookups', ('result',))
+DB_WRITE_DURATION = Histogram('chatlist_db_write_duration_seconds', 'Time to write one batch (one transaction)',
+                              buckets=DB_WRITE_BUCKETS)
+DB_WRITE_OPERATIONS = Counter('chatlist_db_write_operations_total', 'Operations written by the background writer')
+DB_WRITE_QUEUE = Gauge('chatlist_db_write_queue_depth', 'Operations waiting in the database write queue')
+DISPATCHER_REQUESTS = Gauge('chatlist_dispatcher_requests', 'Requests in the dispatcher by state', ('state',))
+
+
+def observe_request(record: Dict):
+    """
+    Учесть завершенный запрос к API
+    
+    Args:
+        record: Запись о запросе (см. network.send_request): provider, model, status,
+                error_type, attempts, latency, ttft, usage
+    """
+    provider, model = record['provider'], record['model']
+    REQUESTS.inc(provider=provider, model=model, status=record['status'])
+    if record.get('error_type'):
+        REQUEST_ERRORS.inc(provider=provider, model=model, type=record['error_type'])
+    if (record.get('attempts') or 0) > 1:
+        REQUEST_RETRIES.inc(record['attempts'] - 1, provider=provider, model=model)
+    if record.get('latency') is not None and not record.get('cache_hit'):
+        REQUEST_DURATION.observe(record['latency'], provider=provider, model=model)
+    if record.get('ttft') is not None and not record.get('cache_hit'):
+        REQUEST_TTFT.observe(record['ttft'], provider=provider, model=model)
+    usage = record.get('usage') or {}
+    for kind in ('prompt', 'completion'):
+        tokens = usage.get(f'{kind}_tokens')
+        if isinstance(tokens, (int, float)):
+            TOKENS.inc(tokens, provider=provider, model=model, kind=kind)
+
+
+# ========== HTTP-эндпоинт ==========
+
+def _create_server(host: str, port: int) -> 'ThreadingHTTPServer':
+    # http.server загружается, только если эндпоинт включен
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """Обработчик GET /metrics"""
+        
+        def do_GET(self):
+            if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = render().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            # Каждый опрос не записывается в журнал
+            pass
+    
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    return server
+
+
+_server: Optional['ThreadingHTTPServer'] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> Optional['ThreadingHTTPServer']:
+    """
+    Запустить HTTP-эндпоинт метрик в фоновом потоке
+    
+    Args:
+        port: Порт (None - METRICS_PORT; 0 - эндпоинт выключен)
+        host: Адрес (None - METRICS_HOST)
+    
+    Returns:
+        Запущенный сервер или None, если эндпоинт выключен или порт занят
+    """
+    global _server
+    port = get_metrics_port() if port is None else port
+    host = host or get_metrics_host()
+    if not port:
+        return None
+    with _server_lock:
+        if _server is not None:
+            return _server
+        try:
+            server = _create_server(host, port)
+        except OSError as e:
+            logger.log_error(f"Metrics endpoint {host}:{port} failed to start", e)
+            return None
+        threading.Thread(target=server.serve_forever, name="ChatList-metrics", daemon=True).start()
+        _server = server
+    logger.log_info(f"Metrics endpoint: http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def stop_metrics_server():
+    """Остановить HTTP-эндпоинт метрик, если он запущен"""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            _server.shutdown()
+            _server.server_close()
+            _server = None
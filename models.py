@@ -1,12 +1,34 @@
 """
 Модуль для логики работы с моделями нейросетей
 """
-from typing import List, Dict
+from typing import Callable, Dict, Iterator, List, Optional
 import concurrent.futures
+import functools
 from db import get_active_models
-from network import send_request, APIError
+from cancellation import CancelToken
+from providers import resolve_adapter
 import logger
 
+# Поля статистики запроса, передаваемые в результат (см. network.send_request)
+STATS_FIELDS = ('latency', 'connect', 'tls', 'ttfb', 'ttft', 'request_bytes', 'response_bytes', 'usage')
+
+
+def _result(success: bool, response: str, error: Optional[str], stats: Dict,
+            cancelled: bool = False, timed_out: bool = False) -> Dict:
+    """Сформировать результат запроса вместе со статистикой"""
+    result = {
+        'success': success,
+        'response': response,
+        'error': error,
+        'attempts': stats.get('attempts', 0),
+        'cache_hit': stats.get('cache_hit', False),
+        'cancelled': cancelled,
+        'timed_out': timed_out
+    }
+    for field in STATS_FIELDS:
+        result[field] = stats.get(field)
+    return result
+
 
 class Model:
     """Класс для представления модели нейросети"""
@@ -19,6 +41,9 @@ class Model:
         self.is_active = model_data.get('is_active', 0)
         self.model_type = model_data.get('model_type', '')
         self.created_at = model_data.get('created_at', '')
+        # Адаптер провайдера определяется один раз при создании модели
+        self.adapter = resolve_adapter(model_data)
+        self.provider = self.adapter.name
     
     def to_dict(self) -> Dict:
         """Преобразовать модель в словарь"""
@@ -32,36 +57,38 @@ class Model:
             'created_at': self.created_at
         }
     
-    def send_prompt(self, prompt: str) -> Dict:
+    def send_prompt(self, prompt: str, on_chunk: Optional[Callable[[str], None]] = None,
+                    use_cache: bool = True, cancel_token: Optional[CancelToken] = None) -> Dict:
         """
         Отправить промт модели и получить ответ
         
         Args:
             prompt: Текст промта
+            on_chunk: Функция для потоковой выдачи фрагментов ответа (если None - ответ целиком)
+            use_cache: Использовать кэш ответов
+            cancel_token: Признак отмены запроса
         
         Returns:
-            Словарь с результатом: {'success': bool, 'response': str, 'error': str}
+            Словарь с результатом: {'success': bool, 'response': str, 'error': str,
+                                    'attempts': int, 'cache_hit': bool,
+                                    'cancelled': bool, 'timed_out': bool}
+            и полями статистики STATS_FIELDS (время в секундах, размеры в байтах,
+            'usage' - расход токенов по данным провайдера или None);
+            для прерванного запроса 'response' содержит уже полученную часть ответа
         """
+        # Сетевой стек загружается при первом запросе, а не при запуске приложения
+        from network import send_request, APIError, RequestCancelled, DeadlineExceeded
+        stats = {}
         try:
             model_dict = self.to_dict()
-            response = send_request(model_dict, prompt)
-            return {
-                'success': True,
-                'response': response,
-                'error': None
-            }
+            response = send_request(model_dict, prompt, on_chunk, stats, self.adapter, use_cache, cancel_token)
+            return _result(True, response, None, stats)
         except APIError as e:
-            return {
-                'success': False,
-                'response': '',
-                'error': str(e)
-            }
+            return _result(False, getattr(e, 'partial', ''), str(e), stats,
+                           cancelled=isinstance(e, RequestCancelled),
+                           timed_out=isinstance(e, DeadlineExceeded))
         except Exception as e:
-            return {
-                'success': False,
-                'response': '',
-                'error': f"Unexpected error: {str(e)}"
-            }
+            return _result(False, '', f"Unexpected error: {str(e)}", stats)
 
 
 def get_active_models_list() -> List[Model]:
@@ -75,50 +102,134 @@ def get_active_models_list() -> List[Model]:
     return [Model(model_data) for model_data in models_data]
 
 
-def send_prompt_to_models(prompt: str, models: List[Model] = None) -> List[Dict]:
+def _build_result(model: Model, result: Dict) -> Dict:
+    """Сформировать словарь результата для таблицы результатов"""
+    built = {
+        'model_id': model.id,
+        'model_name': model.name,
+        'response': result['response'],
+        'error': result['error'],
+        'success': result['success'],
+        'attempts': result.get('attempts', 0),
+        'cache_hit': result.get('cache_hit', False),
+        'cancelled': result.get('cancelled', False),
+        'timed_out': result.get('timed_out', False)
+    }
+    for field in STATS_FIELDS:
+        built[field] = result.get(field)
+    return built
+
+
+def iter_prompt_to_models(prompt: str, models: List[Model] = None,
+                          on_chunk: Optional[Callable[[Model, str], None]] = None,
+                          use_cache: bool = True,
+                          cancel_token: Optional[CancelToken] = None,
+                          stop_after: Optional[int] = None,
+                          deadline: Optional[float] = None) -> Iterator[Dict]:
     """
-    Отправить промт нескольким моделям параллельно
+    Отправить промт нескольким моделям параллельно и выдавать результаты по мере готовности
     
     Args:
         prompt: Текст промта
         models: Список моделей (если None, используются активные модели)
+        on_chunk: Функция (модель, фрагмент) для потоковой выдачи ответов;
+                  если None, ответы запрашиваются целиком
+        use_cache: Использовать кэш ответов (False - всегда обращаться к API)
+        cancel_token: Признак отмены: ожидающие запросы снимаются с очереди диспетчера,
+                      выполняющиеся прерываются
+        stop_after: Отменить оставшиеся запросы после стольких успешных ответов
+                    (None или 0 - ждать все модели)
+        deadline: Срок рассылки в секундах: по его истечении оставшиеся запросы прерываются
+                  и выдаются с 'timed_out' и полученной частью ответа (None или 0 - без срока)
     
-    Returns:
-        Список результатов: [{'model_id': int, 'model_name': str, 'response': str, 'error': str}, ...]
+    Yields:
+        Результат очередной ответившей модели:
+        {'model_id': int, 'model_name': str, 'response': str, 'error': str, 'success': bool,
+         'attempts': int, 'cache_hit': bool, 'cancelled': bool, 'timed_out': bool} и поля STATS_FIELDS;
+        результат выдается для каждой модели, в том числе отмененной
     """
     if models is None:
         models = get_active_models_list()
+    # Собственный признак рассылки: его отменяют stop_after и срок, а не только вызывающий
+    cancel_token = CancelToken(cancel_token, deadline or None)
+    try:
+        yield from _iter_results(prompt, models, on_chunk, use_cache, cancel_token, stop_after)
+    finally:
+        # Генератор закрыт до получения всех результатов - оставшиеся запросы не нужны:
+        # ожидающие снимаются с очереди диспетчера, выполняющиеся прерываются
+        cancel_token.cancel()
+        cancel_token.release()
+
+
+def _iter_results(prompt: str, models: List[Model], on_chunk: Optional[Callable[[Model, str], None]],
+                  use_cache: bool, cancel_token: CancelToken, stop_after: Optional[int]) -> Iterator[Dict]:
+    started = set()  # Модели, запросы которых уже выполняются
     
-    results = []
+    def send(model: Model, chunk_callback: Optional[Callable[[str], None]]) -> Dict:
+        started.add(model)
+        return model.send_prompt(prompt, chunk_callback, use_cache, cancel_token)
     
-    # Используем ThreadPoolExecutor для параллельной отправки запросов
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(models)) as executor:
-        # Запускаем запросы параллельно
-        future_to_model = {
-            executor.submit(model.send_prompt, prompt): model 
-            for model in models
-        }
-        
-        # Собираем результаты
-        for future in concurrent.futures.as_completed(future_to_model):
-            model = future_to_model[future]
-            try:
-                result = future.result()
-                results.append({
-                    'model_id': model.id,
-                    'model_name': model.name,
-                    'response': result['response'],
-                    'error': result['error'],
-                    'success': result['success']
-                })
-            except Exception as e:
-                results.append({
-                    'model_id': model.id,
-                    'model_name': model.name,
-                    'response': '',
-                    'error': f"Exception: {str(e)}",
-                    'success': False
-                })
+    from dispatcher import get_dispatcher
+    
+    # Запросы выполняет общий диспетчер с ограничением параллельности
+    dispatcher = get_dispatcher()
+    future_to_model = {
+        dispatcher.submit(
+            model.provider, send, model,
+            functools.partial(on_chunk, model) if on_chunk else None
+        ): model
+        for model in models
+    }
+    
+    def cancel_waiting():
+        # Запросы, еще ожидающие слота диспетчера, снимаются без обращения к API;
+        # выполняющиеся прерывает сам признак и возвращает полученную часть ответа
+        for future, model in future_to_model.items():
+            if model not in started:
+                future.cancel()
     
-    return results
+    cancel_token.add_callback(cancel_waiting)
+    
+    successes = 0
+    for future in concurrent.futures.as_completed(future_to_model):
+        model = future_to_model[future]
+        if future.cancelled():
+            yield _build_result(model, {
+                'response': '',
+                'error': "Request timed out" if cancel_token.timed_out else "Request cancelled",
+                'success': False,
+                'cancelled': True,
+                'timed_out': cancel_token.timed_out
+            })
+            continue
+        try:
+            result = future.result()
+        except Exception as e:
+            yield _build_result(model, {
+                'response': '',
+                'error': f"Exception: {str(e)}",
+                'success': False
+            })
+            continue
+        yield _build_result(model, result)
+        if result['success']:
+            successes += 1
+            if stop_after and successes >= stop_after and not cancel_token.cancelled:
+                logger.log_info(f"Got {successes} responses, cancelling remaining requests")
+                cancel_token.cancel()
+
 
+def send_prompt_to_models(prompt: str, models: List[Model] = None) -> List[Dict]:
+    """
+    Отправить промт нескольким моделям параллельно
+    
+    Args:
+        prompt: Текст промта
+        models: Список моделей (если None, используются активные модели)
+    
+    Returns:
+        Список результатов в порядке ответов моделей, в формате iter_prompt_to_models:
+        [{'model_id': int, 'model_name': str, 'response': str, 'error': str, 'success': bool,
+          'attempts': int, 'cache_hit': bool, 'cancelled': bool, 'timed_out': bool} и поля STATS_FIELDS, ...]
+    """
+    return list(iter_prompt_to_models(prompt, models))
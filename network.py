@@ -2,95 +2,685 @@
 Модуль для отправки HTTP-запросов к API нейросетей
 """
 import requests
+import hashlib
 import json
-from typing import Dict, Optional
-from config import get_api_key, get_request_timeout
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from config import (
+    get_api_key, get_pool_connections, get_pool_maxsize,
+    get_max_retries, get_retry_backoff, get_retry_backoff_max, get_request_deadline,
+    get_connect_timeout, get_first_byte_timeout
+)
+from providers import ProviderAdapter, get_provider, resolve_adapter
+from ratelimit import get_rate_limiter, estimate_tokens
+from dispatcher import released_slot
+from circuit_breaker import get_breaker
+from cancellation import CancelToken, bind_token, attach_socket
+import response_cache
+import metrics
+import logger
 
 
 class APIError(Exception):
     """Исключение для ошибок API"""
+    
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code  # HTTP-статус ответа, если он был получен
+        self.retry_after = retry_after  # Значение заголовка Retry-After в секундах
+
+
+class CircuitOpenError(APIError):
+    """Модель временно отключена после серии ошибок"""
+    pass
+
+
+class RateLimitWaitError(APIError):
+    """Клиентский лимит частоты не освободился до истечения срока запроса"""
     pass
 
 
-def send_openai_request(model_name: str, prompt: str, api_key: str) -> str:
+class RequestCancelled(APIError):
+    """Запрос отменен пользователем или после получения нужного числа ответов"""
+    
+    def __init__(self, message: str, partial: str = ''):
+        super().__init__(message)
+        self.partial = partial  # Текст, полученный до отмены при потоковой выдаче
+
+
+class DeadlineExceeded(RequestCancelled):
+    """Запрос прерван по истечении срока (REQUEST_DEADLINE или срока рассылки)"""
+    pass
+
+
+# HTTP-статусы временных ошибок, при которых запрос повторяется
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+# ========== Пул HTTP-сессий ==========
+
+# Реестр сессий по провайдерам: каждая сессия держит keep-alive соединения,
+# поэтому повторные запросы к одному API не платят за TCP/TLS рукопожатие
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+# Словарь статистики запроса, который выполняет текущий поток (см. _send_chat_once)
+_request_stats = threading.local()
+
+
+def _set_stat(name: str, value):
+    stats = getattr(_request_stats, 'stats', None)
+    if stats is not None:
+        stats[name] = value
+
+
+class _ConnectionHooks:
     """
-    Отправить запрос к OpenAI API
+    Общая часть соединений пула
+    
+    Сокет регистрируется в признаке отмены текущего запроса, а время
+    установки соединения (DNS + TCP) и TLS-рукопожатия записывается
+    в статистику запроса.
+    """
+    
+    _cancel_token: Optional[CancelToken] = None
+    _cancel_sock = None
+    
+    def _attach_socket(self):
+        self.release_cancel_token()
+        self._cancel_token = attach_socket(self.sock)
+        self._cancel_sock = self.sock
+    
+    def release_cancel_token(self):
+        """Отвязать сокет от признака отмены запроса (до возврата соединения в пул)"""
+        if self._cancel_token is not None:
+            self._cancel_token.detach_socket(self._cancel_sock)
+            self._cancel_token = self._cancel_sock = None
+    
+    def _new_conn(self):
+        started = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            _set_stat('connect', time.perf_counter() - started)
+    
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        if isinstance(self, HTTPSConnection):
+            stats = getattr(_request_stats, 'stats', None) or {}
+            _set_stat('tls', max(0.0, time.perf_counter() - started - (stats.get('connect') or 0.0)))
+        self._attach_socket()
+    
+    def request(self, *args, **kwargs):
+        # Соединение из пула уже подключено - connect() для него не вызывается
+        if self.sock is not None:
+            self._attach_socket()
+        return super().request(*args, **kwargs)
+
+
+class _CancellableHTTPConnection(_ConnectionHooks, HTTPConnection):
+    pass
+
+
+class _CancellableHTTPSConnection(_ConnectionHooks, HTTPSConnection):
+    pass
+
+
+class _PoolHooks:
+    """
+    Общая часть пулов соединений
+    
+    urllib3 возвращает соединение в пул, как только тело ответа прочитано,
+    то есть раньше, чем запрос завершится. Сокет отвязывается от признака
+    отмены под его блокировкой до возврата, поэтому отмена завершенного
+    запроса не закроет соединение, которое уже взял другой запрос.
+    """
+    
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn.release_cancel_token()
+        super()._put_conn(conn)
+
+
+class _CancellableHTTPConnectionPool(_PoolHooks, HTTPConnectionPool):
+    ConnectionCls = _CancellableHTTPConnection
+
+
+class _CancellableHTTPSConnectionPool(_PoolHooks, HTTPSConnectionPool):
+    ConnectionCls = _CancellableHTTPSConnection
+
+
+class _PoolAdapter(HTTPAdapter):
+    """Транспорт requests, соединения которого можно прервать через CancelToken"""
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CancellableHTTPConnectionPool,
+            'https': _CancellableHTTPSConnectionPool
+        }
+
+
+def _create_session() -> requests.Session:
+    """Создать сессию с пулом соединений, размер которого задан в конфигурации"""
+    session = requests.Session()
+    adapter = _PoolAdapter(
+        pool_connections=get_pool_connections(),
+        pool_maxsize=get_pool_maxsize()
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(provider: str) -> requests.Session:
+    """
+    Получить общую HTTP-сессию провайдера (создается при первом обращении)
     
     Args:
-        model_name: Название модели (например, 'gpt-4')
-        prompt: Текст промта
-        api_key: API ключ
+        provider: Имя провайдера (например, 'openrouter')
     
     Returns:
-        Текст ответа модели
+        Сессия requests с пулом keep-alive соединений
     """
-    url = "https://api.openai.com/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": model_name,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.7
-    }
+    session = _sessions.get(provider)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(provider)
+            if session is None:
+                session = _create_session()
+                _sessions[provider] = session
+    return session
+
+
+def close_sessions():
+    """Закрыть все HTTP-сессии и освободить соединения"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def _record_ttft(stats: Optional[Dict], started: float):
+    """Записать время до первого токена, если оно еще не записано"""
+    if stats is not None and 'ttft' not in stats:
+        stats['ttft'] = time.perf_counter() - started
+
+
+def read_sse_stream(response: requests.Response, on_chunk: Callable[[str], None],
+                    stats: Optional[Dict] = None, started: Optional[float] = None,
+                    cancel_token: Optional[CancelToken] = None) -> str:
+    """
+    Прочитать потоковый ответ (server-sent events) OpenAI-совместимого API
+    
+    Args:
+        response: Ответ, полученный с stream=True
+        on_chunk: Функция, которой передается каждый новый фрагмент текста
+        stats: Словарь, в который записываются время до первого токена ('ttft'),
+               объем полученных данных ('response_bytes') и расход токенов ('usage')
+        started: Момент отправки запроса (time.perf_counter)
+        cancel_token: Признак отмены; после отмены чтение прекращается
+    
+    Returns:
+        Полный текст ответа
+    
+    Raises:
+        APIError: Если провайдер прислал ошибку внутри потока
+    """
+    if started is None:
+        started = time.perf_counter()
+    parts = []
+    try:
+        for line in _iter_sse_lines(response, cancel_token, stats):
+            if cancel_token is not None and cancel_token.cancelled:
+                break
+            # Пустые строки разделяют события, строки с ':' - комментарии (keep-alive)
+            if not line or line.startswith(':') or not line.startswith('data:'):
+                continue
+            payload = line[5:].strip()
+            if payload == '[DONE]':
+                break
+            try:
+                event = json.loads(payload)
+            except json.JSONDecodeError:
+                continue
+            if 'error' in event:
+                error = event['error']
+                message = error.get('message', str(error)) if isinstance(error, dict) else str(error)
+                raise APIError(f"Stream error: {message}")
+            # Расход токенов приходит в последнем событии (stream_options.include_usage)
+            if event.get('usage') and stats is not None:
+                stats['usage'] = event['usage']
+            choices = event.get('choices') or []
+            if not choices:
+                continue
+            content = (choices[0].get('delta') or {}).get('content')
+            if content:
+                _record_ttft(stats, started)
+                parts.append(content)
+                on_chunk(content)
+    finally:
+        response.close()
+    return ''.join(parts)
+
+
+def _iter_sse_lines(response: requests.Response, cancel_token: Optional[CancelToken],
+                    stats: Optional[Dict] = None):
+    """Строки потока; ошибка чтения из сокета, закрытого при отмене, завершает поток"""
+    received = 0
+    try:
+        # Строки читаются байтами, чтобы учесть объем ответа; текст события всегда UTF-8
+        # (для text/event-stream без charset requests выбрал бы ISO-8859-1)
+        for line in response.iter_lines():
+            received += len(line) + 1
+            if stats is not None:
+                stats['response_bytes'] = received
+            yield line.decode('utf-8', errors='replace')
+    except requests.exceptions.RequestException:
+        if cancel_token is None or not cancel_token.cancelled:
+            raise
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Разобрать заголовок Retry-After
+    
+    Args:
+        value: Число секунд или HTTP-дата
+    
+    Returns:
+        Задержка в секундах или None, если заголовок отсутствует или некорректен
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def get_retry_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Вычислить задержку перед повтором
     
+    Args:
+        attempt: Номер неудачной попытки (с 1)
+        retry_after: Задержка, запрошенная сервером через Retry-After
+    
+    Returns:
+        Задержка в секундах: Retry-After, если он задан, иначе экспоненциальный
+        откат со случайным разбросом (full jitter)
+    """
+    if retry_after is not None:
+        return retry_after
+    ceiling = min(get_retry_backoff_max(), get_retry_backoff() * (2 ** (attempt - 1)))
+    return random.uniform(0, ceiling)
+
+
+# Размер блока при чтении тела ответа: между блоками проверяется отмена
+BODY_CHUNK_SIZE = 64 * 1024
+
+
+def _read_body(response: requests.Response, cancel_token: Optional[CancelToken],
+               stats: Optional[Dict] = None) -> bytes:
+    """Прочитать тело ответа по блокам, прекращая чтение при отмене"""
+    try:
+        chunks = []
+        for chunk in response.iter_content(BODY_CHUNK_SIZE):
+            if cancel_token is not None and cancel_token.cancelled:
+                break
+            chunks.append(chunk)
+            if stats is not None:
+                stats['response_bytes'] = stats.get('response_bytes', 0) + len(chunk)
+        return b''.join(chunks)
+    finally:
+        response.close()
+
+
+def _send_chat_once(adapter: ProviderAdapter, url: str, model_name: str, messages: List[Dict],
+                    api_key: str, on_chunk: Optional[Callable[[str], None]],
+                    stats: Optional[Dict], timeout: Tuple[float, float],
+                    cancel_token: Optional[CancelToken] = None) -> str:
+    """Выполнить одну попытку запроса chat/completions"""
+    if stats is None:
+        stats = {}
+    # Соединения пула записывают время подключения в статистику текущего потока;
+    # если соединение взято из пула, подключения не было и значения остаются None
+    stats['connect'] = stats['tls'] = None
+    stats['response_bytes'] = 0
+    _request_stats.stats = stats
+    try:
+        return _send_chat_attempt(adapter, url, model_name, messages, api_key, on_chunk,
+                                  stats, timeout, cancel_token)
+    finally:
+        _request_stats.stats = None
+
+
+def _send_chat_attempt(adapter: ProviderAdapter, url: str, model_name: str, messages: List[Dict],
+                       api_key: str, on_chunk: Optional[Callable[[str], None]],
+                       stats: Dict, timeout: Tuple[float, float],
+                       cancel_token: Optional[CancelToken]) -> str:
+    stream = on_chunk is not None
     try:
-        response = requests.post(
+        # Тело сериализуется заранее, чтобы знать его размер
+        body = json.dumps(adapter.build_payload(model_name, messages, stream)).encode('utf-8')
+        stats['request_bytes'] = len(body)
+        started = time.perf_counter()
+        # Тело ответа всегда читается потоком, чтобы отмена прерывала и обычные ответы
+        response = get_session(adapter.name).post(
             url,
-            headers=headers,
-            json=data,
-            timeout=get_request_timeout()
+            headers=adapter.build_headers(api_key),
+            data=body,
+            timeout=timeout,
+            stream=True
         )
-        response.raise_for_status()
-        result = response.json()
-        return result['choices'][0]['message']['content']
+        stats['ttfb'] = time.perf_counter() - started
+        
+        error_msg = adapter.error_for_status(response, model_name)
+        if error_msg:
+            response.close()
+            raise APIError(error_msg, response.status_code)
+        
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+        if stream:
+            return read_sse_stream(response, on_chunk, stats, started, cancel_token)
+        result = json.loads(_read_body(response, cancel_token, stats))
+        _record_ttft(stats, started)
+        if result.get('usage'):
+            stats['usage'] = result['usage']
+        
+        # Проверка наличия ответа
+        if not result.get('choices'):
+            raise APIError(f"{adapter.label} error: No response from model '{model_name}'")
+        
+        return adapter.parse_response(result)
+    except APIError:
+        raise
     except requests.exceptions.RequestException as e:
-        raise APIError(f"OpenAI API error: {str(e)}")
-    except (KeyError, IndexError) as e:
-        raise APIError(f"Invalid OpenAI API response: {str(e)}")
+        response = getattr(e, 'response', None)
+        if response is not None:
+            raise APIError(adapter.describe_error(e), response.status_code,
+                           parse_retry_after(response.headers.get('Retry-After')))
+        raise APIError(adapter.describe_error(e))
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise APIError(f"Invalid {adapter.label} response: {str(e)}")
 
 
-def send_deepseek_request(model_name: str, prompt: str, api_key: str) -> str:
+def _cancelled_error(adapter: ProviderAdapter, model_name: str, token: CancelToken,
+                     partial: str = '') -> RequestCancelled:
+    """Исключение для запроса, прерванного отменой или по истечении срока"""
+    if token.timed_out:
+        return DeadlineExceeded(f"{adapter.label} error: request to '{model_name}' timed out", partial)
+    return RequestCancelled(f"{adapter.label} error: request to '{model_name}' was cancelled", partial)
+
+
+def _send_with_retries(adapter: ProviderAdapter, url: str, model_name: str, messages: List[Dict],
+                       api_key: str, on_chunk: Optional[Callable[[str], None]],
+                       stats: Optional[Dict], cancel_token: Optional[CancelToken] = None) -> str:
+    """Выполнить запрос с ожиданием лимита частоты и повторами при 429/5xx"""
+    total = get_request_deadline()
+    deadline = time.monotonic() + total
+    # Срок запроса прерывает и медленно, но непрерывно передаваемый ответ
+    token = CancelToken(cancel_token, total)
+    try:
+        return _send_attempts(adapter, url, model_name, messages, api_key, on_chunk, stats, token, deadline)
+    finally:
+        token.release()
+
+
+def _send_attempts(adapter: ProviderAdapter, url: str, model_name: str, messages: List[Dict],
+                   api_key: str, on_chunk: Optional[Callable[[str], None]],
+                   stats: Optional[Dict], token: CancelToken, deadline: float) -> str:
+    max_retries = get_max_retries()
+    tokens = estimate_tokens(messages)
+    attempt = 0
+    while True:
+        if token.cancelled:
+            raise _cancelled_error(adapter, model_name, token)
+        attempt += 1
+        if stats is not None:
+            stats['attempts'] = attempt
+        limiter = get_rate_limiter()
+        allowed = limiter.acquire(adapter.name, api_key, tokens, 0, token)
+        if not allowed:
+            # Ожидание лимита одного провайдера не занимает глобальный слот диспетчера
+            with released_slot(token):
+                allowed = limiter.acquire(adapter.name, api_key, tokens, deadline - time.monotonic(), token)
+        if not allowed:
+            if token.cancelled:
+                raise _cancelled_error(adapter, model_name, token)
+            raise RateLimitWaitError(f"{adapter.label} error: client-side rate limit for '{model_name}' "
+                                     f"did not free up before the request deadline")
+        remaining = max(0.1, deadline - time.monotonic())
+        # Отдельные лимиты на соединение и на ожидание первого байта ответа
+        timeout = (min(get_connect_timeout(), remaining), min(get_first_byte_timeout(), remaining))
+        try:
+            with bind_token(token):
+                text = _send_chat_once(adapter, url, model_name, messages, api_key, on_chunk, stats,
+                                       timeout, token)
+        except Exception as e:
+            # Ошибка чтения из закрытого при отмене сокета - это отмена, а не сбой модели
+            if token.cancelled:
+                raise _cancelled_error(adapter, model_name, token) from e
+            if not isinstance(e, APIError) or e.status_code not in RETRYABLE_STATUSES or attempt > max_retries:
+                raise
+            delay = get_retry_delay(attempt, e.retry_after)
+            if time.monotonic() + delay >= deadline:
+                raise
+            logger.log_info(f"Retry {attempt}/{max_retries} for {model_name} in {delay:.1f}s "
+                            f"after HTTP {e.status_code}")
+            with released_slot(token):
+                token.wait(delay)
+            continue
+        # Ответ, оборванный отменой, неполон - его нельзя возвращать и кэшировать
+        if token.cancelled:
+            raise _cancelled_error(adapter, model_name, token, text)
+        return text
+
+
+class _Flight:
+    """Выполняющийся запрос, результат которого ожидают совпадающие запросы"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+# Выполняющиеся запросы по ключу (single-flight)
+_flights: Dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+
+# Интервал проверки отмены при ожидании чужого запроса, сек
+FLIGHT_CANCEL_POLL = 0.05
+
+
+def _flight_key(adapter: ProviderAdapter, url: str, model_name: str, messages: List[Dict], api_key: str) -> str:
+    """Ключ совпадающих запросов: параметры запроса и отпечаток API ключа"""
+    key_id = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+    return f"{response_cache.make_cache_key(model_name, url, messages, adapter.temperature)}:{key_id}"
+
+
+def _send_guarded(adapter: ProviderAdapter, url: str, model_name: str, messages: List[Dict],
+                  api_key: str, on_chunk: Optional[Callable[[str], None]],
+                  stats: Optional[Dict], cancel_token: Optional[CancelToken] = None) -> str:
+    """Отправить запрос с учетом состояния circuit breaker модели"""
+    breaker = get_breaker(adapter.name, model_name)
+    if not breaker.allow():
+        raise CircuitOpenError(f"{adapter.label} error: model '{model_name}' is temporarily disabled after "
+                               f"{breaker.failures} consecutive failures, retry in {breaker.retry_in():.0f}s")
+    
+    try:
+        text = _send_with_retries(adapter, url, model_name, messages, api_key, on_chunk, stats, cancel_token)
+    except RateLimitWaitError:
+        # Ожидание клиентского лимита - не ошибка модели
+        breaker.release()
+        raise
+    except RequestCancelled:
+        # Отмена пользователем, рассылкой или по сроку рассылки - не ошибка модели,
+        # а истекший срок самого запроса (REQUEST_DEADLINE) - зависшая или медленная модель
+        if cancel_token is not None and cancel_token.cancelled:
+            breaker.release()
+        else:
+            breaker.record_failure()
+        raise
+    except APIError:
+        breaker.record_failure()
+        raise
+    except BaseException:
+        breaker.release()
+        raise
+    breaker.record_success()
+    return text
+
+
+def send_chat_request(adapter: ProviderAdapter, url: str, model_name: str, messages: List[Dict],
+                      api_key: str, on_chunk: Optional[Callable[[str], None]] = None,
+                      stats: Optional[Dict] = None, cancel_token: Optional[CancelToken] = None) -> str:
     """
-    Отправить запрос к DeepSeek API
+    Отправить запрос chat/completions через адаптер провайдера
+    
+    Одновременные запросы с одинаковыми параметрами и API ключом объединяются:
+    к API уходит один запрос, остальные вызовы ждут и получают его результат
+    (или ту же ошибку); при потоковой выдаче они получают ответ одним фрагментом.
+    Модель, которая несколько раз подряд вернула ошибку, временно отключается
+    (circuit breaker): запросы к ней сразу завершаются CircuitOpenError.
+    Перед каждой попыткой запрос ожидает клиентский лимит частоты провайдера.
+    Ответы 429 и 5xx повторяются с учетом Retry-After и экспоненциального отката,
+    пока не исчерпаны MAX_RETRIES повторов или общий лимит REQUEST_DEADLINE.
+    При отмене через cancel_token сокет запроса закрывается, пауза перед повтором
+    прерывается, и вызов завершается RequestCancelled. Соединение ограничено
+    CONNECT_TIMEOUT, ожидание первого байта - FIRST_BYTE_TIMEOUT, весь запрос -
+    REQUEST_DEADLINE; по истечении срока запроса или срока cancel_token вызов
+    завершается DeadlineExceeded с уже полученной частью ответа.
     
     Args:
+        adapter: Адаптер провайдера (заголовки, тело запроса, разбор ответа)
+        url: URL эндпоинта
         model_name: Название модели
-        prompt: Текст промта
+        messages: Список сообщений чата
         api_key: API ключ
+        on_chunk: Функция для потоковой выдачи фрагментов ответа (если None - ответ целиком)
+        stats: Словарь для статистики запроса: время до первого токена ('ttft'),
+               количество попыток ('attempts'), признак объединения с другим запросом ('coalesced')
+        cancel_token: Признак отмены запроса
     
     Returns:
         Текст ответа модели
+    
+    Raises:
+        DeadlineExceeded: Если истек срок запроса
+        RequestCancelled: Если запрос отменен
+        APIError: При ошибке запроса
     """
-    url = "https://api.deepseek.com/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": model_name,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.7
-    }
+    key = _flight_key(adapter, url, model_name, messages, api_key)
+    while True:
+        with _flights_lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _flights[key] = _Flight()
+        if leader:
+            break
+        
+        if cancel_token is None:
+            flight.done.wait()
+        else:
+            while not flight.done.wait(FLIGHT_CANCEL_POLL):
+                if cancel_token.cancelled:
+                    raise _cancelled_error(adapter, model_name, cancel_token)
+        # Запрос отменил другой вызывающий - отправить свой
+        if isinstance(flight.error, RequestCancelled) and not isinstance(flight.error, DeadlineExceeded):
+            continue
+        if stats is not None:
+            stats['coalesced'] = True
+        if flight.error is not None:
+            raise flight.error
+        if on_chunk is not None:
+            on_chunk(flight.result)
+        return flight.result
     
     try:
-        response = requests.post(
-            url,
-            headers=headers,
-            json=data,
-            timeout=get_request_timeout()
-        )
-        response.raise_for_status()
-        result = response.json()
-        return result['choices'][0]['message']['content']
-    except requests.exceptions.RequestException as e:
-        raise APIError(f"DeepSeek API error: {str(e)}")
-    except (KeyError, IndexError) as e:
-        raise APIError(f"Invalid DeepSeek API response: {str(e)}")
+        flight.result = _send_guarded(adapter, url, model_name, messages, api_key, on_chunk, stats, cancel_token)
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def _send_to_provider(provider: str, model_name: str, prompt: str, api_key: str,
+                      on_chunk: Optional[Callable[[str], None]], stats: Optional[Dict]) -> str:
+    adapter = get_provider(provider)
+    messages = [{"role": "user", "content": prompt}]
+    return send_chat_request(adapter, adapter.get_url({}), model_name, messages, api_key, on_chunk, stats)
+
+
+def send_openai_request(model_name: str, prompt: str, api_key: str,
+                        on_chunk: Optional[Callable[[str], None]] = None,
+                        stats: Optional[Dict] = None) -> str:
+    """
+    Отправить запрос к OpenAI API
+    
+    Args:
+        model_name: Название модели (например, 'gpt-4')
+        prompt: Текст промта
+        api_key: API ключ
+        on_chunk: Функция для потоковой выдачи фрагментов ответа (если None - ответ целиком)
+        stats: Словарь, в который записывается время до первого токена ('ttft')
+    
+    Returns:
+        Текст ответа модели
+    """
+    return _send_to_provider('openai', model_name, prompt, api_key, on_chunk, stats)
+
+
+def send_deepseek_request(model_name: str, prompt: str, api_key: str,
+                          on_chunk: Optional[Callable[[str], None]] = None,
+                          stats: Optional[Dict] = None) -> str:
+    """
+    Отправить запрос к DeepSeek API
+    
+    Args:
+        model_name: Название модели
+        prompt: Текст промта
+        api_key: API ключ
+        on_chunk: Функция для потоковой выдачи фрагментов ответа (если None - ответ целиком)
+        stats: Словарь, в который записывается время до первого токена ('ttft')
+    
+    Returns:
+        Текст ответа модели
+    """
+    return _send_to_provider('deepseek', model_name, prompt, api_key, on_chunk, stats)
 
 
-def send_openrouter_request(model_name: str, prompt: str, api_key: str) -> str:
+def send_openrouter_request(model_name: str, prompt: str, api_key: str,
+                            on_chunk: Optional[Callable[[str], None]] = None,
+                            stats: Optional[Dict] = None) -> str:
     """
     Отправить запрос к OpenRouter API
     
@@ -98,6 +688,8 @@ def send_openrouter_request(model_name: str, prompt: str, api_key: str) -> str:
         model_name: Название модели (например, 'openai/gpt-4')
         prompt: Текст промта
         api_key: API ключ
+        on_chunk: Функция для потоковой выдачи фрагментов ответа (если None - ответ целиком)
+        stats: Словарь, в который записывается время до первого токена ('ttft')
     
     Returns:
         Текст ответа модели
@@ -106,70 +698,12 @@ def send_openrouter_request(model_name: str, prompt: str, api_key: str) -> str:
     if not api_key or api_key.strip() == "":
         raise APIError("OpenRouter API error: API key is empty or not provided")
     
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key.strip()}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "https://github.com/chatlist-app",  # Опционально
-        "X-Title": "ChatList"  # Опционально
-    }
-    data = {
-        "model": model_name,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.7
-    }
-    
-    try:
-        response = requests.post(
-            url,
-            headers=headers,
-            json=data,
-            timeout=get_request_timeout()
-        )
-        
-        # Улучшенная обработка ошибок
-        if response.status_code == 401:
-            error_data = response.json() if response.headers.get('content-type', '').startswith('application/json') else {}
-            error_msg = error_data.get('error', {}).get('message', 'Unauthorized')
-            if 'cookie' in error_msg.lower() or 'credential' in error_msg.lower():
-                raise APIError(f"OpenRouter API error: Invalid or missing API key. Please check your OPENROUTER_API_KEY in .env file. Error: {error_msg}")
-            raise APIError(f"OpenRouter API error: Unauthorized (401). {error_msg}")
-        
-        if response.status_code == 404:
-            error_data = response.json() if response.headers.get('content-type', '').startswith('application/json') else {}
-            error_msg = error_data.get('error', {}).get('message', 'Model not found')
-            raise APIError(f"OpenRouter API error: Model '{model_name}' not found (404). {error_msg}")
-        
-        response.raise_for_status()
-        result = response.json()
-        
-        # Проверка наличия ответа
-        if 'choices' not in result or len(result['choices']) == 0:
-            raise APIError(f"OpenRouter API error: No response from model '{model_name}'")
-        
-        return result['choices'][0]['message']['content']
-    except APIError:
-        raise
-    except requests.exceptions.RequestException as e:
-        error_msg = str(e)
-        if hasattr(e, 'response') and e.response is not None:
-            try:
-                error_data = e.response.json()
-                if 'error' in error_data:
-                    error_msg = error_data['error'].get('message', error_msg)
-                    # Специальная обработка ошибки с cookie/auth
-                    if 'cookie' in error_msg.lower() or 'credential' in error_msg.lower() or 'auth' in error_msg.lower():
-                        raise APIError(f"OpenRouter API authentication error: {error_msg}. Please verify your OPENROUTER_API_KEY in .env file is correct and starts with 'sk-or-v1-'.")
-            except APIError:
-                raise
-            except:
-                pass
-        raise APIError(f"OpenRouter API error: {error_msg}")
-    except (KeyError, IndexError) as e:
-        raise APIError(f"Invalid OpenRouter API response: {str(e)}")
+    return _send_to_provider('openrouter', model_name, prompt, api_key.strip(), on_chunk, stats)
 
 
-def send_groq_request(model_name: str, prompt: str, api_key: str) -> str:
+def send_groq_request(model_name: str, prompt: str, api_key: str,
+                      on_chunk: Optional[Callable[[str], None]] = None,
+                      stats: Optional[Dict] = None) -> str:
     """
     Отправить запрос к Groq API
     
@@ -177,106 +711,119 @@ def send_groq_request(model_name: str, prompt: str, api_key: str) -> str:
         model_name: Название модели
         prompt: Текст промта
         api_key: API ключ
+        on_chunk: Функция для потоковой выдачи фрагментов ответа (если None - ответ целиком)
+        stats: Словарь, в который записывается время до первого токена ('ttft')
     
     Returns:
         Текст ответа модели
     """
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": model_name,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.7
-    }
-    
-    try:
-        response = requests.post(
-            url,
-            headers=headers,
-            json=data,
-            timeout=get_request_timeout()
-        )
-        response.raise_for_status()
-        result = response.json()
-        return result['choices'][0]['message']['content']
-    except requests.exceptions.RequestException as e:
-        raise APIError(f"Groq API error: {str(e)}")
-    except (KeyError, IndexError) as e:
-        raise APIError(f"Invalid Groq API response: {str(e)}")
+    return _send_to_provider('groq', model_name, prompt, api_key, on_chunk, stats)
 
 
-def send_request(model: Dict, prompt: str) -> str:
+def send_request(model: Dict, prompt: str,
+                 on_chunk: Optional[Callable[[str], None]] = None,
+                 stats: Optional[Dict] = None,
+                 adapter: Optional[ProviderAdapter] = None,
+                 use_cache: bool = True,
+                 cancel_token: Optional[CancelToken] = None) -> str:
     """
     Универсальная функция для отправки запроса к API модели
     
     Args:
         model: Словарь с информацией о модели (name, api_url, api_id, model_type)
         prompt: Текст промта
+        on_chunk: Функция для потоковой выдачи фрагментов ответа (если None - ответ целиком)
+        stats: Словарь для статистики запроса: общее время ('latency'), время до первого
+               байта ('ttfb') и первого токена ('ttft'), подключения ('connect', 'tls'),
+               размеры запроса и ответа ('request_bytes', 'response_bytes'),
+               расход токенов ('usage'), 'attempts', 'cache_hit'
+        adapter: Заранее определенный адаптер провайдера (если None - определяется по модели)
+        use_cache: Использовать кэш ответов (False - всегда обращаться к API)
+        cancel_token: Признак отмены запроса
     
     Returns:
         Текст ответа модели
     
     Raises:
+        RequestCancelled: Если запрос отменен
         APIError: При ошибке запроса
     """
+    if stats is None:
+        stats = {}
+    if adapter is None:
+        adapter = resolve_adapter(model)
+    started = time.perf_counter()
+    status = 'error'
+    error_type = None
+    try:
+        text = _send_request(model, prompt, on_chunk, stats, adapter, use_cache, cancel_token)
+        status = 'ok'
+        return text
+    except DeadlineExceeded:
+        status = 'timeout'
+        raise
+    except RequestCancelled:
+        status = 'cancelled'
+        raise
+    except Exception as e:
+        error_type = type(e).__name__
+        raise
+    finally:
+        stats['latency'] = time.perf_counter() - started
+        record = _metrics_record(adapter, model, stats, status, error_type)
+        logger.log_request_metrics(record)
+        metrics.observe_request(record)
+
+
+def _metrics_record(adapter: ProviderAdapter, model: Dict, stats: Dict, status: str,
+                    error_type: Optional[str] = None) -> Dict:
+    """Сформировать структурированную запись о запросе для журнала и метрик"""
+    record = {
+        'provider': adapter.name,
+        'model': model.get('name', ''),
+        'status': status,
+        'error_type': error_type,
+        'cache_hit': bool(stats.get('cache_hit')),
+        'coalesced': bool(stats.get('coalesced')),
+        'attempts': stats.get('attempts'),
+    }
+    for field in ('latency', 'connect', 'tls', 'ttfb', 'ttft'):
+        value = stats.get(field)
+        record[field] = round(value, 4) if value is not None else None
+    for field in ('request_bytes', 'response_bytes', 'usage'):
+        record[field] = stats.get(field)
+    return record
+
+
+def _send_request(model: Dict, prompt: str, on_chunk: Optional[Callable[[str], None]],
+                  stats: Dict, adapter: ProviderAdapter, use_cache: bool,
+                  cancel_token: Optional[CancelToken]) -> str:
     api_key = get_api_key(model['api_id'])
     if not api_key or api_key.strip() == "":
         raise APIError(f"API key not found or empty for {model['api_id']}. Please check your .env file and ensure the key is set correctly.")
     
-    model_type = model.get('model_type', '').lower()
     model_name = model.get('name', '')
-    api_url = model.get('api_url', '').lower()
-    
-    # Определяем тип API и вызываем соответствующую функцию
-    # Порядок важен - более специфичные проверки первыми
-    
-    if 'openrouter' in model_type or 'openrouter' in api_url:
-        return send_openrouter_request(model_name, prompt, api_key)
-    elif 'openai' in model_type or 'openai' in api_url or 'azure-openai' in model_type:
-        return send_openai_request(model_name, prompt, api_key)
-    elif 'deepseek' in model_type or 'deepseek' in api_url:
-        return send_deepseek_request(model_name, prompt, api_key)
-    elif 'groq' in model_type or 'groq' in api_url:
-        return send_groq_request(model_name, prompt, api_key)
-    elif 'anthropic' in model_type or 'anthropic' in api_url:
-        # Anthropic Claude использует свой формат, но может быть через прокси
-        return send_generic_request(model, prompt, api_key)
-    elif 'google' in model_type or 'google' in api_url or 'gemini' in api_url:
-        # Google Gemini через OpenAI-совместимый API
-        return send_generic_request(model, prompt, api_key)
-    elif 'mistral' in model_type or 'mistral' in api_url:
-        # Mistral через OpenAI-совместимый API
-        return send_generic_request(model, prompt, api_key)
-    elif 'cohere' in model_type or 'cohere' in api_url:
-        # Cohere через OpenAI-совместимый API
-        return send_generic_request(model, prompt, api_key)
-    elif 'perplexity' in model_type or 'perplexity' in api_url:
-        # Perplexity через OpenAI-совместимый API
-        return send_generic_request(model, prompt, api_key)
-    elif 'together' in model_type or 'together' in api_url:
-        # Together AI через OpenAI-совместимый API
-        return send_generic_request(model, prompt, api_key)
-    elif 'replicate' in model_type or 'replicate' in api_url:
-        # Replicate через OpenAI-совместимый API
-        return send_generic_request(model, prompt, api_key)
-    elif 'huggingface' in model_type or 'huggingface' in api_url or 'hf.co' in api_url:
-        # Hugging Face Inference API через OpenAI-совместимый формат
-        return send_generic_request(model, prompt, api_key)
-    elif 'ollama' in model_type or 'ollama' in api_url:
-        # Ollama локальные модели через OpenAI-совместимый API
-        return send_generic_request(model, prompt, api_key)
-    elif 'localai' in model_type or 'localai' in api_url or 'local' in model_type:
-        # LocalAI через OpenAI-совместимый API
-        return send_generic_request(model, prompt, api_key)
-    else:
-        # Попытка универсального запроса для совместимых API
-        return send_generic_request(model, prompt, api_key)
-
-
-def send_generic_request(model: Dict, prompt: str, api_key: str) -> str:
+    url = adapter.get_url(model)
+    messages = [{"role": "user", "content": prompt}]
+    
+    cache_key = response_cache.make_cache_key(model_name, url, messages, adapter.temperature)
+    if use_cache:
+        cached = response_cache.get_response(cache_key)
+        if cached is not None:
+            stats['cache_hit'] = True
+            stats['attempts'] = 0
+            if on_chunk is not None:
+                on_chunk(cached)
+            return cached
+    
+    text = send_chat_request(adapter, url, model_name, messages, api_key.strip(), on_chunk, stats, cancel_token)
+    response_cache.put_response(cache_key, model_name, text)
+    return text
+
+
+def send_generic_request(model: Dict, prompt: str, api_key: str,
+                         on_chunk: Optional[Callable[[str], None]] = None,
+                         stats: Optional[Dict] = None) -> str:
     """
     Универсальный запрос для API, совместимых с OpenAI форматом
     
@@ -284,33 +831,12 @@ def send_generic_request(model: Dict, prompt: str, api_key: str) -> str:
         model: Словарь с информацией о модели
         prompt: Текст промта
         api_key: API ключ
+        on_chunk: Функция для потоковой выдачи фрагментов ответа (если None - ответ целиком)
+        stats: Словарь, в который записывается время до первого токена ('ttft')
     
     Returns:
         Текст ответа модели
     """
-    url = model['api_url']
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": model.get('name', ''),
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.7
-    }
-    
-    try:
-        response = requests.post(
-            url,
-            headers=headers,
-            json=data,
-            timeout=get_request_timeout()
-        )
-        response.raise_for_status()
-        result = response.json()
-        return result['choices'][0]['message']['content']
-    except requests.exceptions.RequestException as e:
-        raise APIError(f"API request error: {str(e)}")
-    except (KeyError, IndexError) as e:
-        raise APIError(f"Invalid API response: {str(e)}")
-
+    adapter = resolve_adapter(model)
+    messages = [{"role": "user", "content": prompt}]
+    return send_chat_request(adapter, model['api_url'], model.get('name', ''), messages, api_key, on_chunk, stats)
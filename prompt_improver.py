@@ -3,10 +3,10 @@
 """
 import re
 import json
-import requests
 from typing import List, Dict, Optional
-from network import APIError
-from config import get_api_key, get_request_timeout
+from network import APIError, send_chat_request
+from providers import get_provider
+from config import get_api_key
 import logger
 
 
@@ -270,56 +270,12 @@ def send_improvement_request(model_name: str, system_prompt: str, user_message:
     Raises:
         APIError: При ошибках API
     """
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "https://github.com/chatlist-app",
-        "X-Title": "ChatList"
-    }
-    data = {
-        "model": model_name,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message}
-        ],
-        "temperature": 0.7
-    }
-    
-    try:
-        response = requests.post(
-            url,
-            headers=headers,
-            json=data,
-            timeout=get_request_timeout()
-        )
-        
-        if response.status_code == 404:
-            error_data = response.json() if response.headers.get('content-type', '').startswith('application/json') else {}
-            error_msg = error_data.get('error', {}).get('message', 'Model not found')
-            raise APIError(f"OpenRouter API error: Model '{model_name}' not found (404). {error_msg}")
-        
-        response.raise_for_status()
-        result = response.json()
-        
-        if 'choices' not in result or len(result['choices']) == 0:
-            raise APIError(f"OpenRouter API error: No response from model '{model_name}'")
-        
-        return result['choices'][0]['message']['content']
-    except APIError:
-        raise
-    except requests.exceptions.RequestException as e:
-        error_msg = str(e)
-        if hasattr(e, 'response') and e.response is not None:
-            try:
-                error_data = e.response.json()
-                if 'error' in error_data:
-                    error_msg = error_data['error'].get('message', error_msg)
-            except:
-                pass
-        raise APIError(f"OpenRouter API error: {error_msg}")
-    except (KeyError, IndexError) as e:
-        raise APIError(f"Invalid OpenRouter API response: {str(e)}")
+    adapter = get_provider('openrouter')
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_message}
+    ]
+    return send_chat_request(adapter, adapter.get_url({}), model_name, messages, api_key)
 
 
 def adapt_prompt_for_type(prompt_text: str, prompt_type: str, model_name: str, api_key: str) -> str:
@@ -0,0 +1,226 @@
+"""
+Модуль с описанием провайдеров API нейросетей (адаптеры)
+"""
+import functools
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from config import get_provider_url
+
+if TYPE_CHECKING:
+    # requests нужен только для аннотаций - сетевой стек загружается при первом запросе
+    import requests
+
+
+class ProviderAdapter:
+    """
+    Адаптер OpenAI-совместимого провайдера
+    
+    Описывает эндпоинт, заголовки авторизации, формирование тела запроса
+    и разбор ответа. Особенности конкретного API реализуются в подклассах.
+    """
+    
+    def __init__(self, name: str, label: str, endpoint: Optional[str] = None,
+                 type_markers: Tuple[str, ...] = (), url_markers: Tuple[str, ...] = (),
+                 extra_headers: Optional[Dict[str, str]] = None, temperature: float = 0.7,
+                 stream_usage: bool = False):
+        """
+        Args:
+            name: Имя провайдера (ключ реестра, пула соединений и лимитов)
+            label: Название API для сообщений об ошибках (например, 'OpenAI API')
+            endpoint: URL chat/completions; если None - используется api_url модели
+            type_markers: Подстроки model_type, по которым модель относится к провайдеру
+            url_markers: Подстроки api_url, по которым модель относится к провайдеру
+            extra_headers: Дополнительные заголовки запроса
+            temperature: Температура генерации
+            stream_usage: Запрашивать расход токенов в потоковом ответе (stream_options.include_usage)
+        """
+        self.name = name
+        self.label = label
+        self.endpoint = endpoint
+        self.type_markers = type_markers
+        self.url_markers = url_markers
+        self.extra_headers = extra_headers or {}
+        self.temperature = temperature
+        self.stream_usage = stream_usage
+    
+    def matches(self, model_type: str, api_url: str) -> bool:
+        """Проверить, относится ли модель с такими model_type и api_url к провайдеру"""
+        return (any(m in model_type for m in self.type_markers)
+                or any(m in api_url for m in self.url_markers))
+    
+    def get_url(self, model: Dict) -> str:
+        """Получить URL запроса для модели (стандартный эндпоинт заменяется <PROVIDER>_API_URL)"""
+        if self.endpoint:
+            return get_provider_url(self.name) or self.endpoint
+        return model.get('api_url', '')
+    
+    def build_headers(self, api_key: str) -> Dict[str, str]:
+        """Сформировать заголовки запроса с авторизацией"""
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        headers.update(self.extra_headers)
+        return headers
+    
+    def build_payload(self, model_name: str, messages: List[Dict], stream: bool = False) -> Dict:
+        """Сформировать тело запроса chat/completions"""
+        data = {
+            "model": model_name,
+            "messages": messages,
+            "temperature": self.temperature
+        }
+        if stream:
+            data["stream"] = True
+            if self.stream_usage:
+                data["stream_options"] = {"include_usage": True}
+        return data
+    
+    def parse_response(self, result: Dict) -> str:
+        """
+        Извлечь текст ответа из JSON
+        
+        Raises:
+            KeyError, IndexError: Если ответ не соответствует формату
+        """
+        return result['choices'][0]['message']['content']
+    
+    def error_for_status(self, response: 'requests.Response', model_name: str) -> Optional[str]:
+        """Вернуть сообщение об ошибке для особых HTTP-статусов (или None)"""
+        return None
+    
+    def describe_error(self, error: 'requests.exceptions.RequestException') -> str:
+        """Сформировать сообщение об ошибке запроса"""
+        return f"{self.label} error: {str(error)}"
+
+
+def _error_data(response: 'requests.Response') -> Dict:
+    """Получить JSON ошибки из ответа, если он есть"""
+    if not response.headers.get('content-type', '').startswith('application/json'):
+        return {}
+    try:
+        data = response.json()
+    except ValueError:
+        return {}
+    error = data.get('error') if isinstance(data, dict) else None
+    return error if isinstance(error, dict) else {}
+
+
+class OpenRouterAdapter(ProviderAdapter):
+    """Адаптер OpenRouter с расширенной диагностикой ошибок авторизации"""
+    
+    def error_for_status(self, response: 'requests.Response', model_name: str) -> Optional[str]:
+        if response.status_code == 401:
+            error_msg = _error_data(response).get('message', 'Unauthorized')
+            if 'cookie' in error_msg.lower() or 'credential' in error_msg.lower():
+                return f"OpenRouter API error: Invalid or missing API key. Please check your OPENROUTER_API_KEY in .env file. Error: {error_msg}"
+            return f"OpenRouter API error: Unauthorized (401). {error_msg}"
+        
+        if response.status_code == 404:
+            error_msg = _error_data(response).get('message', 'Model not found')
+            return f"OpenRouter API error: Model '{model_name}' not found (404). {error_msg}"
+        
+        return None
+    
+    def describe_error(self, error: 'requests.exceptions.RequestException') -> str:
+        error_msg = str(error)
+        if getattr(error, 'response', None) is not None:
+            message = _error_data(error.response).get('message')
+            if message:
+                error_msg = message
+                # Специальная обработка ошибки с cookie/auth
+                if 'cookie' in error_msg.lower() or 'credential' in error_msg.lower() or 'auth' in error_msg.lower():
+                    return f"OpenRouter API authentication error: {error_msg}. Please verify your OPENROUTER_API_KEY in .env file is correct and starts with 'sk-or-v1-'."
+        return f"OpenRouter API error: {error_msg}"
+
+
+# ========== Реестр провайдеров ==========
+
+# Порядок регистрации важен - более специфичные провайдеры первыми
+PROVIDERS: Dict[str, ProviderAdapter] = {}
+
+GENERIC_PROVIDER = ProviderAdapter('generic', 'API')
+
+
+def register_provider(adapter: ProviderAdapter):
+    """
+    Зарегистрировать провайдера
+    
+    Args:
+        adapter: Адаптер провайдера; провайдер с тем же именем заменяется
+    """
+    PROVIDERS[adapter.name] = adapter
+    _resolve_adapter.cache_clear()
+
+
+def get_provider(name: str) -> ProviderAdapter:
+    """Получить адаптер по имени провайдера ('generic' для неизвестных имен)"""
+    return PROVIDERS.get(name, GENERIC_PROVIDER)
+
+
+@functools.lru_cache(maxsize=256)
+def _resolve_adapter(model_type: str, api_url: str) -> ProviderAdapter:
+    for adapter in PROVIDERS.values():
+        if adapter.matches(model_type, api_url):
+            return adapter
+    # Попытка универсального запроса для совместимых API
+    return GENERIC_PROVIDER
+
+
+def resolve_adapter(model: Dict) -> ProviderAdapter:
+    """
+    Определить адаптер провайдера для модели
+    
+    Результат кэшируется по паре (model_type, api_url), поэтому повторное
+    определение для той же модели выполняется за O(1).
+    
+    Args:
+        model: Словарь с информацией о модели (model_type, api_url)
+    
+    Returns:
+        Адаптер провайдера
+    """
+    return _resolve_adapter((model.get('model_type') or '').lower(), (model.get('api_url') or '').lower())
+
+
+register_provider(OpenRouterAdapter(
+    'openrouter', 'OpenRouter API',
+    endpoint="https://openrouter.ai/api/v1/chat/completions",
+    type_markers=('openrouter',), url_markers=('openrouter',),
+    extra_headers={
+        "HTTP-Referer": "https://github.com/chatlist-app",  # Опционально
+        "X-Title": "ChatList"  # Опционально
+    },
+    stream_usage=True
+))
+register_provider(ProviderAdapter(
+    'openai', 'OpenAI API',
+    endpoint="https://api.openai.com/v1/chat/completions",
+    type_markers=('openai', 'azure-openai'), url_markers=('openai',),
+    stream_usage=True
+))
+register_provider(ProviderAdapter(
+    'deepseek', 'DeepSeek API',
+    endpoint="https://api.deepseek.com/v1/chat/completions",
+    type_markers=('deepseek',), url_markers=('deepseek',),
+    stream_usage=True
+))
+register_provider(ProviderAdapter(
+    'groq', 'Groq API',
+    endpoint="https://api.groq.com/openai/v1/chat/completions",
+    type_markers=('groq',), url_markers=('groq',),
+    stream_usage=True
+))
+
+# Провайдеры с OpenAI-совместимым API по адресу из api_url модели
+# (Anthropic - через совместимый прокси, Hugging Face Inference API, локальные Ollama и LocalAI)
+register_provider(ProviderAdapter('anthropic', 'Anthropic API', type_markers=('anthropic',), url_markers=('anthropic',)))
+register_provider(ProviderAdapter('google', 'Google API', type_markers=('google',), url_markers=('google', 'gemini')))
+register_provider(ProviderAdapter('mistral', 'Mistral API', type_markers=('mistral',), url_markers=('mistral',)))
+register_provider(ProviderAdapter('cohere', 'Cohere API', type_markers=('cohere',), url_markers=('cohere',)))
+register_provider(ProviderAdapter('perplexity', 'Perplexity API', type_markers=('perplexity',), url_markers=('perplexity',)))
+register_provider(ProviderAdapter('together', 'Together AI API', type_markers=('together',), url_markers=('together',)))
+register_provider(ProviderAdapter('replicate', 'Replicate API', type_markers=('replicate',), url_markers=('replicate',)))
+register_provider(ProviderAdapter('huggingface', 'Hugging Face API', type_markers=('huggingface',), url_markers=('huggingface', 'hf.co')))
+register_provider(ProviderAdapter('ollama', 'Ollama API', type_markers=('ollama',), url_markers=('ollama',)))
+register_provider(ProviderAdapter('localai', 'LocalAI API', type_markers=('localai', 'local'), url_markers=('localai',)))
@@ -0,0 +1,154 @@
+"""
+Модуль для клиентского ограничения частоты запросов к API (token bucket)
+"""
+import hashlib
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from config import get_rate_limit_rpm, get_rate_limit_tpm
+
+if TYPE_CHECKING:
+    from cancellation import CancelToken
+
+
+class TokenBucket:
+    """Потокобезопасное ведро токенов, пополняемое с постоянной скоростью"""
+    
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate_per_minute: Скорость пополнения, токенов в минуту
+            capacity: Емкость ведра (допустимый всплеск); по умолчанию равна минутному лимиту
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._condition = threading.Condition()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def acquire(self, amount: float = 1, timeout: Optional[float] = None,
+                cancel_token: Optional['CancelToken'] = None) -> bool:
+        """
+        Забрать токены, дождавшись пополнения ведра
+        
+        Args:
+            amount: Количество токенов (больше емкости - ограничивается емкостью)
+            timeout: Максимальное время ожидания, сек (None - ждать без ограничения)
+            cancel_token: Признак отмены; отмена сразу прерывает ожидание
+        
+        Returns:
+            True, если токены получены; False, если истек timeout или запрос отменен
+            (токены в этих случаях не расходуются)
+        """
+        amount = min(amount, self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if cancel_token is not None:
+            cancel_token.add_callback(self._wake)
+        try:
+            with self._condition:
+                while True:
+                    if cancel_token is not None and cancel_token.cancelled:
+                        return False
+                    self._refill()
+                    if self.tokens >= amount:
+                        self.tokens -= amount
+                        return True
+                    wait = (amount - self.tokens) / self.rate
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or wait > remaining:
+                            return False
+                    self._condition.wait(wait)
+        finally:
+            if cancel_token is not None:
+                cancel_token.remove_callback(self._wake)
+    
+    def _wake(self):
+        # Ожидающие потоки проверяют свой признак отмены
+        with self._condition:
+            self._condition.notify_all()
+    
+    def release(self, amount: float = 1):
+        """Вернуть токены, полученные через acquire, но не израсходованные"""
+        with self._condition:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+            self._condition.notify_all()
+
+
+class RateLimiter:
+    """
+    Реестр ведер токенов по провайдеру и API-ключу
+    
+    Один экземпляр на процесс: потоки RequestThread и PromptImprovementThread
+    расходуют общий лимит, если обращаются к провайдеру с одним ключом.
+    """
+    
+    def __init__(self):
+        self._buckets: Dict[Tuple[str, str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+    
+    def _bucket(self, kind: str, provider: str, key_id: str, rate: float) -> TokenBucket:
+        key = (kind, provider, key_id)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = TokenBucket(rate)
+                    self._buckets[key] = bucket
+        return bucket
+    
+    def acquire(self, provider: str, api_key: str, tokens: int = 0, timeout: Optional[float] = None,
+                cancel_token: Optional['CancelToken'] = None) -> bool:
+        """
+        Дождаться разрешения на запрос в рамках лимитов RPM и TPM
+        
+        Args:
+            provider: Имя провайдера
+            api_key: API-ключ, с которым отправляется запрос
+            tokens: Оценка количества токенов промта
+            timeout: Максимальное время ожидания, сек
+            cancel_token: Признак отмены запроса; отмена прерывает ожидание
+        
+        Returns:
+            True, если запрос можно отправлять; False, если лимит не освободился за timeout
+            или запрос отменен
+        """
+        rpm = get_rate_limit_rpm(provider)
+        tpm = get_rate_limit_tpm(provider)
+        if rpm <= 0 and tpm <= 0:
+            return True
+        
+        # Ключ хранится только в виде отпечатка
+        key_id = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        rpm_bucket = self._bucket('rpm', provider, key_id, rpm) if rpm > 0 else None
+        if rpm_bucket is not None and not rpm_bucket.acquire(1, timeout, cancel_token):
+            return False
+        if tpm > 0 and tokens > 0:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self._bucket('tpm', provider, key_id, tpm).acquire(tokens, remaining, cancel_token):
+                # Запрос не отправляется - его место в лимите RPM возвращается
+                if rpm_bucket is not None:
+                    rpm_bucket.release(1)
+                return False
+        return True
+
+
+def estimate_tokens(messages: List[Dict]) -> int:
+    """Грубая оценка количества токенов в сообщениях (около 4 символов на токен)"""
+    return sum(len(message.get('content') or '') for message in messages) // 4 + 1
+
+
+_limiter = RateLimiter()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Получить общий ограничитель частоты запросов"""
+    return _limiter
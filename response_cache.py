@@ -0,0 +1,55 @@
+"""
+Модуль для кэширования ответов моделей в базе данных
+"""
+import hashlib
+import json
+from typing import Dict, List, Optional
+import db
+import metrics
+from config import is_response_cache_enabled, get_response_cache_ttl, get_response_cache_max_entries
+import logger
+
+
+def make_cache_key(model_name: str, url: str, messages: List[Dict], temperature: float) -> str:
+    """
+    Сформировать ключ кэша для запроса
+    
+    Args:
+        model_name: Название модели
+        url: URL эндпоинта
+        messages: Список сообщений чата
+        temperature: Температура генерации
+    
+    Returns:
+        SHA-256 от канонического JSON параметров запроса
+    """
+    payload = json.dumps(
+        {'model': model_name, 'url': url, 'messages': messages, 'temperature': temperature},
+        ensure_ascii=False, sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_response(key: str) -> Optional[str]:
+    """Получить ответ из кэша (None - промах или кэш выключен)"""
+    if not is_response_cache_enabled():
+        return None
+    try:
+        cached = db.get_cached_response(key, get_response_cache_ttl())
+    except Exception as e:
+        # Ошибка кэша не должна мешать запросу к API
+        logger.log_error("Response cache read failed", e)
+        metrics.CACHE_LOOKUPS.inc(result='error')
+        return None
+    metrics.CACHE_LOOKUPS.inc(result='hit' if cached is not None else 'miss')
+    return cached
+
+
+def put_response(key: str, model_name: str, response: str):
+    """Сохранить ответ в кэш (если кэш включен)"""
+    if not is_response_cache_enabled():
+        return
+    try:
+        db.put_cached_response(key, model_name, response, get_response_cache_max_entries())
+    except Exception as e:
+        logger.log_error("Response cache write failed", e)
@@ -0,0 +1,89 @@
+"""
+Модуль для профилирования запуска приложения (флаг --profile-startup)
+
+Замеряет время импорта каждого модуля в главном потоке (как python -X importtime,
+но работает и в собранном PyInstaller исполняемом файле) и время этапов запуска
+до появления окна.
+"""
+import builtins
+import sys
+import threading
+import time
+from typing import List, Optional, Tuple
+
+FLAG = '--profile-startup'
+
+# Модули с меньшим суммарным временем импорта не выводятся, мс
+MIN_IMPORT_MS = 1.0
+
+_original_import = builtins.__import__
+_started: Optional[float] = None
+_main_thread = threading.main_thread()
+_stack: List[List[float]] = []  # Суммарное время вложенных импортов для каждого уровня
+_imports: List[Tuple[int, str, float, float]] = []  # (глубина, модуль, собственное, суммарное), сек
+_marks: List[Tuple[str, float]] = []
+
+
+def enabled() -> bool:
+    """Включено ли профилирование"""
+    return _started is not None
+
+
+def enable():
+    """Начать профилирование: замерять импорты модулей и этапы запуска"""
+    global _started
+    if _started is not None:
+        return
+    _started = time.perf_counter()
+    builtins.__import__ = _timed_import
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if threading.current_thread() is not _main_thread:
+        return _original_import(name, globals, locals, fromlist, level)
+    loaded = len(sys.modules)
+    _stack.append([0.0])
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - start
+        children = _stack.pop()[0]
+        if _stack:
+            _stack[-1][0] += elapsed
+        # Повторный импорт уже загруженного модуля не учитывается
+        if len(sys.modules) != loaded:
+            _imports.append((len(_stack), '.' * level + name, elapsed - children, elapsed))
+
+
+def mark(label: str):
+    """Отметить завершение этапа запуска"""
+    if _started is not None:
+        _marks.append((label, time.perf_counter()))
+
+
+def report(stream=None):
+    """
+    Вывести результаты и прекратить профилирование
+    
+    Args:
+        stream: Куда выводить (по умолчанию sys.stderr)
+    """
+    global _started
+    if _started is None:
+        return
+    builtins.__import__ = _original_import
+    stream = stream or sys.stderr
+    
+    print("Import time, ms (self | cumulative | module):", file=stream)
+    for depth, name, own, total in _imports:
+        if total * 1000 >= MIN_IMPORT_MS:
+            print(f"{own * 1000:8.1f} | {total * 1000:8.1f} | {'  ' * depth}{name}", file=stream)
+    
+    print("Startup stages, ms:", file=stream)
+    previous = _started
+    for label, moment in _marks:
+        print(f"{(moment - previous) * 1000:8.1f}  {label}", file=stream)
+        previous = moment
+    print(f"{(previous - _started) * 1000:8.1f}  total", file=stream)
+    _started = None
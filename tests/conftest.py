@@ -0,0 +1,77 @@
+"""
+Общие фикстуры тестов: временная база данных, mock-сервер API и изоляция настроек
+"""
+import itertools
+
+import pytest
+
+import db
+import logger
+from benchmarks.mock_server import MockChatServer
+
+_unique = itertools.count()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def log_dir(tmp_path_factory):
+    """Журнал тестов пишется во временный каталог, а не в logs/ проекта"""
+    path = tmp_path_factory.mktemp("logs")
+    logger.LOG_DIR = str(path)
+    logger.LOG_FILE = str(path / "chatlist.log")
+    return path
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    """Настройки по умолчанию без ограничений, не зависящие от .env разработчика"""
+    for key, value in {
+        'MOCK_KEY': 'test-key',
+        'RESPONSE_CACHE_ENABLED': '0',
+        'RATE_LIMIT_RPM': '0',
+        'RATE_LIMIT_TPM': '0',
+        'MAX_RETRIES': '0',
+        'REQUEST_DEADLINE': '10',
+        'CIRCUIT_FAILURE_THRESHOLD': '3',
+    }.items():
+        monkeypatch.setenv(key, value)
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Чистая база данных во временном каталоге; фоновый поток записи останавливается после теста"""
+    monkeypatch.setattr(db, 'DB_NAME', str(tmp_path / "chatlist.db"))
+    monkeypatch.setattr(db, '_fts_available', None)
+    db.close_connections()
+    db.init_database()
+    yield db
+    db.shutdown_db_writer()
+    db.close_connections()
+
+
+@pytest.fixture
+def mock_server():
+    """Запустить mock-сервер chat/completions; параметры задаются через атрибуты сервера"""
+    server = MockChatServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_model(mock_server):
+    """
+    Фабрика словарей модели, отправляющей запросы на mock-сервер
+
+    Название модели уникально, поэтому состояние circuit breaker
+    и объединение запросов не переходят между тестами.
+    """
+    def make(**fields):
+        model = {
+            'id': next(_unique),
+            'name': f"mock-model-{next(_unique)}",
+            'api_url': mock_server.url,
+            'api_id': 'MOCK_KEY',
+            'model_type': 'other',
+        }
+        model.update(fields)
+        return model
+    return make
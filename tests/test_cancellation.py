@@ -0,0 +1,79 @@
+"""
+Тесты признака отмены запросов (cancellation.py)
+"""
+import socket
+import threading
+import time
+
+from cancellation import CancelToken
+from ratelimit import TokenBucket
+
+
+def test_cancel_runs_callbacks_once():
+    token = CancelToken()
+    calls = []
+    token.add_callback(lambda: calls.append(1))
+    token.cancel()
+    token.cancel()
+    assert token.cancelled and calls == [1]
+
+    # Функция, добавленная после отмены, вызывается сразу
+    token.add_callback(lambda: calls.append(2))
+    assert calls == [1, 2]
+
+
+def test_child_follows_parent_but_not_the_reverse():
+    parent = CancelToken()
+    child = CancelToken(parent)
+    other = CancelToken(parent)
+    other.cancel()
+    assert not parent.cancelled and not child.cancelled
+
+    parent.cancel()
+    assert child.cancelled
+
+
+def test_timeout_cancels_token():
+    token = CancelToken(timeout=0.05)
+    assert token.wait(2)
+    assert token.timed_out
+
+
+def test_release_stops_following_parent():
+    parent = CancelToken()
+    child = CancelToken(parent, timeout=0.05)
+    child.release()
+    parent.cancel()
+    time.sleep(0.1)
+    assert not child.cancelled
+
+
+def test_cancel_shuts_down_attached_socket():
+    server = socket.create_server(("127.0.0.1", 0))
+    client = socket.create_connection(server.getsockname())
+    token = CancelToken()
+    token.attach_socket(client)
+    received = []
+    reader = threading.Thread(target=lambda: received.append(client.recv(1)))
+    reader.start()
+
+    token.cancel()
+    reader.join(2)
+
+    assert not reader.is_alive() and received == [b""]
+    client.close()
+    server.close()
+
+
+def test_token_bucket_cancel_wakes_waiter_without_consuming():
+    bucket = TokenBucket(rate_per_minute=1)
+    bucket.acquire(1)
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    started = time.monotonic()
+
+    assert not bucket.acquire(1, timeout=30, cancel_token=token)
+
+    assert time.monotonic() - started < 1
+    bucket.release(1)
+    assert bucket.acquire(1, timeout=0)
@@ -0,0 +1,92 @@
+"""
+Тесты пакетного запуска без интерфейса (cli.py)
+"""
+import json
+
+import pytest
+
+import cli
+import models
+
+
+def write_lines(path, lines):
+    path.write_text("".join(lines), encoding='utf-8')
+
+
+def record(key, model_name, success=True):
+    return json.dumps({'prompt_key': key, 'model_name': model_name, 'success': success}) + "\n"
+
+
+def test_prompt_key_prefers_explicit_id():
+    assert cli.prompt_key({'id': 42, 'prompt': "x"}) == "42"
+    assert cli.prompt_key({'id': 0, 'prompt': "x"}) == "0"
+    by_text = cli.prompt_key({'id': '', 'prompt': "x"})
+    assert by_text == cli.prompt_key({'prompt': "x"}) != cli.prompt_key({'prompt': "y"})
+    assert len(by_text) == 16
+
+
+def test_read_prompts_file_jsonl_and_csv(tmp_path):
+    jsonl = tmp_path / "prompts.jsonl"
+    write_lines(jsonl, ['"plain"\n', '\n', '{"id": 7, "prompt": "with id", "tags": "a, b"}\n'])
+    assert list(cli.read_prompts_file(str(jsonl))) == [
+        {'id': None, 'prompt': "plain", 'tags': ''},
+        {'id': 7, 'prompt': "with id", 'tags': "a, b"},
+    ]
+
+    csv_file = tmp_path / "prompts.csv"
+    write_lines(csv_file, ["prompt,tags\n", "hello,x\n", ",\n"])
+    assert list(cli.read_prompts_file(str(csv_file))) == [{'id': None, 'prompt': "hello", 'tags': "x"}]
+
+
+def test_read_prompts_file_reports_bad_line(tmp_path):
+    jsonl = tmp_path / "prompts.jsonl"
+    write_lines(jsonl, ['"ok"\n', '{"text": "no prompt"}\n'])
+    with pytest.raises(ValueError, match=":2:"):
+        list(cli.read_prompts_file(str(jsonl)))
+
+
+def test_load_completed_skips_partial_line(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_lines(output, [record("p1", "m1"), record("p1", "m2", success=False), '{"prompt_key": "p2", "mod'])
+
+    assert cli.load_completed(str(output)) == {("p1", "m1"), ("p1", "m2")}
+    assert cli.load_completed(str(output), successful_only=True) == {("p1", "m1")}
+    assert cli.load_completed(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_result_writer_starts_new_line_after_interrupted_write(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_lines(output, [record("p1", "m1"), '{"prompt_key": "p2", "mod'])
+
+    writer = cli.ResultWriter(str(output))
+    writer.write([{'prompt_key': "p2", 'model_name': "m1", 'success': True}])
+    writer.close()
+
+    lines = output.read_text(encoding='utf-8').splitlines()
+    assert lines[1] == '{"prompt_key": "p2", "mod'
+    assert cli.load_completed(str(output)) == {("p1", "m1"), ("p2", "m1")}
+
+
+def test_batch_resume_reuses_prompt_and_skips_completed(tmp_path, temp_db, mock_server, make_model):
+    model_id = temp_db.create_model("mock", mock_server.url, 'MOCK_KEY')
+    model_list = [models.Model({**make_model(), 'id': model_id, 'name': "mock"})]
+    output = str(tmp_path / "results.jsonl")
+
+    def run(prompts):
+        writer = cli.ResultWriter(output)
+        runner = cli.BatchRunner(model_list, writer, cli.load_completed(output), parallel=2)
+        runner.run(iter(prompts))
+        writer.close()
+        return runner.stats
+
+    assert run([{'id': None, 'prompt': "hello", 'tags': "a"}])['success'] == 1
+    stats = run([{'id': None, 'prompt': "hello", 'tags': "b"}, {'id': None, 'prompt': "new", 'tags': ""}])
+
+    assert (stats['skipped'], stats['prompts']) == (1, 1)
+    assert mock_server.request_count == 2
+    prompts = {p['prompt']: p for p in temp_db.get_all_prompts()}
+    assert sorted(prompts) == ["hello", "new"]
+    # Результаты видны в истории промта
+    assert [r['response'] for r in temp_db.get_results_by_prompt(prompts["hello"]['id'])] == ["OK"]
+    records = [json.loads(line) for line in open(output, encoding='utf-8')]
+    assert {r['prompt_id'] for r in records} == {prompts["hello"]['id'], prompts["new"]['id']}
@@ -0,0 +1,230 @@
+"""
+Тесты базы данных (db.py) на временном файле базы
+"""
+import sqlite3
+import threading
+
+import pytest
+
+
+def test_connection_is_reused_per_thread_in_wal_mode(temp_db):
+    conn = temp_db.get_db_connection()
+    assert temp_db.get_db_connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(temp_db.get_db_connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+
+def test_close_connections_reopens_in_other_threads(temp_db):
+    ready = threading.Event()
+    go = threading.Event()
+    counts = []
+
+    def worker():
+        temp_db.get_db_connection().execute("SELECT 1")
+        ready.set()
+        go.wait(5)
+        counts.append(temp_db.get_db_connection().execute("SELECT COUNT(*) FROM prompts").fetchone()[0])
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    ready.wait(5)
+    temp_db.close_connections()
+    go.set()
+    thread.join(5)
+
+    assert counts == [0]
+    # Поток, закрывший соединения, тоже открывает новое
+    assert temp_db.get_db_connection().execute("SELECT 1").fetchone()[0] == 1
+
+
+def test_db_writer_isolates_failed_operation(temp_db):
+    writer = temp_db.DBWriter()
+    started = threading.Event()
+    release = threading.Event()
+
+    def block(cursor):
+        started.set()
+        release.wait(5)
+
+    def insert_then_fail(cursor):
+        temp_db._insert_prompt(cursor, "rolled back")
+        cursor.execute("INSERT INTO missing_table VALUES (1)")
+
+    try:
+        writer.submit(block)
+        started.wait(5)
+        # Пока поток записи занят, операции копятся и записываются одной пачкой
+        first = writer.submit(temp_db._insert_prompt, "first")
+        failed = writer.submit(insert_then_fail)
+        second = writer.submit(temp_db._insert_prompt, "second")
+        release.set()
+
+        assert first.result(5) and second.result(5)
+        with pytest.raises(sqlite3.OperationalError):
+            failed.result(5)
+    finally:
+        release.set()
+        writer.shutdown()
+
+    assert sorted(p['prompt'] for p in temp_db.get_all_prompts()) == ["first", "second"]
+
+
+def test_save_results_async_creates_prompt_with_results(temp_db):
+    model_ids = [temp_db.create_model(f"model {i}", "url", "KEY") for i in range(2)]
+    results = [{'model_id': model_ids[0], 'response': "a", 'selected': 1},
+               {'model_id': model_ids[1], 'response': "b"}]
+
+    prompt_id, result_ids = temp_db.save_results_async(results, prompt="new prompt", tags="t").result(5)
+
+    assert temp_db.get_prompt_by_id(prompt_id)['tags'] == "t"
+    assert len(result_ids) == 2
+    # В истории промта показываются только выбранные результаты
+    assert [(r['id'], r['response']) for r in temp_db.get_results_by_prompt(prompt_id)] == [(result_ids[0], "a")]
+
+
+def test_settings_are_saved_in_one_operation(temp_db):
+    temp_db.set_settings_async({'theme': 'dark', 'font_size': '12'}).result(5)
+    assert temp_db.get_setting('theme') == 'dark'
+    assert temp_db.get_setting('font_size') == '12'
+    assert temp_db.get_setting('missing', 'default') == 'default'
+
+
+def test_delete_prompt_async(temp_db):
+    prompt_id = temp_db.create_prompt("x")
+
+    assert temp_db.delete_prompt_async(prompt_id).result(5)
+    assert temp_db.get_prompt_by_id(prompt_id) is None
+    assert not temp_db.delete_prompt_async(prompt_id).result(5)
+
+
+def test_fts_index_is_backfilled_for_existing_database(temp_db):
+    conn = temp_db.get_db_connection()
+    # База, созданная до появления полнотекстового поиска
+    for fts_table, (table, _) in temp_db.FTS_TABLES.items():
+        conn.execute(f"DROP TABLE {fts_table}")
+        for action in ('insert', 'delete', 'update'):
+            conn.execute(f"DROP TRIGGER {table}_fts_{action}")
+    conn.execute("INSERT INTO prompts (date, prompt, tags) VALUES ('2026-01-01 00:00:00', 'квантовая механика', 'physics')")
+    conn.commit()
+    temp_db._fts_available = None
+
+    temp_db.init_database()
+
+    found = temp_db.search_prompts("квант")
+    assert [p['prompt'] for p in found] == ['квантовая механика']
+    assert '[' in found[0]['snippet']
+
+
+def test_search_finds_prompts_by_prefix_and_tags(temp_db):
+    temp_db.create_prompt("Напиши сортировку слиянием", "python")
+    temp_db.create_prompt("Рецепт борща", "кухня")
+
+    assert [p['prompt'] for p in temp_db.search_prompts("сортир")] == ["Напиши сортировку слиянием"]
+    assert [p['prompt'] for p in temp_db.search_prompts("кухня")] == ["Рецепт борща"]
+    assert temp_db.search_prompts("") == []
+
+
+def test_search_index_follows_deleted_prompts(temp_db):
+    prompt_id = temp_db.create_prompt("удаляемый промт")
+    temp_db.delete_prompt(prompt_id)
+    assert temp_db.search_prompts("удаляемый") == []
+
+
+def test_search_query_with_special_characters(temp_db):
+    temp_db.create_prompt('Что такое "C++" и AND/OR?')
+    assert len(temp_db.search_prompts('"C++" AND')) == 1
+
+
+def test_keyset_pagination_returns_every_prompt_once(temp_db):
+    ids = [temp_db.create_prompt(f"prompt {i}") for i in range(7)]
+    seen = []
+    after = None
+    while True:
+        page = temp_db.get_prompts_page(3, after)
+        seen.extend(p['id'] for p in page)
+        if len(page) < 3:
+            break
+        after = (page[-1]['date'], page[-1]['id'])
+
+    # Новые первыми; одинаковые даты упорядочены по id
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_change_events_follow_commits(temp_db):
+    events = []
+    temp_db.add_change_listener(events.append)
+    try:
+        prompt_id = temp_db.create_prompt("x")
+        temp_db.delete_prompt_async(prompt_id).result(5)
+    finally:
+        temp_db.remove_change_listener(events.append)
+
+    assert [(e['table'], e['action'], e['ids']) for e in events] == [
+        ('prompts', 'insert', [prompt_id]),
+        ('prompts', 'delete', [prompt_id]),
+    ]
+    assert events[0]['seq'] < events[1]['seq'] == temp_db.get_change_counter()
+
+
+def test_failed_listener_does_not_fail_committed_write(temp_db):
+    def broken(event):
+        raise RuntimeError("listener bug")
+
+    temp_db.add_change_listener(broken)
+    try:
+        prompt_id = temp_db.create_prompt_async("kept").result(5)
+    finally:
+        temp_db.remove_change_listener(broken)
+
+    assert temp_db.get_prompt_by_id(prompt_id)['prompt'] == "kept"
+
+
+def test_rolled_back_operation_sends_no_events(temp_db):
+    events = []
+
+    def insert_then_fail(cursor):
+        temp_db._insert_prompt(cursor, "rolled back")
+        raise ValueError("bad input")
+
+    temp_db.add_change_listener(events.append)
+    try:
+        with pytest.raises(ValueError):
+            temp_db.get_db_writer().submit(insert_then_fail).result(5)
+    finally:
+        temp_db.remove_change_listener(events.append)
+    assert events == []
+
+
+def test_get_or_create_prompt_reuses_same_text_and_merges_tags(temp_db):
+    first = temp_db.get_or_create_prompt_async("same", "a, b").result(5)
+    assert temp_db.get_or_create_prompt_async("same", "b,c").result(5) == first
+    assert temp_db.get_or_create_prompt_async("same").result(5) == first
+    assert temp_db.get_or_create_prompt_async("other").result(5) != first
+
+    assert temp_db.get_prompt_by_id(first)['tags'] == "a, b, c"
+
+
+def test_prompt_lookup_uses_hash_index(temp_db):
+    plan = temp_db.get_db_connection().execute(
+        "EXPLAIN QUERY PLAN SELECT id, tags FROM prompts WHERE prompt_hash = ? AND prompt = ? "
+        "ORDER BY id DESC LIMIT 1", (0, "x")).fetchall()
+    assert 'idx_prompts_prompt_hash' in plan[0]['detail']
+
+
+def test_prompt_hash_is_backfilled_for_existing_database(temp_db):
+    conn = temp_db.get_db_connection()
+    conn.execute("DROP INDEX idx_prompts_prompt_hash")
+    conn.execute("ALTER TABLE prompts DROP COLUMN prompt_hash")
+    conn.execute("INSERT INTO prompts (date, prompt, tags) VALUES ('2026-01-01 00:00:00', 'old prompt', 'x')")
+    conn.commit()
+    old_id = conn.execute("SELECT id FROM prompts").fetchone()[0]
+
+    temp_db.init_database()
+
+    assert temp_db.get_or_create_prompt_async("old prompt", "y").result(5) == old_id
+    assert temp_db.get_prompt_by_id(old_id)['tags'] == "x, y"
@@ -0,0 +1,60 @@
+"""
+Тесты диспетчера запросов (dispatcher.py)
+"""
+import functools
+import time
+
+import pytest
+
+import network
+from cancellation import CancelToken
+from dispatcher import Dispatcher, released_slot
+
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = Dispatcher(max_concurrency=2)
+    yield dispatcher
+    dispatcher.shutdown()
+
+
+def test_calls_are_limited_by_global_slots(dispatcher):
+    def work():
+        time.sleep(0.1)
+        return dispatcher.running
+
+    futures = [dispatcher.submit(f"provider-{i}", work) for i in range(6)]
+    assert max(future.result(5) for future in futures) <= 2
+
+
+def test_released_slot_outside_dispatcher_does_nothing():
+    with released_slot():
+        pass
+
+
+def test_rate_limited_provider_does_not_hold_global_slots(monkeypatch, dispatcher, mock_server, make_model):
+    monkeypatch.setenv('MAX_CONCURRENT_REQUESTS', '2')
+    monkeypatch.setenv('RATE_LIMIT_RPM_MISTRAL', '1')
+    monkeypatch.setenv('REQUEST_DEADLINE', '120')
+    monkeypatch.setenv('THROTTLED_KEY', 'dispatcher-throttled')
+    throttled = make_model(model_type='mistral', api_id='THROTTLED_KEY')
+    token = CancelToken()
+    send = functools.partial(network.send_request, cancel_token=token)
+    futures = [dispatcher.submit('mistral', send, throttled, f"prompt {i}") for i in range(3)]
+    try:
+        # Первый запрос проходит, остальные ждут лимита без глобального слота
+        futures[0].result(5)
+        deadline = time.monotonic() + 5
+        while dispatcher.paused < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert dispatcher.paused == 2
+
+        started = time.monotonic()
+        assert dispatcher.submit('generic', network.send_request, make_model(), "free").result(5) == "OK"
+        assert time.monotonic() - started < 1
+    finally:
+        token.cancel()
+    for future in futures[1:]:
+        with pytest.raises(network.RequestCancelled):
+            future.result(5)
+    assert (dispatcher.running, dispatcher.paused, dispatcher.waiting) == (0, 0, 0)
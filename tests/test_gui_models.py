@@ -0,0 +1,146 @@
+"""
+Тесты моделей Qt главного окна (main.py) без вывода на экран
+"""
+import os
+
+import pytest
+from PyQt5.QtCore import QModelIndex, QPersistentModelIndex, Qt
+from PyQt5.QtWidgets import QApplication
+
+import main
+
+
+@pytest.fixture(scope="module")
+def qapp():
+    """QApplication без окон на экране"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def history(qapp, temp_db, monkeypatch):
+    monkeypatch.setattr(main.PromptHistoryModel, 'PAGE_SIZE', 3)
+    return main.PromptHistoryModel()
+
+
+def prompt_ids(model):
+    return [model.data(model.index(row), Qt.UserRole) for row in range(model.rowCount())]
+
+
+def test_history_loads_pages_on_demand(history, temp_db):
+    ids = [temp_db.create_prompt(f"prompt {i}") for i in range(7)]
+    history.refresh()
+    assert prompt_ids(history) == ids[::-1][:3]
+
+    while history.canFetchMore(QModelIndex()):
+        history.fetchMore(QModelIndex())
+
+    assert prompt_ids(history) == ids[::-1]
+
+
+def test_history_placeholder_row(qapp, temp_db):
+    prompt_id = temp_db.create_prompt("x")
+    model = main.PromptHistoryModel(placeholder="-- выберите --")
+    model.refresh()
+
+    assert model.rowCount() == 2
+    assert model.data(model.index(0)) == "-- выберите --"
+    assert model.find_row(prompt_id) == 1
+
+
+def test_history_applies_change_events(history, temp_db):
+    events = []
+    temp_db.add_change_listener(events.append)
+    try:
+        old_id = temp_db.create_prompt("old")
+        history.refresh()
+        new_id = temp_db.create_prompt("new")
+        temp_db.delete_prompt(old_id)
+    finally:
+        temp_db.remove_change_listener(events.append)
+
+    for event in events:
+        history.apply_change(event)
+    assert prompt_ids(history) == [new_id]
+
+    # Событие, уже отраженное в модели, повторно не применяется
+    history.apply_change(events[1])
+    assert prompt_ids(history) == [new_id]
+
+
+def test_history_skips_inserts_beyond_loaded_pages(history, temp_db):
+    ids = [temp_db.create_prompt(f"prompt {i}") for i in range(5)]
+    history.refresh()
+    conn = temp_db.get_db_connection()
+    ancient_id = conn.execute(
+        "INSERT INTO prompts (date, prompt, tags) VALUES ('2000-01-01 00:00:00', 'ancient', '')").lastrowid
+    conn.commit()
+
+    history.apply_change({'seq': temp_db.get_change_counter() + 1, 'table': 'prompts',
+                          'action': 'insert', 'ids': [ancient_id]})
+    assert prompt_ids(history) == ids[::-1][:3]
+
+    while history.canFetchMore(QModelIndex()):
+        history.fetchMore(QModelIndex())
+    assert prompt_ids(history)[-1] == ancient_id
+
+
+def test_history_search_mode_refreshes_on_change(history, temp_db):
+    temp_db.create_prompt("apple pie")
+    history.set_search("apple")
+    assert history.rowCount() == 1
+
+    events = []
+    temp_db.add_change_listener(events.append)
+    try:
+        temp_db.create_prompt("apple juice")
+    finally:
+        temp_db.remove_change_listener(events.append)
+    history.apply_change(events[0])
+
+    assert history.rowCount() == 2
+    assert '<b>' in history.data(history.index(0), Qt.ToolTipRole)
+
+
+@pytest.fixture
+def results_model(qapp):
+    model = main.ResultsTableModel()
+    model.set_results([
+        {'model_name': "beta", 'response': "b", 'error': None, 'latency': 2.0},
+        {'model_name': "Alpha", 'response': "", 'error': "HTTP 500", 'latency': 0.5},
+        {'model_name': "gamma", 'response': "", 'error': None, 'latency': None},
+    ])
+    return model
+
+
+def model_names(model):
+    return [model.data(model.index(row, model.COLUMN_MODEL)) for row in range(model.rowCount())]
+
+
+def test_results_sort_by_latency_keeps_running_last(results_model):
+    results_model.sort(results_model.COLUMN_LATENCY, Qt.AscendingOrder)
+    assert model_names(results_model) == ["Alpha", "beta", "gamma"]
+    results_model.sort(results_model.COLUMN_MODEL, Qt.DescendingOrder)
+    assert model_names(results_model) == ["gamma", "beta", "Alpha"]
+
+
+def test_results_sort_keeps_result_indexes_and_persistent_rows(results_model):
+    results_model.sort(results_model.COLUMN_MODEL, Qt.AscendingOrder)
+    persistent = QPersistentModelIndex(results_model.index(2, 0))  # gamma
+
+    results_model.sort(results_model.COLUMN_LATENCY, Qt.DescendingOrder)
+
+    assert persistent.row() == 0
+    assert results_model.result_index(persistent.row()) == 2
+    # Обновление результата по его индексу затрагивает строку, куда он переместился
+    changed = []
+    results_model.dataChanged.connect(lambda top_left, bottom_right, roles=(): changed.append(top_left.row()))
+    results_model.result_changed(2)
+    assert changed == [0]
+
+
+def test_results_checkbox_and_error_text(results_model):
+    index = results_model.index(1, results_model.COLUMN_SELECTED)
+    assert results_model.setData(index, Qt.Checked, Qt.CheckStateRole)
+    assert results_model.data(index, Qt.CheckStateRole) == Qt.Checked
+    assert results_model.data(results_model.index(1, results_model.COLUMN_RESPONSE)) == "Ошибка: HTTP 500"
@@ -0,0 +1,104 @@
+"""
+Тесты журнала (logger.py)
+"""
+import json
+import logging
+import queue
+import sys
+
+import pytest
+
+import logger
+
+
+@pytest.fixture
+def fresh_logging(tmp_path, monkeypatch):
+    """Логирование, заново настраиваемое при первой записи, с журналом во временном каталоге"""
+    logger.shutdown_logging()
+    logger._configured = False
+    monkeypatch.setattr(logger, 'LOG_DIR', str(tmp_path))
+    monkeypatch.setattr(logger, 'LOG_FILE', str(tmp_path / "chatlist.log"))
+    yield tmp_path
+    logger.shutdown_logging()
+    logger._configured = False
+
+
+def make_record(msg, args=None, exc_info=None, **extra):
+    record = logging.LogRecord('ChatList', logging.ERROR, __file__, 1, msg, args, exc_info)
+    record.__dict__.update(extra)
+    return record
+
+
+@pytest.mark.parametrize('setting', ['rotate_when', 'log_dir'])
+def test_setup_failure_falls_back_to_stderr(fresh_logging, monkeypatch, capsys, setting):
+    if setting == 'rotate_when':
+        monkeypatch.setenv('LOG_ROTATE_WHEN', 'weekly')
+    else:
+        blocker = fresh_logging / "file"
+        blocker.write_text("")
+        monkeypatch.setattr(logger, 'LOG_DIR', str(blocker / "logs"))
+        monkeypatch.setattr(logger, 'LOG_FILE', str(blocker / "logs" / "chatlist.log"))
+
+    logger.log_info("first message")
+    logger.log_request_metrics({'provider': "mock", 'started': object()})
+    logger.log_error("second message", ValueError("boom"))
+    assert logger._configured
+    logger.shutdown_logging()
+
+    err = capsys.readouterr().err
+    assert "недоступен" in err
+    assert "first message" in err and "API Metrics" in err and "second message" in err
+
+
+def test_start_failure_falls_back_to_direct_stderr(fresh_logging, monkeypatch, capsys):
+    def broken():
+        raise RuntimeError("no thread")
+    monkeypatch.setattr(logger, '_start_listener', broken)
+
+    logger.log_info("still logged")
+    assert logger._configured
+
+    assert "still logged" in capsys.readouterr().err
+
+
+def test_json_format_writes_metrics_and_exception(fresh_logging, monkeypatch):
+    monkeypatch.setenv('LOG_FORMAT', 'json')
+    logger.log_request_metrics({'provider': "mock", 'status': 200})
+    try:
+        raise ValueError("boom")
+    except ValueError as e:
+        logger.log_error("failed", e)
+    logger.shutdown_logging()
+
+    lines = [json.loads(line) for line in (fresh_logging / "chatlist.log").read_text(encoding='utf-8').splitlines()]
+    metrics = next(line for line in lines if 'metrics' in line)
+    assert metrics['metrics'] == {'provider': "mock", 'status': 200}
+    assert metrics['level'] == 'INFO' and metrics['logger'] == 'ChatList'
+    error = next(line for line in lines if line['message'].startswith("failed"))
+    assert "ValueError: boom" in error['exception']
+
+
+def test_json_formatter_fields():
+    line = json.loads(logger.JsonFormatter().format(make_record("x=%s", (1,), metrics={'bytes': 5})))
+
+    assert line['message'] == "x=1"
+    assert line['metrics'] == {'bytes': 5}
+    assert line['level'] == 'ERROR'
+    assert {'time', 'version', 'thread'} <= line.keys()
+    assert 'exception' not in line
+
+
+def test_queue_handler_enqueues_prepared_record():
+    log_queue = queue.SimpleQueue()
+    try:
+        raise KeyError("missing")
+    except KeyError:
+        record = make_record("value %d", (7,), sys.exc_info())
+
+    logger._QueueHandler(log_queue).emit(record)
+
+    queued = log_queue.get_nowait()
+    assert (queued.msg, queued.args, queued.exc_info) == ("value 7", None, None)
+    assert "KeyError: 'missing'" in queued.exc_text
+    # Оформление выполняет обработчик фонового потока
+    assert logging.Formatter('%(message)s').format(queued).startswith("value 7\nTraceback")
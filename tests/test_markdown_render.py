@@ -0,0 +1,75 @@
+"""
+Тесты фоновой конвертации markdown и ее LRU-кэша (markdown_render.py)
+"""
+import threading
+
+import pytest
+
+import markdown_render
+from markdown_render import MarkdownRenderer
+
+
+@pytest.fixture
+def renderer():
+    renderer = MarkdownRenderer(cache_size=2)
+    yield renderer
+    renderer.shutdown()
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    """Задержать конвертацию до gate.set(); считает вызовы render_html"""
+    gate = threading.Event()
+    gate.calls = []
+    render_html = markdown_render.render_html
+
+    def blocked_render(text):
+        gate.calls.append(text)
+        gate.wait(5)
+        return render_html(text)
+
+    monkeypatch.setattr(markdown_render, 'render_html', blocked_render)
+    return gate
+
+
+def test_render_html_converts_markdown():
+    html = markdown_render.render_html("# Title\n\n| a |\n|---|\n| 1 |")
+    assert "<h1>Title</h1>" in html
+    assert "<table>" in html
+    assert html.startswith(markdown_render.HTML_STYLE)
+
+
+def test_final_text_is_cached(renderer):
+    html = renderer.submit("**bold**").result(5)
+    assert "<strong>bold</strong>" in html
+    assert renderer.get_cached("**bold**") == html
+
+    cached = renderer.submit("**bold**")
+    assert cached.done() and cached.result() == html
+
+
+def test_partial_text_is_not_cached(renderer):
+    renderer.submit("partial", cache=False).result(5)
+    assert renderer.get_cached("partial") is None
+
+
+def test_lru_evicts_least_recently_used(renderer):
+    for text in ("a", "b"):
+        renderer.submit(text).result(5)
+    renderer.get_cached("a")  # "a" использован позже "b"
+    renderer.submit("c").result(5)
+
+    assert renderer.get_cached("b") is None
+    assert renderer.get_cached("a") is not None
+    assert renderer.get_cached("c") is not None
+
+
+def test_same_text_in_progress_is_rendered_once(renderer, gate):
+    first = renderer.submit("same", cache=False)
+    second = renderer.submit("same")
+    gate.set()
+
+    assert first is second
+    assert second.result(5) and gate.calls == ["same"]
+    # Текст, начатый как промежуточный, сохранен по запросу итогового
+    assert renderer.get_cached("same") is not None
@@ -0,0 +1,55 @@
+"""
+Тесты параллельной рассылки промта моделям (models.py)
+"""
+import time
+
+import pytest
+
+from dispatcher import get_dispatcher
+from models import Model, STATS_FIELDS, iter_prompt_to_models, send_prompt_to_models
+
+
+@pytest.fixture
+def make_models(make_model):
+    def make(count, **fields):
+        return [Model(make_model(**fields)) for _ in range(count)]
+    return make
+
+
+def wait_idle(dispatcher, timeout=2):
+    deadline = time.monotonic() + timeout
+    while dispatcher.running + dispatcher.paused + dispatcher.waiting and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return dispatcher.running + dispatcher.paused + dispatcher.waiting == 0
+
+
+def test_send_prompt_to_models_returns_full_results(mock_server, make_models):
+    results = send_prompt_to_models("ping", make_models(2))
+
+    assert [r['response'] for r in results] == ["OK", "OK"]
+    for result in results:
+        assert result['success'] and result['attempts'] == 1
+        assert not result['cancelled'] and not result['timed_out'] and not result['cache_hit']
+        assert set(STATS_FIELDS) <= set(result)
+
+
+def test_deadline_interrupts_remaining_requests(mock_server, make_models):
+    mock_server.latency = 5.0
+    started = time.monotonic()
+
+    results = list(iter_prompt_to_models("ping", make_models(3), deadline=0.3))
+
+    assert time.monotonic() - started < 2
+    assert all(r['timed_out'] and r['cancelled'] and not r['success'] for r in results)
+
+
+def test_closing_generator_cancels_outstanding_requests(mock_server, make_models):
+    mock_server.latency = 5.0
+    # Модель без API-ключа отвечает ошибкой сразу, остальные выполняются
+    models = [Model({'name': "no-key", 'api_url': mock_server.url, 'api_id': 'MISSING_KEY'})] + make_models(3)
+    results = iter_prompt_to_models("ping", models)
+
+    assert next(results)['model_name'] == "no-key"
+    results.close()
+
+    assert wait_idle(get_dispatcher())
@@ -0,0 +1,214 @@
+"""
+Тесты сетевого слоя (network.py) на mock-сервере API
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import cancellation
+import circuit_breaker
+import network
+from cancellation import CancelToken
+from providers import resolve_adapter
+
+
+class FakeStreamResponse:
+    """Ответ requests с заранее заданными строками потока"""
+
+    def __init__(self, lines):
+        self._lines = [line.encode('utf-8') for line in lines]
+        self.closed = False
+
+    def iter_lines(self):
+        return iter(self._lines)
+
+    def close(self):
+        self.closed = True
+
+
+def test_read_sse_stream_collects_content_and_usage():
+    response = FakeStreamResponse([
+        ': keep-alive',
+        'data: {"choices": [{"delta": {"content": "Привет"}}]}',
+        '',
+        'data: not json',
+        'data: {"choices": [{"delta": {}}]}',
+        'data: {"choices": [{"delta": {"content": ", мир"}}]}',
+        'data: {"choices": [], "usage": {"prompt_tokens": 3, "completion_tokens": 2}}',
+        'data: [DONE]',
+        'data: {"choices": [{"delta": {"content": "после DONE"}}]}',
+    ])
+    chunks = []
+    stats = {}
+
+    text = network.read_sse_stream(response, chunks.append, stats)
+
+    assert text == "Привет, мир"
+    assert chunks == ["Привет", ", мир"]
+    assert stats['usage'] == {"prompt_tokens": 3, "completion_tokens": 2}
+    assert stats['ttft'] >= 0
+    assert response.closed
+
+
+def test_read_sse_stream_raises_provider_error():
+    response = FakeStreamResponse(['data: {"error": {"message": "overloaded"}}'])
+    with pytest.raises(network.APIError, match="overloaded"):
+        network.read_sse_stream(response, lambda chunk: None)
+    assert response.closed
+
+
+def test_send_request_streams_from_mock_server(mock_server, make_model):
+    mock_server.reply = "one two three"
+    chunks = []
+    stats = {}
+
+    text = network.send_request(make_model(), "ping", on_chunk=chunks.append, stats=stats)
+
+    assert text == "one two three"
+    assert chunks == ["one", " two", " three"]
+    assert stats['attempts'] == 1
+    assert stats['response_bytes'] > 0
+
+
+def test_parse_retry_after():
+    assert network.parse_retry_after("5") == 5.0
+    assert network.parse_retry_after("-3") == 0.0
+    assert network.parse_retry_after(None) is None
+    assert network.parse_retry_after("soon") is None
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 <= network.parse_retry_after(format_datetime(retry_at, usegmt=True)) <= 30
+
+
+def test_retry_delay_uses_retry_after_or_jittered_backoff(monkeypatch):
+    monkeypatch.setenv('RETRY_BACKOFF_BASE', '1')
+    monkeypatch.setenv('RETRY_BACKOFF_MAX', '4')
+    assert network.get_retry_delay(1, retry_after=7.5) == 7.5
+    for attempt, ceiling in ((1, 1), (2, 2), (3, 4), (10, 4)):
+        delays = [network.get_retry_delay(attempt) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        # Полный разброс: задержки не совпадают
+        assert len(set(delays)) > 1
+
+
+def test_retries_429_until_max_retries(monkeypatch, mock_server, make_model):
+    monkeypatch.setenv('MAX_RETRIES', '2')
+    mock_server.rate_limit_rate = 1.0
+    mock_server.retry_after = 0
+    stats = {}
+
+    with pytest.raises(network.APIError) as error:
+        network.send_request(make_model(), "ping", stats=stats)
+
+    assert error.value.status_code == 429
+    assert stats['attempts'] == 3
+    assert mock_server.request_count == 3
+
+
+def test_server_errors_are_retried_with_backoff(monkeypatch, mock_server, make_model):
+    monkeypatch.setenv('MAX_RETRIES', '1')
+    monkeypatch.setenv('RETRY_BACKOFF_BASE', '0.01')
+    mock_server.error_rate = 1.0
+    stats = {}
+
+    with pytest.raises(network.APIError) as error:
+        network.send_request(make_model(), "ping", stats=stats)
+
+    assert error.value.status_code == 500
+    assert stats['attempts'] == 2
+    assert mock_server.request_count == 2
+
+
+def test_identical_concurrent_requests_are_coalesced(mock_server, make_model):
+    mock_server.latency = 0.3
+    model = make_model()
+    results = []
+    stats = [{}, {}]
+
+    def send(index):
+        results.append(network.send_request(model, "same prompt", stats=stats[index]))
+
+    threads = [threading.Thread(target=send, args=(index,)) for index in range(2)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+
+    assert results == ["OK", "OK"]
+    assert mock_server.request_count == 1
+    assert [bool(s.get('coalesced')) for s in stats] == [False, True]
+
+
+def test_different_prompts_are_not_coalesced(mock_server, make_model):
+    mock_server.latency = 0.2
+    model = make_model()
+    threads = [threading.Thread(target=network.send_request, args=(model, prompt)) for prompt in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert mock_server.request_count == 2
+
+
+def test_cancel_interrupts_slow_request(mock_server, make_model):
+    mock_server.latency = 5.0
+    token = CancelToken()
+    threading.Timer(0.2, token.cancel).start()
+    started = time.monotonic()
+
+    with pytest.raises(network.RequestCancelled):
+        network.send_request(make_model(), "ping", cancel_token=token)
+
+    assert time.monotonic() - started < 2
+
+
+def test_cancel_interrupts_rate_limit_wait_without_consuming(monkeypatch, mock_server, make_model):
+    monkeypatch.setenv('RATE_LIMIT_RPM', '1')
+    # Ожидание токена (60 с) укладывается в срок запроса, поэтому запрос ждет, а не завершается сразу
+    monkeypatch.setenv('REQUEST_DEADLINE', '120')
+    monkeypatch.setenv('RATE_LIMIT_KEY', 'rate-limit-cancel')
+    model = make_model(api_id='RATE_LIMIT_KEY')
+    network.send_request(model, "first")
+    token = CancelToken()
+    threading.Timer(0.2, token.cancel).start()
+    started = time.monotonic()
+
+    with pytest.raises(network.RequestCancelled):
+        network.send_request(model, "second", cancel_token=token)
+
+    assert time.monotonic() - started < 2
+    assert mock_server.request_count == 1
+
+
+def test_cancel_after_completion_keeps_pooled_connection(mock_server):
+    """Отмена завершенного запроса не закрывает соединение, возвращенное в пул"""
+    session = network.get_session('test-pool')
+    payload = {"model": "m", "messages": []}
+    token = CancelToken()
+    with cancellation.bind_token(token):
+        response = session.post(mock_server.url, json=payload, stream=True, timeout=5)
+        response.content
+        token.cancel()
+
+    assert session.post(mock_server.url, json=payload, timeout=5).status_code == 200
+    assert mock_server.connection_count == 1
+
+
+def test_own_deadline_counts_as_breaker_failure(monkeypatch, mock_server, make_model):
+    monkeypatch.setenv('REQUEST_DEADLINE', '0.3')
+    mock_server.latency = 1.0
+    model = make_model()
+    breaker = circuit_breaker.get_breaker(resolve_adapter(model).name, model['name'])
+
+    with pytest.raises(network.DeadlineExceeded):
+        network.send_request(model, "ping")
+    assert breaker.failures == 1
+
+    # Срок рассылки (родительского признака) - не ошибка модели
+    with pytest.raises(network.DeadlineExceeded):
+        network.send_request(model, "ping 2", cancel_token=CancelToken(timeout=0.1))
+    assert breaker.failures == 1
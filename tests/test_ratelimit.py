@@ -0,0 +1,54 @@
+"""
+Тесты клиентского ограничителя частоты запросов (ratelimit.py)
+"""
+import time
+
+from ratelimit import RateLimiter, TokenBucket, estimate_tokens
+
+
+def test_token_bucket_allows_burst_then_times_out():
+    bucket = TokenBucket(rate_per_minute=3)
+    assert all(bucket.acquire(1, timeout=0) for _ in range(3))
+    started = time.monotonic()
+    assert not bucket.acquire(1, timeout=0.1)
+    # Пополнение одного токена занимает 20 с - ожидать его бессмысленно
+    assert time.monotonic() - started < 0.1
+
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(rate_per_minute=600)  # 10 токенов в секунду
+    for _ in range(600):
+        bucket.acquire(1, timeout=0)
+    started = time.monotonic()
+    assert bucket.acquire(1, timeout=1)
+    assert 0.05 <= time.monotonic() - started < 0.5
+
+
+def test_token_bucket_release_returns_tokens():
+    bucket = TokenBucket(rate_per_minute=1)
+    assert bucket.acquire(1, timeout=0)
+    bucket.release(1)
+    assert bucket.acquire(1, timeout=0)
+
+
+def test_rate_limiter_disabled_by_default():
+    limiter = RateLimiter()
+    assert all(limiter.acquire('test', 'key', tokens=10 ** 6, timeout=0) for _ in range(100))
+
+
+def test_rate_limiter_refunds_rpm_when_tpm_wait_fails(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_RPM', '2')
+    monkeypatch.setenv('RATE_LIMIT_TPM', '10')
+    limiter = RateLimiter()
+
+    assert limiter.acquire('test', 'key', tokens=8, timeout=0)
+    assert not limiter.acquire('test', 'key', tokens=8, timeout=0)
+
+    # Место в лимите RPM, занятое неотправленным запросом, возвращено
+    rpm_bucket = next(bucket for (kind, _, _), bucket in limiter._buckets.items() if kind == 'rpm')
+    assert rpm_bucket.acquire(1, timeout=0)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens([{'role': 'user', 'content': 'x' * 40}]) == 11
+    assert estimate_tokens([{'role': 'user', 'content': None}]) == 1
@@ -0,0 +1,53 @@
+"""
+Тесты кэша ответов моделей (response_cache.py)
+"""
+import network
+import response_cache
+
+
+def test_cache_is_off_by_default(temp_db, mock_server, make_model):
+    model = make_model()
+    network.send_request(model, "ping")
+    stats = {}
+    network.send_request(model, "ping", stats=stats)
+
+    assert not stats.get('cache_hit')
+    assert mock_server.request_count == 2
+
+
+def test_cached_response_is_reused(monkeypatch, temp_db, mock_server, make_model):
+    monkeypatch.setenv('RESPONSE_CACHE_ENABLED', '1')
+    model = make_model()
+    network.send_request(model, "ping")
+    stats = {}
+
+    assert network.send_request(model, "ping", stats=stats) == "OK"
+    assert stats['cache_hit'] and stats['attempts'] == 0
+    assert mock_server.request_count == 1
+    # use_cache=False всегда обращается к API
+    network.send_request(model, "ping", use_cache=False)
+    assert mock_server.request_count == 2
+
+
+def test_expired_and_evicted_entries_are_missed(monkeypatch, temp_db):
+    monkeypatch.setenv('RESPONSE_CACHE_ENABLED', '1')
+    monkeypatch.setenv('RESPONSE_CACHE_MAX_ENTRIES', '2')
+    keys = [response_cache.make_cache_key("m", "url", [{"role": "user", "content": str(i)}], 0.7)
+            for i in range(3)]
+    for key in keys:
+        response_cache.put_response(key, "m", f"answer {key}")
+
+    # Вытеснена самая давняя запись
+    assert response_cache.get_response(keys[0]) is None
+    assert response_cache.get_response(keys[2]) == f"answer {keys[2]}"
+
+    monkeypatch.setenv('RESPONSE_CACHE_TTL', '0')
+    assert response_cache.get_response(keys[2]) is None
+
+
+def test_cache_key_depends_on_request_parameters():
+    messages = [{"role": "user", "content": "x"}]
+    key = response_cache.make_cache_key("m", "url", messages, 0.7)
+    assert key == response_cache.make_cache_key("m", "url", [dict(messages[0])], 0.7)
+    assert key != response_cache.make_cache_key("m", "url", messages, 0.2)
+    assert key != response_cache.make_cache_key("other", "url", messages, 0.7)